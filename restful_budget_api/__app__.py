@@ -8,9 +8,36 @@ import dotenv
 from flask import Flask
 from flask_restful import Api
 
-from restful_budget_api.resources.expenses import Expenses
+from restful_budget_api.library.auth_cache import init_auth_cache
+from restful_budget_api.library.db_pool import init_pool
+from restful_budget_api.library.instrumentation import init_instrumentation
+from restful_budget_api.library.migrations import migrate
+from restful_budget_api.library.rate_limit import init_rate_limiter
+from restful_budget_api.library.representation import (
+    init_representation,
+    output_json,
+)
+from restful_budget_api.library.response_cache import init_response_cache
+from restful_budget_api.library.schema_registry import init_schemas
+from restful_budget_api.library.server import serve, serve_asgi, server_options
+from restful_budget_api.library.write_queue import init_write_queue
+from restful_budget_api.resources.assets import Assets, Liabilities
+from restful_budget_api.resources.expenses import (
+    Expenses,
+    ExpensesBatch,
+    ExpensesExport,
+    ExpensesImport,
+    ExpensesSummary,
+)
+from restful_budget_api.resources.patterns import (
+    Patterns,
+    PatternsById,
+    PatternsByTitle,
+    PatternsForecast,
+)
+from restful_budget_api.resources.reports import Reports, ReportsHistory
 from restful_budget_api.resources.users import Users
-from restful_budget_api.resources.utilities import Home
+from restful_budget_api.resources.utilities import Home, Metrics, Stats
 
 
 def main() -> None:
@@ -18,9 +45,41 @@ def main() -> None:
     dotenv.load_dotenv()
 
     args = get_args()
-    args_dict = {"admin": args.admin, "database": args.db}
+    args_dict = {
+        "admin": args.admin,
+        "database": args.db,
+        "pool_size": args.pool_size,
+        "slow_query_ms": args.slow_query_ms,
+        "response_cache": args.response_cache,
+        "write_queue": args.write_queue,
+        "rate_limit": args.rate_limit,
+        "rate_limit_backend": args.rate_limit_backend,
+        "max_in_flight": args.max_in_flight,
+        "workers": args.workers,
+    }
     app = create_app(args_dict)
     _ = create_api(app)
+    if args.asgi:
+        serve_asgi(
+            app,
+            host=args.host or "127.0.0.1",
+            port=int(args.port or 5000),
+            threads=args.threads or 32,
+            keep_alive=args.keep_alive,
+        )
+        return
+    if args.workers:
+        serve(
+            app,
+            server_options(
+                host=args.host or "127.0.0.1",
+                port=args.port or 5000,
+                workers=args.workers,
+                threads=args.threads or 1,
+                keep_alive=args.keep_alive,
+            ),
+        )
+        return
     app.run(debug=args.debug, host=args.host, port=args.port)
 
 
@@ -31,6 +90,33 @@ def create_app(args: Dict[str, Any]) -> Flask:
     """
     app = Flask(__name__)
     app.config.from_mapping(DATABASE=args["database"], IS_ADMIN=args["admin"])
+    if args.get("migrate", True):
+        migrate(app.config["DATABASE"])
+    if args.get("pool_size"):
+        app.config["DB_POOL_SIZE"] = args["pool_size"]
+    if args.get("slow_query_ms") is not None:
+        app.config["SLOW_QUERY_MS"] = args["slow_query_ms"]
+    if args.get("response_cache"):
+        app.config["RESPONSE_CACHE_BACKEND"] = args["response_cache"]
+    if args.get("write_queue"):
+        app.config["WRITE_QUEUE"] = True
+    if args.get("rate_limit"):
+        app.config["RATE_LIMIT_PER_KEY"] = args["rate_limit"]
+    if args.get("rate_limit_backend"):
+        app.config["RATE_LIMIT_BACKEND"] = args["rate_limit_backend"]
+    if args.get("max_in_flight"):
+        app.config["CONCURRENCY_PER_KEY"] = args["max_in_flight"]
+    if (args.get("workers") or 0) > 1:
+        # other workers write users too, see AuthCache
+        app.config.setdefault("AUTH_CACHE_RECHECK", 1.0)
+    init_schemas(app)
+    init_pool(app)
+    init_auth_cache(app)
+    init_instrumentation(app)
+    init_write_queue(app)
+    init_rate_limiter(app)
+    init_response_cache(app)
+    init_representation(app)
     return app
 
 
@@ -40,9 +126,26 @@ def create_api(app: Flask) -> Api:
     :param app: Flask app
     """
     api = Api(app)
+    api.representation("application/json")(output_json)
     api.add_resource(Users, "/users", "/users/<int:user_id>")
     api.add_resource(Expenses, "/expenses", "/expenses/<int:record_id>")
+    api.add_resource(ExpensesBatch, "/expenses/batch")
+    api.add_resource(ExpensesSummary, "/expenses/summary")
+    api.add_resource(ExpensesImport, "/expenses/import")
+    api.add_resource(ExpensesExport, "/expenses/export")
+    api.add_resource(Assets, "/assets", "/assets/<int:record_id>")
+    api.add_resource(
+        Liabilities, "/liabilities", "/liabilities/<int:record_id>"
+    )
+    api.add_resource(Patterns, "/patterns")
+    api.add_resource(PatternsForecast, "/patterns/forecast")
+    api.add_resource(PatternsById, "/patterns/<int:id_num>")
+    api.add_resource(PatternsByTitle, "/patterns/<string:title>")
+    api.add_resource(Reports, "/reports")
+    api.add_resource(ReportsHistory, "/reports/history")
     api.add_resource(Home, "/home")
+    api.add_resource(Stats, "/stats")
+    api.add_resource(Metrics, "/metrics")
     return api
 
 
@@ -71,5 +174,82 @@ def get_args() -> argparse.Namespace:
         help="Specify server host. Will default to localhost if left None",
     )
     parser.add_argument("--port", default=None, help="Specify server port")
+    parser.add_argument(
+        "--pool-size",
+        type=int,
+        default=None,
+        help="Maximum number of pooled database connections",
+    )
+    parser.add_argument(
+        "--slow-query-ms",
+        type=float,
+        default=None,
+        help="Log SQL statements slower than this many milliseconds",
+    )
+    parser.add_argument(
+        "--response-cache",
+        choices=["memory", "sqlite"],
+        default=None,
+        help="Response cache backend, use sqlite to share it between "
+        "workers",
+    )
+    parser.add_argument(
+        "--write-queue",
+        action="store_true",
+        default=False,
+        help="Commit writes in groups from a single writer thread per "
+        "process",
+    )
+    parser.add_argument(
+        "--rate-limit",
+        type=float,
+        default=None,
+        help="Requests per second allowed per API key, with bursts of "
+        "RATE_LIMIT_KEY_BURST",
+    )
+    parser.add_argument(
+        "--rate-limit-backend",
+        choices=["memory", "sqlite"],
+        default=None,
+        help="Rate limit bucket store, use sqlite to share it between "
+        "workers",
+    )
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        default=None,
+        help="Listing and export requests one API key may have running at "
+        "once",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Serve with this many gunicorn worker processes instead of the "
+        "development server",
+    )
+    parser.add_argument(
+        "--asgi",
+        action="store_true",
+        default=False,
+        help="Serve from one uvicorn process, holding connections on an "
+        "event loop instead of a thread each",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=None,
+        help="Request threads per worker when using --workers (default 1) "
+        "or --asgi (default 32)",
+    )
+    parser.add_argument(
+        "--keep-alive",
+        type=int,
+        default=5,
+        help="Seconds to keep idle connections open when using --workers or "
+        "--asgi",
+    )
     args = parser.parse_args()
+    if args.asgi and args.workers:
+        parser.error("--asgi serves a single process, drop --workers")
     return args
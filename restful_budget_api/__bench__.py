@@ -0,0 +1,163 @@
+"""benchmark entry point"""
+
+import argparse
+import json
+import os
+import tempfile
+
+from restful_budget_api.__app__ import create_api, create_app
+from restful_budget_api.library.benchmark import (
+    LocalServer,
+    available_scenarios,
+    environment,
+    find_regressions,
+    latest_results,
+    run_client,
+    run_http,
+    run_json_paths,
+    save_results,
+)
+from restful_budget_api.library.datagen import (
+    PROFILES,
+    generate_dataset,
+    generate_profile,
+)
+
+
+def main() -> None:
+    """benchmark the API against a generated database"""
+    args = get_args()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        database = os.path.join(tmp_dir, "bench.db")
+        if args.profile:
+            keys = generate_profile(database, PROFILES[args.profile])
+        else:
+            keys = generate_dataset(database, args.users, args.expenses)
+        app = create_app({"admin": True, "database": database})
+        _ = create_api(app)
+        scenarios = available_scenarios(app)
+        results = {}
+        if args.mode in ("client", "both"):
+            results["client"] = {
+                scenario.name: run_client(app, scenario, keys, args.requests)
+                for scenario in scenarios
+            }
+        if args.json_paths:
+            results.update(run_json_paths(app, scenarios, keys, args.requests))
+        if args.mode in ("http", "both"):
+            with LocalServer(app) as server:
+                results["http"] = {
+                    scenario.name: run_http(
+                        server.url,
+                        scenario,
+                        keys,
+                        args.requests,
+                        args.concurrency,
+                    )
+                    for scenario in scenarios
+                }
+    report = {
+        "dataset": (
+            {"profile": args.profile, **PROFILES[args.profile]._asdict()}
+            if args.profile
+            else {"users": args.users, "expenses_per_user": args.expenses}
+        ),
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "environment": environment(),
+        "results": results,
+    }
+    print_report(report)
+
+    baseline_path = args.baseline or latest_results(args.output)
+    if not args.no_save:
+        print(f"saved results to {save_results(report, args.output)}")
+    if baseline_path:
+        with open(baseline_path, "r", encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = find_regressions(baseline, report, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            raise SystemExit(1)
+        print(f"no regressions against {baseline_path}")
+
+
+def print_report(report: dict) -> None:
+    """print one line per scenario
+
+    :param report: benchmark results
+    """
+    for mode, scenarios in report["results"].items():
+        for name, result in scenarios.items():
+            print(
+                f"{mode:11} {name:18} {result['rps']:>9} req/s  "
+                f"p50 {result['p50_ms']:>8}ms  p95 {result['p95_ms']:>8}ms  "
+                f"p99 {result['p99_ms']:>8}ms  errors {result['errors']}"
+            )
+
+
+def get_args() -> argparse.Namespace:
+    """Parse benchmark CLI"""
+    parser = argparse.ArgumentParser(
+        description="Benchmark the budget API against generated data"
+    )
+    parser.add_argument(
+        "--users", type=int, default=100, help="Number of users to generate"
+    )
+    parser.add_argument(
+        "--expenses",
+        type=int,
+        default=1000,
+        help="Number of expenses to generate per user",
+    )
+    parser.add_argument(
+        "--profile",
+        choices=list(PROFILES),
+        default=None,
+        help="Use a setup dataset profile instead of --users/--expenses",
+    )
+    parser.add_argument(
+        "--requests",
+        type=int,
+        default=200,
+        help="Number of requests per scenario",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=8,
+        help="Number of concurrent clients for HTTP runs",
+    )
+    parser.add_argument(
+        "--mode",
+        choices=["client", "http", "both"],
+        default="both",
+        help="Drive the Flask test client, real HTTP or both",
+    )
+    parser.add_argument(
+        "--json-paths",
+        action="store_true",
+        help="Also compare the stdlib, orjson and SQLite built JSON "
+        "encoding of the listing endpoints",
+    )
+    parser.add_argument(
+        "--output",
+        default=os.path.join(os.getcwd(), "benchmarks"),
+        help="Directory results are stored in",
+    )
+    parser.add_argument(
+        "--baseline",
+        default=None,
+        help="Result file to compare against, defaults to the latest saved",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="Allowed p95 growth before flagging a regression",
+    )
+    parser.add_argument(
+        "--no-save", action="store_true", help="Do not store these results"
+    )
+    return parser.parse_args()
@@ -1,13 +1,20 @@
 """project setup endtry points"""
 
+import argparse
 import os
-import sqlite3
+import time
 
 import dotenv
 
+from restful_budget_api.library.datagen import PROFILES, generate_profile
+from restful_budget_api.library.migrations import migrate
+
 
 def main() -> None:
-    """create database file"""
+    """create database file, apply pending migrations and optionally fill
+    it with a synthetic dataset
+    """
+    args = get_args()
     env_path = os.path.join(
         os.path.dirname(os.path.abspath(__file__)), "../.env"
     )
@@ -20,11 +27,37 @@ def main() -> None:
     dotenv.load_dotenv()
     if not os.path.exists(os.path.dirname(os.environ["DEMO_DB"])):
         os.makedirs(os.path.dirname(os.environ["DEMO_DB"]))
-    db_client = sqlite3.connect(os.environ["DEMO_DB"])
-    with open(
-        os.path.join(os.path.dirname(__file__), "schema.sql"),
-        "r",
-        encoding="utf-8",
-    ) as schema:
-        db_client.executescript(schema.read())
-    db_client.close()
+    for version in migrate(os.environ["DEMO_DB"]):
+        print(f"applied migration {version:04d}")
+    if args.profile:
+        profile = PROFILES[args.profile]
+        start = time.perf_counter()
+        generate_profile(os.environ["DEMO_DB"], profile, args.seed)
+        print(
+            f"generated {args.profile} dataset in "
+            f"{time.perf_counter() - start:.1f}s: {profile.users} users, "
+            f"{profile.users * profile.expenses_per_user} expenses, "
+            f"{profile.users * profile.assets_per_user} assets, "
+            f"{profile.users * profile.liabilities_per_user} liabilities, "
+            f"{profile.patterns} patterns"
+        )
+
+
+def get_args() -> argparse.Namespace:
+    """Parse setup CLI"""
+    parser = argparse.ArgumentParser(
+        description="Create the demo database and apply migrations"
+    )
+    parser.add_argument(
+        "--profile",
+        choices=list(PROFILES),
+        default=None,
+        help="Also load a deterministic synthetic dataset of this size",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Random seed of the synthetic dataset",
+    )
+    return parser.parse_args()
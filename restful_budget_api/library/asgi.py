@@ -0,0 +1,216 @@
+"""ASGI adapter running the WSGI app on a bounded thread pool"""
+
+import asyncio
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+Scope = Dict[str, Any]
+Message = Dict[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+
+BODY_SPOOL_BYTES = 1024 * 1024
+RESPONSE_QUEUE_SIZE = 16
+
+
+def build_environ(scope: Scope, body: Any) -> Dict[str, Any]:
+    """WSGI environ of an ASGI HTTP request
+
+    :param scope: ASGI connection scope
+    :param body: file holding the whole request body
+    """
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode().decode("latin-1"),
+        "PATH_INFO": scope["path"].encode().decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": str(server[0]),
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "REMOTE_PORT": str(client[1]),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for raw_name, raw_value in scope.get("headers", []):
+        name = raw_name.decode("latin-1").upper().replace("-", "_")
+        value = raw_value.decode("latin-1")
+        if name == "CONTENT_TYPE":
+            key = "CONTENT_TYPE"
+        elif name == "CONTENT_LENGTH":
+            key = "CONTENT_LENGTH"
+        else:
+            key = f"HTTP_{name}"
+        if key in environ:
+            value = f"{environ[key]},{value}"
+        environ[key] = value
+    return environ
+
+
+class WSGIBridge:
+    """ASGI app serving a WSGI app from a fixed number of threads
+
+    Idle keep-alive connections are held by the event loop, only requests
+    being handled take a thread, and the rest wait on the loop. Response
+    chunks go through a small queue so slow clients push back on streamed
+    responses instead of buffering them.
+    """
+
+    def __init__(self, wsgi_app: Callable[..., Any], threads: int) -> None:
+        self.wsgi_app = wsgi_app
+        self.threads = threads
+        self._pid = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def executor(self) -> ThreadPoolExecutor:
+        """request threads of this process"""
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.threads, thread_name_prefix="budget-asgi"
+            )
+            self._pid = os.getpid()
+        return self._executor
+
+    async def __call__(
+        self, scope: Scope, receive: Receive, send: Send
+    ) -> None:
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self.http(scope, receive, send)
+        else:
+            raise ValueError(f"ASGI scope {scope['type']} not supported")
+
+    async def lifespan(self, receive: Receive, send: Send) -> None:
+        """start the request threads and stop them on shutdown
+
+        :param receive: ASGI receive callable
+        :param send: ASGI send callable
+        """
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self.executor()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self._executor is not None:
+                    self._executor.shutdown(wait=True)
+                    self._executor = None
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def http(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """answer one HTTP request
+
+        :param scope: ASGI connection scope
+        :param receive: ASGI receive callable
+        :param send: ASGI send callable
+        """
+        loop = asyncio.get_running_loop()
+        queue: "asyncio.Queue[Optional[bytes]]" = asyncio.Queue(
+            RESPONSE_QUEUE_SIZE
+        )
+        disconnected = threading.Event()
+
+        def put(chunk: Optional[bytes]) -> None:
+            if disconnected.is_set():
+                if chunk is None:
+                    return
+                raise ConnectionAbortedError("client disconnected")
+            asyncio.run_coroutine_threadsafe(queue.put(chunk), loop).result()
+
+        with SpooledTemporaryFile(max_size=BODY_SPOOL_BYTES) as body:
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    return
+                body.write(message.get("body", b""))
+                if not message.get("more_body"):
+                    break
+            body.seek(0)
+            environ = build_environ(scope, body)
+            started: List[Any] = []
+
+            def start_response(
+                status: str, headers: List[Tuple[str, str]], _: Any = None
+            ) -> Callable[[bytes], None]:
+                started[:] = [status, headers]
+                return put
+
+            def run() -> None:
+                try:
+                    chunks = self.wsgi_app(environ, start_response)
+                    try:
+                        for chunk in chunks:
+                            if chunk:
+                                put(chunk)
+                    finally:
+                        if hasattr(chunks, "close"):
+                            chunks.close()
+                finally:
+                    put(None)
+
+            handled = loop.run_in_executor(self.executor(), run)
+            response_started = False
+            try:
+                while True:
+                    chunk = await queue.get()
+                    if not response_started and started:
+                        response_started = True
+                        await send(self.response_start(*started))
+                    if chunk is None:
+                        break
+                    await send(
+                        {
+                            "type": "http.response.body",
+                            "body": chunk,
+                            "more_body": True,
+                        }
+                    )
+            except Exception:
+                # stop the app thread, it may be blocked on a full queue
+                disconnected.set()
+                while not queue.empty():
+                    queue.get_nowait()
+                handled.add_done_callback(lambda done: done.exception())
+                raise
+            try:
+                await handled
+            except Exception:
+                if response_started:
+                    raise
+                started[:] = []
+            if not response_started:
+                await send(
+                    self.response_start(
+                        *(started or ["500 Internal Server Error", []])
+                    )
+                )
+            await send({"type": "http.response.body", "body": b""})
+
+    @staticmethod
+    def response_start(status: str, headers: List[Tuple[str, str]]) -> Message:
+        """ASGI response start message of a WSGI status and headers
+
+        :param status: WSGI status line, e.g. 200 OK
+        :param headers: WSGI response headers
+        """
+        return {
+            "type": "http.response.start",
+            "status": int(status.split(" ", 1)[0]),
+            "headers": [
+                (name.lower().encode("latin-1"), value.encode("latin-1"))
+                for name, value in headers
+            ],
+        }
@@ -0,0 +1,142 @@
+"""in-process cache of API key lookups"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from flask import Flask, current_app
+
+AUTH_CACHE_DEFAULTS = {
+    "AUTH_CACHE_SIZE": 1024,
+    "AUTH_CACHE_TTL": 60.0,
+    "AUTH_CACHE_RECHECK": None,
+}
+
+MISSING = object()
+
+
+class AuthCache:
+    """bounded LRU map of API key -> user id with per-entry expiry
+
+    Unknown keys are cached as ``None`` so a client retrying a bad key does
+    not hit the database on every request either.
+
+    Writes through this process invalidate entries directly. When other
+    processes write users too, set recheck to compare the users change
+    version at most that often and drop every entry once it moved, which
+    bounds how long a deleted key keeps working elsewhere.
+    """
+
+    def __init__(
+        self,
+        size: int = 1024,
+        ttl: float = 60.0,
+        recheck: Optional[float] = None,
+    ) -> None:
+        self.size = size
+        self.ttl = ttl
+        self.recheck = recheck
+        self._version: Optional[int] = None
+        self._checked = float("-inf")
+        self._entries: "OrderedDict[str, Tuple[float, Optional[int]]]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def get(self, api_key: str) -> object:
+        """get cached user id, ``None`` for a known bad key or MISSING
+
+        :param api_key: Authorization header value
+        """
+        with self._lock:
+            entry = self._entries.get(api_key)
+            if entry is None:
+                return MISSING
+            expires, user_id = entry
+            if expires < time.monotonic():
+                del self._entries[api_key]
+                return MISSING
+            self._entries.move_to_end(api_key)
+            return user_id
+
+    def put(self, api_key: str, user_id: Optional[int]) -> None:
+        """cache the result of an API key lookup
+
+        :param api_key: Authorization header value
+        :param user_id: id of the matching user or None if no match
+        """
+        with self._lock:
+            self._entries[api_key] = (time.monotonic() + self.ttl, user_id)
+            self._entries.move_to_end(api_key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def invalidate_key(self, api_key: str) -> None:
+        """drop a single API key
+
+        :param api_key: Authorization header value
+        """
+        with self._lock:
+            self._entries.pop(api_key, None)
+
+    def invalidate_user(self, user_id: int) -> None:
+        """drop every API key mapped to a user
+
+        :param user_id: id number of user
+        """
+        with self._lock:
+            stale = [
+                key
+                for key, (_, cached_id) in self._entries.items()
+                if cached_id == user_id
+            ]
+            for key in stale:
+                del self._entries[key]
+
+    def needs_check(self) -> bool:
+        """True once per recheck interval, if rechecks are enabled"""
+        if self.recheck is None:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            if now - self._checked < self.recheck:
+                return False
+            self._checked = now
+            return True
+
+    def sync(self, version: int) -> None:
+        """drop every entry if the users change version moved
+
+        :param version: current users change version
+        """
+        with self._lock:
+            if self._version is not None and version != self._version:
+                self._entries.clear()
+            self._version = version
+
+    def clear(self) -> None:
+        """drop every entry"""
+        with self._lock:
+            self._entries.clear()
+
+
+def init_auth_cache(app: Flask) -> AuthCache:
+    """create the app API key cache
+
+    :param app: Flask app
+    """
+    for key, val in AUTH_CACHE_DEFAULTS.items():
+        app.config.setdefault(key, val)
+    cache = AuthCache(
+        size=app.config["AUTH_CACHE_SIZE"],
+        ttl=app.config["AUTH_CACHE_TTL"],
+        recheck=app.config["AUTH_CACHE_RECHECK"],
+    )
+    app.extensions["auth_cache"] = cache
+    return cache
+
+
+def get_auth_cache() -> AuthCache:
+    """get the API key cache of the current app"""
+    return current_app.extensions["auth_cache"]
@@ -0,0 +1,319 @@
+"""endpoint latency and throughput benchmarks"""
+
+import json
+import os
+import platform
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import requests
+from flask import Flask
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from restful_budget_api.library.db_connector import HAS_JSON
+from restful_budget_api.library.representation import ENCODERS
+
+
+@dataclass
+class Scenario:
+    """one kind of request driven against the API"""
+
+    name: str
+    method: str
+    path: str
+    rule: str
+    needs_key: bool = True
+    params: Dict[str, Any] = field(default_factory=dict)
+    body: Optional[Callable[[int], Any]] = None
+
+
+SCENARIOS = [
+    Scenario("users_list", "GET", "/users", "/users", needs_key=False),
+    Scenario("expenses_list", "GET", "/expenses", "/expenses"),
+    Scenario(
+        "expenses_page",
+        "GET",
+        "/expenses",
+        "/expenses",
+        params={"limit": 100},
+    ),
+    Scenario(
+        "expenses_post",
+        "POST",
+        "/expenses",
+        "/expenses",
+        body=lambda num: {
+            "date": "2024-06-01",
+            "description": f"bench {num}",
+            "amount": num % 500 + 0.5,
+        },
+    ),
+    Scenario(
+        "expenses_summary",
+        "GET",
+        "/expenses/summary",
+        "/expenses/summary",
+        params={"group_by": "month"},
+    ),
+    Scenario(
+        "patterns_list", "GET", "/patterns", "/patterns", needs_key=False
+    ),
+]
+
+
+JSON_PATHS = {
+    "stdlib": {"JSON_ENCODER": "stdlib", "JSON_FROM_DB": False},
+    "orjson": {"JSON_ENCODER": "orjson", "JSON_FROM_DB": False},
+    "sqlite": {"JSON_FROM_DB": True},
+}
+
+JSON_SCENARIOS = ("users_list", "expenses_list")
+
+
+def available_json_paths() -> Dict[str, Dict[str, Any]]:
+    """JSON encoding configs usable with the installed packages"""
+    paths = {}
+    for name, config in JSON_PATHS.items():
+        if config.get("JSON_ENCODER", "stdlib") not in ENCODERS:
+            continue
+        if config["JSON_FROM_DB"] and not HAS_JSON:
+            continue
+        paths[name] = config
+    return paths
+
+
+def available_scenarios(app: Flask) -> List[Scenario]:
+    """scenarios whose endpoint is registered on the app
+
+    :param app: Flask app with resources registered
+    """
+    rules = {rule.rule for rule in app.url_map.iter_rules()}
+    return [scenario for scenario in SCENARIOS if scenario.rule in rules]
+
+
+def summarize(latencies: List[float], wall_time: float) -> Dict[str, Any]:
+    """latency percentiles in ms and throughput of a scenario run
+
+    :param latencies: seconds taken by each request
+    :param wall_time: seconds taken by the whole run
+    """
+    ordered = sorted(latencies)
+
+    def percentile(pct: float) -> float:
+        index = min(len(ordered) - 1, int(round(pct / 100 * len(ordered))))
+        return round(ordered[index] * 1000, 3)
+
+    return {
+        "requests": len(ordered),
+        "p50_ms": percentile(50),
+        "p95_ms": percentile(95),
+        "p99_ms": percentile(99),
+        "rps": round(len(ordered) / wall_time, 1) if wall_time else 0.0,
+    }
+
+
+def run_client(
+    app: Flask, scenario: Scenario, keys: List[str], count: int
+) -> Dict[str, Any]:
+    """drive a scenario sequentially through the Flask test client
+
+    :param app: Flask app with resources registered
+    :param scenario: requests to make
+    :param keys: API keys to spread requests over
+    :param count: number of requests
+    """
+    client = app.test_client()
+    rng = random.Random(0)
+    latencies = []
+    errors = 0
+    started = time.perf_counter()
+    for num in range(count):
+        headers = {"Authorization": rng.choice(keys)}
+        body = scenario.body(num) if scenario.body else None
+        sent = time.perf_counter()
+        resp = client.open(
+            scenario.path,
+            method=scenario.method,
+            query_string=scenario.params,
+            json=body,
+            headers=headers if scenario.needs_key else {},
+        )
+        resp.get_data()
+        latencies.append(time.perf_counter() - sent)
+        errors += resp.status_code >= 400
+    result = summarize(latencies, time.perf_counter() - started)
+    result["errors"] = errors
+    return result
+
+
+def run_json_paths(
+    app: Flask, scenarios: List[Scenario], keys: List[str], count: int
+) -> Dict[str, Dict[str, Any]]:
+    """run the listing scenarios through the client under each JSON path
+
+    :param app: Flask app with resources registered
+    :param scenarios: scenarios to pick the listings from
+    :param keys: API keys to spread requests over
+    :param count: number of requests per scenario
+    """
+    listings = [
+        scenario for scenario in scenarios if scenario.name in JSON_SCENARIOS
+    ]
+    original = {
+        "JSON_ENCODER": app.config["JSON_ENCODER"],
+        "JSON_FROM_DB": app.config["JSON_FROM_DB"],
+    }
+    results = {}
+    try:
+        for name, config in available_json_paths().items():
+            app.config.update(config)
+            results[f"json-{name}"] = {
+                scenario.name: run_client(app, scenario, keys, count)
+                for scenario in listings
+            }
+    finally:
+        app.config.update(original)
+    return results
+
+
+def run_http(
+    url: str,
+    scenario: Scenario,
+    keys: List[str],
+    count: int,
+    concurrency: int,
+) -> Dict[str, Any]:
+    """drive a scenario over real HTTP from concurrent keep-alive clients
+
+    :param url: base url of a running server
+    :param scenario: requests to make
+    :param keys: API keys to spread requests over
+    :param count: number of requests
+    :param concurrency: number of client threads
+    """
+    local = threading.local()
+
+    def send(num: int) -> Tuple[float, bool]:
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        headers = {"Authorization": keys[num % len(keys)]}
+        body = scenario.body(num) if scenario.body else None
+        sent = time.perf_counter()
+        resp = local.session.request(
+            scenario.method,
+            f"{url}{scenario.path}",
+            params=scenario.params,
+            json=body,
+            headers=headers if scenario.needs_key else {},
+            timeout=30,
+        )
+        return (time.perf_counter() - sent, resp.status_code >= 400)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(send, range(count)))
+    result = summarize(
+        [latency for latency, _ in outcomes], time.perf_counter() - started
+    )
+    result["errors"] = sum(error for _, error in outcomes)
+    return result
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """request handler that skips per-request access logs"""
+
+    def log_request(self, *_: Any) -> None:
+        pass
+
+
+class LocalServer:
+    """threaded werkzeug server on a free port for offline HTTP runs"""
+
+    def __init__(self, app: Flask) -> None:
+        self.server = make_server(
+            "127.0.0.1",
+            0,
+            app,
+            threaded=True,
+            request_handler=QuietRequestHandler,
+        )
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, daemon=True
+        )
+
+    def __enter__(self) -> "LocalServer":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        self.server.shutdown()
+        self.thread.join()
+
+
+def environment() -> Dict[str, str]:
+    """versions that affect results, stored alongside them"""
+    return {
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+    }
+
+
+def save_results(results: Dict[str, Any], output_dir: str) -> str:
+    """write results to a timestamped JSON file
+
+    :param results: benchmark results
+    :param output_dir: directory holding result history
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    path = os.path.join(output_dir, f"bench_{stamp}.json")
+    with open(path, "w", encoding="utf-8") as result_file:
+        json.dump(results, result_file, indent=2)
+    return path
+
+
+def latest_results(output_dir: str) -> Optional[str]:
+    """path of the newest stored result file, if any
+
+    :param output_dir: directory holding result history
+    """
+    if not os.path.isdir(output_dir):
+        return None
+    files = sorted(
+        name
+        for name in os.listdir(output_dir)
+        if name.startswith("bench_") and name.endswith(".json")
+    )
+    return os.path.join(output_dir, files[-1]) if files else None
+
+
+def find_regressions(
+    baseline: Dict[str, Any], current: Dict[str, Any], threshold: float
+) -> List[str]:
+    """describe every scenario whose p95 latency grew past the threshold
+
+    :param baseline: earlier benchmark results
+    :param current: new benchmark results
+    :param threshold: allowed growth, 0.2 allows p95 to grow by 20%
+    """
+    regressions = []
+    for mode, scenarios in current["results"].items():
+        for name, result in scenarios.items():
+            before = baseline["results"].get(mode, {}).get(name)
+            if not before or not before["p95_ms"]:
+                continue
+            growth = result["p95_ms"] / before["p95_ms"] - 1
+            if growth > threshold:
+                regressions.append(
+                    f"{mode}/{name}: p95 {before['p95_ms']}ms -> "
+                    f"{result['p95_ms']}ms (+{growth:.0%})"
+                )
+    return regressions
@@ -0,0 +1,78 @@
+"""ETag and Last-Modified handling for conditional GETs"""
+
+import hashlib
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+
+from flask import Response, request
+from werkzeug.http import http_date
+
+from restful_budget_api.library.db_connector import db_fetchone
+
+GLOBAL_USER = 0
+
+
+def change_version(table: str, user_id: int) -> Tuple[int, Optional[str]]:
+    """get the write counter and last write time of a user's rows
+
+    The counters are kept by triggers in the same transaction as each
+    write, see migration 0004.
+
+    :param table: table name
+    :param user_id: id of user owning the rows, GLOBAL_USER for shared tables
+    """
+    fetch = db_fetchone(
+        "SELECT version, updated_at FROM change_versions "
+        "WHERE table_name = ? AND user_id = ?",
+        (table, user_id),
+    )
+    if fetch is None:
+        return (0, None)
+    return (int(fetch[0]), fetch[1])
+
+
+def conditional_get(
+    table: str, user_id: int = GLOBAL_USER, variant: str = ""
+) -> Tuple[Optional[Response], Dict[str, str]]:
+    """validators for a listing and a 304 response if the client is current
+
+    The ETag covers the query string too, so every filtered or paged view
+    of the same rows gets its own tag.
+
+    :param table: table name
+    :param user_id: id of user owning the rows, GLOBAL_USER for shared tables
+    :param variant: representation picked by content negotiation, if any
+    """
+    version, updated_at = change_version(table, user_id)
+    digest = hashlib.sha1(
+        f"{table}:{user_id}:{version}:{updated_at}:{request.full_path}:"
+        f"{variant}".encode("utf-8")
+    ).hexdigest()[:20]
+    headers = {"ETag": f'"{digest}"', "Cache-Control": "private, no-cache"}
+    last_modified = None
+    if updated_at is not None:
+        written = datetime.strptime(
+            updated_at, "%Y-%m-%d %H:%M:%S.%f"
+        ).replace(tzinfo=timezone.utc)
+        # HTTP dates have whole seconds. Round up, and only send the date
+        # once that second is over: any later write then gets a later
+        # date, while a date sent mid-second would hide a second write in
+        # the same second behind a 304. Until then the ETag validates.
+        last_modified = written.replace(microsecond=0)
+        if written.microsecond:
+            last_modified += timedelta(seconds=1)
+        if last_modified <= datetime.now(timezone.utc):
+            headers["Last-Modified"] = http_date(last_modified)
+        else:
+            last_modified = None
+    if request.if_none_match:
+        fresh = request.if_none_match.contains_weak(digest)
+    else:
+        fresh = (
+            last_modified is not None
+            and request.if_modified_since is not None
+            and last_modified <= request.if_modified_since
+        )
+    if fresh:
+        return (Response(status=304, headers=headers), headers)
+    return (None, headers)
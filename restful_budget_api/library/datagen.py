@@ -0,0 +1,298 @@
+"""deterministic synthetic data for benchmarks"""
+
+import random
+import sqlite3
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+from restful_budget_api.library.forecast import FREQUENCIES
+from restful_budget_api.library.migrations import migrate
+
+DESCRIPTIONS = [
+    "rent",
+    "groceries",
+    "dinner",
+    "coffee",
+    "fuel",
+    "utilities",
+    "insurance",
+    "gym",
+    "books",
+    "travel",
+]
+
+DAYS = [
+    f"{year}-{month:02d}-{day:02d}"
+    for year in range(2019, 2025)
+    for month in range(1, 13)
+    for day in range(1, 29)
+]
+
+ASSETS = ["checking", "savings", "brokerage", "retirement", "house", "car"]
+
+LIABILITIES = ["mortgage", "car loan", "student loan", "credit card"]
+
+# tables filled by generate_profile, their triggers and indexes are dropped
+# while loading and rebuilt once at the end
+BULK_TABLES = ("users", "expenses", "assets", "liabilities", "patterns")
+
+# pragmas for a one off load, the data is regenerated rather than recovered
+# if the machine dies halfway through
+LOAD_PRAGMAS = (
+    "PRAGMA synchronous=OFF",
+    "PRAGMA cache_size=-262144",
+    "PRAGMA temp_store=MEMORY",
+)
+
+
+class Profile(NamedTuple):
+    """rows generated by a dataset profile"""
+
+    users: int
+    expenses_per_user: int
+    assets_per_user: int
+    liabilities_per_user: int
+    patterns: int
+
+
+PROFILES = {
+    "small": Profile(100, 100, 5, 2, 50),
+    "medium": Profile(2000, 250, 10, 5, 500),
+    "large": Profile(20000, 100, 20, 5, 5000),
+}
+
+
+def api_key(user_num: int) -> str:
+    """API key of a generated user
+
+    :param user_num: 1 based number of generated user
+    """
+    return f"bench-key-{user_num:08d}"
+
+
+def iter_expenses(
+    rng: random.Random, user_ids: List[int], expenses_per_user: int
+) -> Iterator[Tuple[int, str, str, float]]:
+    """yield expense rows spread over a few years for each user
+
+    :param rng: seeded random number generator
+    :param user_ids: ids of users to create expenses for
+    :param expenses_per_user: number of expenses per user
+    """
+    return iter_rows(rng, user_ids, expenses_per_user, DESCRIPTIONS, 1, 2000)
+
+
+def iter_rows(
+    rng: random.Random,
+    user_ids: List[int],
+    rows_per_user: int,
+    descriptions: List[str],
+    low: float,
+    high: float,
+) -> Iterator[Tuple[int, str, str, float]]:
+    """yield (user_id, date, description, amount) rows for each user
+
+    Dates and descriptions are drawn a user at a time with rng.choices,
+    several times faster than a randint per field on million row loads.
+
+    :param rng: seeded random number generator
+    :param user_ids: ids of users to create rows for
+    :param rows_per_user: number of rows per user
+    :param descriptions: descriptions to pick from
+    :param low: smallest amount
+    :param high: largest amount
+    """
+    cents = (high - low) * 100
+    for user_id in user_ids:
+        for date, description in zip(
+            rng.choices(DAYS, k=rows_per_user),
+            rng.choices(descriptions, k=rows_per_user),
+        ):
+            yield (
+                user_id,
+                date,
+                description,
+                low + int(rng.random() * cents) / 100,
+            )
+
+
+def iter_patterns(
+    rng: random.Random, patterns: int
+) -> Iterator[Tuple[str, str, str, str, int, Optional[str]]]:
+    """yield recurring pattern rows with unique titles
+
+    :param rng: seeded random number generator
+    :param patterns: number of patterns
+    """
+    for num in range(1, patterns + 1):
+        date = rng.choice(DAYS)
+        yield (
+            f"{rng.choice(DESCRIPTIONS)} {num}",
+            date,
+            str(round(rng.uniform(-2000, 5000), 2)),
+            rng.choice(FREQUENCIES),
+            rng.randint(1, 3),
+            None if rng.random() < 0.7 else f"{int(date[:4]) + 2}{date[4:]}",
+        )
+
+
+def generate_dataset(
+    database: str, users: int, expenses_per_user: int, seed: int = 0
+) -> List[str]:
+    """migrate a database and fill it with users and expenses
+
+    :param database: path to database file
+    :param users: number of users to create
+    :param expenses_per_user: number of expenses per user
+    :param seed: random seed, the same seed always gives the same data
+    """
+    migrate(database)
+    rng = random.Random(seed)
+    keys = [api_key(num) for num in range(1, users + 1)]
+    db_client = sqlite3.connect(database)
+    try:
+        cursor = db_client.executemany(
+            "INSERT INTO users (username, password) VALUES (?, ?)",
+            [(f"bench_user_{num}", key) for num, key in enumerate(keys, 1)],
+        )
+        user_ids = [
+            row[0]
+            for row in db_client.execute(
+                "SELECT id FROM users WHERE username LIKE 'bench_user_%'"
+            )
+        ]
+        cursor.executemany(
+            "INSERT INTO expenses (user_id, date, description, amount) "
+            "VALUES (?, ?, ?, ?)",
+            iter_expenses(rng, user_ids, expenses_per_user),
+        )
+        db_client.commit()
+    finally:
+        db_client.close()
+    return keys
+
+
+def drop_bulk_schema(db_client: sqlite3.Connection) -> List[str]:
+    """drop the triggers and indexes of the bulk tables
+
+    Returns the statements that recreate them.
+
+    :param db_client: connection inside the load transaction
+    """
+    fetch = db_client.execute(
+        "SELECT type, name, sql FROM sqlite_master "
+        "WHERE type IN ('trigger', 'index') AND sql IS NOT NULL "
+        f"AND tbl_name IN ({', '.join('?' for _ in BULK_TABLES)})",
+        BULK_TABLES,
+    ).fetchall()
+    for kind, name, _ in fetch:
+        db_client.execute(f'DROP {kind.upper()} "{name}"')
+    return [sql for _, _, sql in fetch]
+
+
+def refresh_derived(db_client: sqlite3.Connection) -> None:
+    """rebuild what the dropped triggers would have kept up to date
+
+    :param db_client: connection inside the load transaction
+    """
+    now = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+    db_client.execute(
+        "INSERT INTO net_worth (user_id, assets, liabilities, updated_at) "
+        f"SELECT user_id, SUM(asset), SUM(liability), {now} FROM ("
+        "SELECT user_id, value AS asset, 0 AS liability FROM assets "
+        "UNION ALL "
+        "SELECT user_id, 0 AS asset, value AS liability FROM liabilities) "
+        "GROUP BY user_id "
+        "ON CONFLICT (user_id) DO UPDATE SET assets = excluded.assets, "
+        "liabilities = excluded.liabilities, updated_at = excluded.updated_at"
+    )
+    for table in ("expenses", "assets", "liabilities"):
+        db_client.execute(
+            "INSERT INTO change_versions "
+            "(table_name, user_id, version, updated_at) "
+            f"SELECT '{table}', user_id, 1, {now} FROM {table} "
+            "WHERE true GROUP BY user_id "
+            "ON CONFLICT (table_name, user_id) DO UPDATE "
+            "SET version = version + 1, updated_at = excluded.updated_at"
+        )
+    db_client.execute(
+        "INSERT INTO change_versions "
+        "(table_name, user_id, version, updated_at) "
+        f"VALUES ('patterns', 0, 1, {now}), ('users', 0, 1, {now}) "
+        "ON CONFLICT (table_name, user_id) DO UPDATE "
+        "SET version = version + 1, updated_at = excluded.updated_at"
+    )
+
+
+def generate_profile(
+    database: str, profile: Profile, seed: int = 0
+) -> List[str]:
+    """migrate a database and bulk load a full synthetic dataset into it
+
+    Everything is loaded in one transaction with the triggers and indexes
+    of the loaded tables dropped, then net worth totals and change versions
+    are rebuilt with a query per table and the triggers and indexes are
+    recreated. Returns the API keys of the generated users.
+
+    :param database: path to database file
+    :param profile: number of rows to generate
+    :param seed: random seed, the same seed always gives the same data
+    """
+    migrate(database)
+    rng = random.Random(seed)
+    db_client = sqlite3.connect(database, isolation_level=None)
+    try:
+        for pragma in LOAD_PRAGMAS:
+            db_client.execute(pragma)
+        db_client.execute("BEGIN IMMEDIATE")
+        try:
+            if db_client.execute(
+                "SELECT 1 FROM users WHERE username LIKE 'bench_user_%'"
+            ).fetchone():
+                raise ValueError("database already holds generated users")
+            schema = drop_bulk_schema(db_client)
+            keys = [api_key(num) for num in range(1, profile.users + 1)]
+            cursor = db_client.executemany(
+                "INSERT INTO users (username, password) VALUES (?, ?)",
+                [
+                    (f"bench_user_{num}", key)
+                    for num, key in enumerate(keys, 1)
+                ],
+            )
+            user_ids = [
+                row[0]
+                for row in db_client.execute(
+                    "SELECT id FROM users WHERE username LIKE 'bench_user_%' "
+                    "ORDER BY id"
+                )
+            ]
+            cursor.executemany(
+                "INSERT INTO expenses (user_id, date, description, amount) "
+                "VALUES (?, ?, ?, ?)",
+                iter_expenses(rng, user_ids, profile.expenses_per_user),
+            )
+            for table, per_user, names in (
+                ("assets", profile.assets_per_user, ASSETS),
+                ("liabilities", profile.liabilities_per_user, LIABILITIES),
+            ):
+                cursor.executemany(
+                    f"INSERT INTO {table} (user_id, date, description, value) "
+                    "VALUES (?, ?, ?, ?)",
+                    iter_rows(rng, user_ids, per_user, names, 100, 500000),
+                )
+            cursor.executemany(
+                "INSERT INTO patterns "
+                "(title, date, value, frequency, interval, end_date) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                iter_patterns(rng, profile.patterns),
+            )
+            refresh_derived(db_client)
+            for statement in schema:
+                db_client.execute(statement)
+            db_client.execute("COMMIT")
+        except Exception:
+            db_client.execute("ROLLBACK")
+            raise
+        db_client.execute("PRAGMA optimize")
+    finally:
+        db_client.close()
+    return keys
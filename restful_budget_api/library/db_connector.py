@@ -1,24 +1,47 @@
 """API DB connection functions"""
 
+import itertools
+import json
 import sqlite3
-from typing import Any, Dict, List, Tuple, Union, cast
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
 from flask import current_app
 
+from restful_budget_api.library.db_pool import get_db
+from restful_budget_api.library.instrumentation import QueryTimer
+from restful_budget_api.library.schema_registry import get_schemas
+from restful_budget_api.library.write_queue import get_write_queue
+
+HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+
+def _has_json() -> bool:
+    """check that SQLite was built with the JSON functions"""
+    db_client = sqlite3.connect(":memory:")
+    try:
+        db_client.execute("SELECT json_array()")
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        db_client.close()
+    return True
+
+
+HAS_JSON = _has_json()
+
 
 def db_get_schema(table: str) -> List[str]:
-    """get table field names
+    """get table field names from the app schema registry
 
     :param table: table name
     """
-    db_client = sqlite3.connect(
-        current_app.config["DATABASE"], detect_types=sqlite3.PARSE_DECLTYPES
-    )
-    if not isinstance(db_client, sqlite3.Connection):
-        raise LookupError("Could not connect to database")
-    fetch = db_client.execute(f"SELECT * FROM {table}")
-    db_client.close()
-    return [field[0] for field in fetch.description]
+    schemas = get_schemas()
+    if table not in schemas:
+        fetch = db_fetchall(f"PRAGMA table_info({table})")
+        if not fetch:
+            raise LookupError(f"table {table} does not exist")
+        schemas[table] = [field[1] for field in fetch]
+    return schemas[table]
 
 
 def db_build_record(fetch: Tuple[Any], schema: List[str]) -> Dict[str, Any]:
@@ -27,10 +50,7 @@ def db_build_record(fetch: Tuple[Any], schema: List[str]) -> Dict[str, Any]:
     :param fetch: record response
     :param schema: table field names
     """
-    record = {}
-    for key, val in zip(schema, fetch):
-        record[key] = val
-    return record
+    return dict(zip(schema, fetch))
 
 
 def db_build_table(
@@ -41,13 +61,7 @@ def db_build_table(
     :param fetch: record list response
     :param schema: table field names
     """
-    records = []
-    for row in fetch:
-        record = {}
-        for key, val in zip(schema, row):
-            record[key] = val
-        records.append(record)
-    return records
+    return [dict(zip(schema, row)) for row in fetch]
 
 
 def db_fetchone(
@@ -58,13 +72,10 @@ def db_fetchone(
     :param sql: formatted SQL statement
     :param data: tuple of variables to insert into sql
     """
-    db_client = sqlite3.connect(
-        current_app.config["DATABASE"], detect_types=sqlite3.PARSE_DECLTYPES
-    )
-    if not isinstance(db_client, sqlite3.Connection):
-        raise LookupError("Could not connect to database")
-    fetch = db_client.execute(sql, data).fetchone()
-    db_client.close()
+    db_client = get_db()
+    with QueryTimer(sql) as timer:
+        fetch = db_client.execute(sql, data).fetchone()
+        timer.rows = int(fetch is not None)
     if fetch is None:
         return None
     return tuple(fetch)
@@ -78,68 +89,264 @@ def db_fetchall(
     :param sql: formatted SQL statement
     :param data: tuple of variables to insert into sql
     """
-    db_client = sqlite3.connect(
-        current_app.config["DATABASE"], detect_types=sqlite3.PARSE_DECLTYPES
-    )
-    if not isinstance(db_client, sqlite3.Connection):
-        raise LookupError("Could not connect to database")
-    fetch = db_client.execute(sql, data).fetchall()
-    db_client.close()
+    db_client = get_db()
+    with QueryTimer(sql) as timer:
+        fetch = db_client.execute(sql, data).fetchall()
+        timer.rows = len(fetch)
     return fetch
 
 
+def db_fetch_json(
+    sql: str, schema: List[str], data: Tuple[Any, ...] = tuple("")
+) -> str:
+    """get rows as a JSON array of records encoded by SQLite
+
+    The statement's ORDER BY is kept, since SQLite does not flatten ordered
+    subqueries into aggregates. REAL values are printed with 15 significant
+    digits, which is exact for amounts entered by users.
+
+    :param sql: formatted SQL statement
+    :param schema: field names of the selected columns
+    :param data: tuple of variables to insert into sql
+    """
+    fields = ", ".join(f"'{key}', {key}" for key in schema)
+    wrapped = f"SELECT json_group_array(json_object({fields})) FROM ({sql})"
+    db_client = get_db()
+    with QueryTimer(wrapped) as timer:
+        fetch = db_client.execute(wrapped, data).fetchone()
+        timer.rows = 1
+    return fetch[0]
+
+
+def db_iterate(
+    sql: str, data: Tuple[Any, ...] = tuple(""), size: int = 500
+) -> Iterator[Tuple[Any, ...]]:
+    """lazily yield rows from database, fetching them in chunks
+
+    :param sql: formatted SQL statement
+    :param data: tuple of variables to insert into sql
+    :param size: number of rows fetched from sqlite at a time
+    """
+    db_client = get_db()
+    with QueryTimer(sql) as timer:
+        cursor = db_client.execute(sql, data)
+        try:
+            while True:
+                rows = cursor.fetchmany(size)
+                if not rows:
+                    break
+                timer.rows += len(rows)
+                yield from rows
+        finally:
+            cursor.close()
+
+
 def db_commit_change(sql: str, data: Tuple[Any, ...] = tuple("")) -> None:
     """perform a database action without an expected response
 
     :param sql: formatted SQL statement
     :param data: tuple of variables to insert into sql
     """
-    db_client = sqlite3.connect(
-        current_app.config["DATABASE"], detect_types=sqlite3.PARSE_DECLTYPES
-    )
-    if not isinstance(db_client, sqlite3.Connection):
-        raise LookupError("Could not connect to database")
-    db_client.execute(sql, data)
-    db_client.commit()
-    db_client.close()
+    write_queue = get_write_queue()
+    if write_queue is not None:
+        with QueryTimer(sql):
+            write_queue.submit(sql, data).result(
+                timeout=current_app.config["WRITE_TIMEOUT"]
+            )
+        return
+    db_client = get_db()
+    with QueryTimer(sql) as timer:
+        timer.rows = db_client.execute(sql, data).rowcount
+        db_client.commit()
 
 
-def db_next_id(table: str) -> int:
-    """get next id number for a given table
+def db_execute_returning(
+    sql: str, data: Tuple[Any, ...] = tuple("")
+) -> List[Tuple[Any, ...]]:
+    """perform a database change with a RETURNING clause and commit it
+
+    With the write queue enabled the statement is committed by the writer
+    thread together with other queued writes.
+
+    :param sql: formatted SQL statement
+    :param data: tuple of variables to insert into sql
+    """
+    write_queue = get_write_queue()
+    if write_queue is not None:
+        with QueryTimer(sql) as timer:
+            fetch = write_queue.submit(sql, data).result(
+                timeout=current_app.config["WRITE_TIMEOUT"]
+            )
+            timer.rows = len(fetch)
+        return fetch
+    db_client = get_db()
+    try:
+        with QueryTimer(sql) as timer:
+            fetch = db_client.execute(sql, data).fetchall()
+            db_client.commit()
+            timer.rows = len(fetch)
+    except Exception:
+        db_client.rollback()
+        raise
+    return fetch
+
+
+def db_change_returning(
+    sql: str,
+    data: Tuple[Any, ...],
+    returning: str,
+    select_sql: str,
+    select_data: Tuple[Any, ...] = tuple(""),
+    select_after: bool = False,
+) -> List[Tuple[Any, ...]]:
+    """perform a change and return columns of the rows it touched
+
+    Uses RETURNING where SQLite has it (3.35+). Before that, select_sql
+    reads the same rows ahead of the change, or after it with
+    select_after, inside one write transaction so no other writer gets in
+    between.
+
+    :param sql: change statement without a RETURNING clause
+    :param data: tuple of variables to insert into sql
+    :param returning: columns to return
+    :param select_sql: query reading those columns of the touched rows
+    :param select_data: tuple of variables to insert into select_sql
+    :param select_after: read the rows after the change instead of before
+    """
+    if HAS_RETURNING:
+        return db_execute_returning(f"{sql} RETURNING {returning}", data)
+    db_client = get_db()
+    db_client.execute("BEGIN IMMEDIATE")
+
+    def select() -> List[Tuple[Any, ...]]:
+        with QueryTimer(select_sql) as timer:
+            rows = db_client.execute(select_sql, select_data).fetchall()
+            timer.rows = len(rows)
+        return rows
+
+    try:
+        fetch = [] if select_after else select()
+        with QueryTimer(sql) as timer:
+            timer.rows = db_client.execute(sql, data).rowcount
+        if select_after and timer.rows:
+            fetch = select()
+        db_client.commit()
+    except Exception:
+        db_client.rollback()
+        raise
+    return fetch
+
+
+def db_insert_many(
+    table: str,
+    fields: List[str],
+    rows: Iterable[Tuple[Any, ...]],
+    batch_size: int = 1000,
+) -> List[int]:
+    """insert rows with executemany inside a single transaction
+
+    Ids are handed out in order while the transaction holds the write lock,
+    so each batch covers the ids up to last_insert_rowid().
 
     :param table: table name
+    :param fields: column names matching each row
+    :param rows: values to insert, consumed lazily in batches
+    :param batch_size: number of rows passed to each executemany call
+    """
+    sql = (
+        f"INSERT INTO {table} ({', '.join(fields)}) "
+        f"VALUES ({', '.join(['?' for _ in fields])})"
+    )
+    db_client = get_db()
+    rows = iter(rows)
+    record_ids: List[int] = []
+    db_client.execute("BEGIN IMMEDIATE")
+    try:
+        while True:
+            batch = list(itertools.islice(rows, batch_size))
+            if not batch:
+                break
+            with QueryTimer(sql) as timer:
+                timer.rows = db_client.executemany(sql, batch).rowcount
+            fetch = db_client.execute("SELECT last_insert_rowid()")
+            last_id = int(fetch.fetchone()[0])
+            record_ids.extend(range(last_id - len(batch) + 1, last_id + 1))
+        db_client.commit()
+    except Exception:
+        db_client.rollback()
+        raise
+    return record_ids
+
+
+def db_in_ids(ids: List[int]) -> Tuple[str, Tuple[Any, ...]]:
+    """SQL membership test for a list of ids and its parameters
+
+    With JSON support the whole list is bound as one parameter, so the
+    statement text is the same for every list and never runs into the
+    host parameter limit.
+
+    :param ids: record ids
     """
-    fetch = db_fetchone(f"SELECT * FROM SQLITE_SEQUENCE WHERE name='{table}'")
-    if fetch is not None:
-        fetch = cast(Tuple[str, int], fetch)
-        return int(fetch[1] + 1)
-    return 1
+    if HAS_JSON:
+        return ("IN (SELECT value FROM json_each(?))", (json.dumps(ids),))
+    return (f"IN ({', '.join(['?' for _ in ids])})", tuple(ids))
 
 
-def db_ids(table: str) -> List[int]:
-    """return list of ids within table
+def db_record_exists(
+    table: str, record_id: int, user_id: Optional[int] = None
+) -> bool:
+    """check a record exists, and belongs to a user if one is given
+
+    A single primary key lookup, whatever the size of the table.
 
     :param table: table name
+    :param record_id: id number of record
+    :param user_id: id of user that must own the record
     """
-    fetch = db_fetchall(f"SELECT id FROM {table}")
-    return [int(record[0]) for record in fetch]
+    if user_id is None:
+        fetch = db_fetchone(
+            f"SELECT 1 FROM {table} WHERE id = ?", (record_id,)
+        )
+    else:
+        fetch = db_fetchone(
+            f"SELECT 1 FROM {table} WHERE id = ? AND user_id = ?",
+            (record_id, user_id),
+        )
+    return fetch is not None
 
 
 def db_add_new_record(table: str, insert: Dict[str, Any]) -> Dict[str, Any]:
     """create a new record based on table schema and json from request
 
+    The insert and the read back of the new row happen in one statement on
+    one connection, so the id is right even with concurrent writers.
+
     :param table: table name
-    :param insert:
+    :param insert: field names and values of the new record
     """
-    record_id = db_next_id(table)
-    db_commit_change(
-        sql=f"INSERT INTO {table} "
+    sql = (
+        f"INSERT INTO {table} "
         f"({', '.join(insert.keys())}) "
-        f"VALUES ({', '.join(['?' for _ in insert])})",
-        data=tuple(insert.values()),
-    )
-    fetch = db_fetchone(
-        sql=f"SELECT * FROM {table} WHERE id = ?",
-        data=(record_id,),
+        f"VALUES ({', '.join(['?' for _ in insert])})"
     )
+    if HAS_RETURNING:
+        fetch = db_execute_returning(
+            sql=f"{sql} RETURNING *", data=tuple(insert.values())
+        )[0]
+    else:
+        db_client = get_db()
+        select_sql = f"SELECT * FROM {table} WHERE id = ?"
+        try:
+            with QueryTimer(sql) as timer:
+                cursor = db_client.execute(sql, tuple(insert.values()))
+                timer.rows = 1
+            with QueryTimer(select_sql) as timer:
+                fetch = db_client.execute(
+                    select_sql, (cursor.lastrowid,)
+                ).fetchone()
+                timer.rows = 1
+            db_client.commit()
+        except Exception:
+            db_client.rollback()
+            raise
     return db_build_record(fetch=fetch, schema=db_get_schema(table))
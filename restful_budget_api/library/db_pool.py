@@ -0,0 +1,214 @@
+"""bounded SQLite connection pool bound to the flask app"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from flask import Flask, current_app, g
+
+from restful_budget_api.library.instrumentation import record_checkout
+
+POOL_DEFAULTS = {
+    "DB_POOL_SIZE": 8,
+    "DB_POOL_TIMEOUT": 5.0,
+    "DB_BUSY_TIMEOUT": 5.0,
+    "DB_CACHED_STATEMENTS": 256,
+}
+
+
+def open_connection(
+    database: str,
+    busy_timeout: float = 5.0,
+    cached_statements: int = 256,
+    isolation_level: Optional[str] = "IMMEDIATE",
+) -> sqlite3.Connection:
+    """open a database connection with the app's pragmas
+
+    Writes take the lock with BEGIN IMMEDIATE by default so that writers in
+    other processes wait on the busy timeout instead of failing with
+    ``database is locked`` when a read transaction tries to upgrade.
+
+    :param database: path to database file
+    :param busy_timeout: seconds to wait on a locked database
+    :param cached_statements: size of the prepared statement cache
+    :param isolation_level: sqlite3 isolation level, None to manage
+        transactions by hand
+    """
+    db_client = sqlite3.connect(
+        database,
+        detect_types=sqlite3.PARSE_DECLTYPES,
+        timeout=busy_timeout,
+        cached_statements=cached_statements,
+        check_same_thread=False,
+        isolation_level=isolation_level,
+    )
+    db_client.execute("PRAGMA journal_mode=WAL")
+    db_client.execute("PRAGMA synchronous=NORMAL")
+    db_client.execute(f"PRAGMA busy_timeout={int(busy_timeout * 1000)}")
+    return db_client
+
+
+class PoolExhaustedError(LookupError):
+    """raised when no connection frees up before the checkout timeout"""
+
+
+class ConnectionPool:
+    """bounded pool of configured sqlite3 connections
+
+    Connections are created lazily up to ``size`` and handed out LIFO so the
+    warmest statement caches get reused first. The pool remembers the pid it
+    was created in and starts over after a fork so worker processes never
+    share a connection with their parent.
+    """
+
+    def __init__(
+        self,
+        database: str,
+        size: int = 8,
+        timeout: float = 5.0,
+        busy_timeout: float = 5.0,
+        cached_statements: int = 256,
+    ) -> None:
+        self.database = database
+        self.size = size
+        self.timeout = timeout
+        self.busy_timeout = busy_timeout
+        self.cached_statements = cached_statements
+        self._lock = threading.Condition(threading.Lock())
+        self._reset()
+
+    def _reset(self) -> None:
+        """forget every connection, used on creation and after a fork"""
+        self._pid = os.getpid()
+        self._idle: List[sqlite3.Connection] = []
+        self._open = 0
+        self._in_use = 0
+        self._checkouts = 0
+        self._opened = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._timeouts = 0
+
+    def reset(self) -> None:
+        """drop connections inherited from a parent process without closing"""
+        with self._lock:
+            self._reset()
+
+    def _connect(self) -> sqlite3.Connection:
+        """open and configure a new database connection"""
+        return open_connection(
+            self.database,
+            busy_timeout=self.busy_timeout,
+            cached_statements=self.cached_statements,
+        )
+
+    def checkout(self) -> sqlite3.Connection:
+        """borrow a connection, waiting up to the pool timeout for one"""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            self._checkouts += 1
+            if not self._idle and self._open >= self.size:
+                self._waits += 1
+                started = time.monotonic()
+                freed = self._lock.wait_for(
+                    lambda: self._idle or self._open < self.size,
+                    timeout=self.timeout,
+                )
+                self._wait_time += time.monotonic() - started
+                if not freed:
+                    self._timeouts += 1
+                    raise PoolExhaustedError(
+                        f"no database connection free after {self.timeout}s"
+                    )
+            if self._idle:
+                self._in_use += 1
+                return self._idle.pop()
+            self._open += 1
+            self._opened += 1
+            self._in_use += 1
+        try:
+            return self._connect()
+        except Exception:
+            with self._lock:
+                self._open -= 1
+                self._in_use -= 1
+                self._lock.notify()
+            raise
+
+    def checkin(self, db_client: sqlite3.Connection) -> None:
+        """return a borrowed connection to the pool
+
+        :param db_client: connection handed out by checkout
+        """
+        if db_client.in_transaction:
+            db_client.rollback()
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            self._in_use -= 1
+            self._idle.append(db_client)
+            self._lock.notify()
+
+    def close(self) -> None:
+        """close all idle connections"""
+        with self._lock:
+            while self._idle:
+                self._idle.pop().close()
+                self._open -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """pool counters for sizing under load"""
+        with self._lock:
+            return {
+                "size": self.size,
+                "open": self._open,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "opened": self._opened,
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "wait_seconds": round(self._wait_time, 6),
+                "timeouts": self._timeouts,
+            }
+
+
+def init_pool(app: Flask) -> ConnectionPool:
+    """create the app connection pool and register the teardown hook
+
+    :param app: Flask app
+    """
+    for key, val in POOL_DEFAULTS.items():
+        app.config.setdefault(key, val)
+    pool = ConnectionPool(
+        database=app.config["DATABASE"],
+        size=app.config["DB_POOL_SIZE"],
+        timeout=app.config["DB_POOL_TIMEOUT"],
+        busy_timeout=app.config["DB_BUSY_TIMEOUT"],
+        cached_statements=app.config["DB_CACHED_STATEMENTS"],
+    )
+    app.extensions["db_pool"] = pool
+    app.teardown_appcontext(release_db)
+    return pool
+
+
+def get_pool() -> ConnectionPool:
+    """get the connection pool of the current app"""
+    return current_app.extensions["db_pool"]
+
+
+def get_db() -> sqlite3.Connection:
+    """get the connection checked out for the current app context"""
+    if "db_client" not in g:
+        g.db_client = get_pool().checkout()
+        record_checkout()
+    return g.db_client
+
+
+def release_db(_: Any = None) -> None:
+    """return the app context connection to the pool on teardown"""
+    db_client = g.pop("db_client", None)
+    if db_client is not None:
+        get_pool().checkin(db_client)
@@ -0,0 +1,197 @@
+"""incremental CSV and columnar encodings of record rows"""
+
+import csv
+import io
+import itertools
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+
+from flask import Response, stream_with_context
+
+from restful_budget_api.library.representation import encode_json
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover - optional dependency
+    pyarrow = None
+
+Rows = Iterable[Tuple[Any, ...]]
+
+
+def iter_chunks(rows: Rows, size: int) -> Iterator[List[Tuple[Any, ...]]]:
+    """group rows into lists of at most size rows
+
+    :param rows: record rows
+    :param size: rows per chunk
+    """
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def drain(sink: io.BytesIO) -> bytes:
+    """take everything written to a buffer so far and empty it
+
+    :param sink: buffer written by an encoder
+    """
+    data = sink.getvalue()
+    sink.seek(0)
+    sink.truncate()
+    return data
+
+
+def iter_csv(
+    rows: Rows, schema: List[str], types: List[str], size: int
+) -> Iterator[str]:
+    """encode rows as CSV with a header line, one chunk at a time
+
+    :param rows: record rows
+    :param schema: field names
+    :param types: SQLite type of each field, unused by CSV
+    :param size: rows per chunk
+    """
+    sink = io.StringIO()
+    writer = csv.writer(sink, lineterminator="\n")
+    writer.writerow(schema)
+    for chunk in iter_chunks(rows, size):
+        writer.writerows(chunk)
+        yield sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+    yield sink.getvalue()
+
+
+def iter_columns(
+    rows: Rows, schema: List[str], types: List[str], size: int
+) -> Iterator[bytes]:
+    """encode rows as newline delimited JSON objects of column arrays
+
+    Each line holds one chunk, e.g. {"id": [1, 2], "amount": [1.5, 2.0]},
+    so field names are sent once per chunk instead of once per row.
+
+    :param rows: record rows
+    :param schema: field names
+    :param types: SQLite type of each field, unused by JSON
+    :param size: rows per chunk
+    """
+    for chunk in iter_chunks(rows, size):
+        yield encode_json(dict(zip(schema, map(list, zip(*chunk)))))
+
+
+def arrow_schema(schema: List[str], types: List[str]) -> Any:
+    """arrow schema matching the SQLite column types
+
+    :param schema: field names
+    :param types: SQLite type of each field
+    """
+    arrow_types = {
+        "integer": pyarrow.int64(),
+        "real": pyarrow.float64(),
+        "text": pyarrow.string(),
+    }
+    return pyarrow.schema(
+        [(name, arrow_types[kind]) for name, kind in zip(schema, types)]
+    )
+
+
+def arrow_batch(chunk: List[Tuple[Any, ...]], batch_schema: Any) -> Any:
+    """arrow record batch of one chunk of rows
+
+    :param chunk: record rows
+    :param batch_schema: arrow schema of the rows
+    """
+    return pyarrow.record_batch(
+        [
+            pyarrow.array(column, type=field.type)
+            for column, field in zip(zip(*chunk), batch_schema)
+        ],
+        schema=batch_schema,
+    )
+
+
+def iter_arrow(
+    rows: Rows, schema: List[str], types: List[str], size: int
+) -> Iterator[bytes]:
+    """encode rows as an Arrow IPC stream, one record batch per chunk
+
+    :param rows: record rows
+    :param schema: field names
+    :param types: SQLite type of each field
+    :param size: rows per batch
+    """
+    batch_schema = arrow_schema(schema, types)
+    sink = io.BytesIO()
+    with pyarrow.ipc.new_stream(sink, batch_schema) as writer:
+        for chunk in iter_chunks(rows, size):
+            writer.write_batch(arrow_batch(chunk, batch_schema))
+            yield drain(sink)
+    yield drain(sink)
+
+
+def iter_parquet(
+    rows: Rows, schema: List[str], types: List[str], size: int
+) -> Iterator[bytes]:
+    """encode rows as a Parquet file, one row group per chunk
+
+    Row groups are sent as they are written, the footer comes last.
+
+    :param rows: record rows
+    :param schema: field names
+    :param types: SQLite type of each field
+    :param size: rows per row group
+    """
+    batch_schema = arrow_schema(schema, types)
+    sink = io.BytesIO()
+    with pyarrow.parquet.ParquetWriter(sink, batch_schema) as writer:
+        for chunk in iter_chunks(rows, size):
+            writer.write_batch(arrow_batch(chunk, batch_schema))
+            yield drain(sink)
+    yield drain(sink)
+
+
+EXPORT_FORMATS: Dict[str, Tuple[str, Callable[..., Iterator[Any]]]] = {
+    "text/csv": ("csv", iter_csv),
+    "application/vnd.budget.columns+ndjson": ("ndjson", iter_columns),
+}
+if pyarrow is not None:
+    EXPORT_FORMATS["application/vnd.apache.arrow.stream"] = (
+        "arrow",
+        iter_arrow,
+    )
+    EXPORT_FORMATS["application/vnd.apache.parquet"] = (
+        "parquet",
+        iter_parquet,
+    )
+
+
+def export_records(
+    rows: Rows,
+    schema: List[str],
+    types: List[str],
+    mimetype: str,
+    filename: str,
+    size: int = 1000,
+) -> Response:
+    """stream rows to the client in an export format
+
+    :param rows: lazy record rows, e.g. from db_iterate
+    :param schema: field names
+    :param types: SQLite type of each field
+    :param mimetype: key of EXPORT_FORMATS
+    :param filename: download name without extension
+    :param size: rows encoded at a time
+    """
+    extension, encode = EXPORT_FORMATS[mimetype]
+    return Response(
+        stream_with_context(encode(rows, schema, types, size)),
+        mimetype=mimetype,
+        headers={
+            "Content-Disposition": (
+                f'attachment; filename="{filename}.{extension}"'
+            )
+        },
+    )
@@ -0,0 +1,364 @@
+"""per-request timing, query instrumentation and prometheus metrics"""
+
+import logging
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from flask import Flask, Response, current_app, g, request
+
+INSTRUMENTATION_DEFAULTS = {
+    "SLOW_QUERY_MS": 100.0,
+}
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+slow_query_log = logging.getLogger("restful_budget_api.slow_queries")
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Metrics:
+    """thread safe counters and histograms rendered as prometheus text
+
+    Metrics live in process memory, so with several workers each worker
+    reports its own numbers.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Dict[Labels, List[float]]] = {}
+        self._buckets: Dict[str, Tuple[float, ...]] = {}
+
+    def describe(
+        self,
+        name: str,
+        kind: str,
+        text: str,
+        buckets: Optional[Tuple[float, ...]] = None,
+    ) -> None:
+        """register the HELP and TYPE lines of a metric
+
+        :param name: metric name
+        :param kind: counter, gauge or histogram
+        :param text: help text
+        :param buckets: histogram upper bounds, BUCKETS if not given
+        """
+        self._help[name] = (kind, text)
+        if buckets is not None:
+            self._buckets[name] = buckets
+
+    def inc(self, name: str, amount: float = 1, **labels: str) -> None:
+        """increase a counter
+
+        :param name: metric name
+        :param amount: amount to add
+        :param labels: metric labels
+        """
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """add a value to a histogram
+
+        :param name: metric name
+        :param value: observed value, in seconds unless buckets differ
+        :param labels: metric labels
+        """
+        key = tuple(sorted(labels.items()))
+        buckets = self._buckets.get(name, BUCKETS)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            # bucket counts followed by the sum and total count
+            counts = series.setdefault(key, [0.0] * (len(buckets) + 2))
+            index = bisect_left(buckets, value)
+            if index < len(buckets):
+                counts[index] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    def render(self, gauges: Optional[Dict[str, float]] = None) -> str:
+        """prometheus text exposition of every metric
+
+        :param gauges: current values of gauges sampled at scrape time
+        """
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.extend(self._header(name))
+                for key, val in series.items():
+                    lines.append(f"{name}{format_labels(key)} {val:g}")
+            for name, series in sorted(self._histograms.items()):
+                lines.extend(self._header(name))
+                buckets = self._buckets.get(name, BUCKETS)
+                for key, counts in series.items():
+                    cumulative = 0.0
+                    for bound, count in zip(buckets, counts):
+                        cumulative += count
+                        le_key = key + (("le", f"{bound:g}"),)
+                        lines.append(
+                            f"{name}_bucket{format_labels(le_key)} "
+                            f"{cumulative:g}"
+                        )
+                    inf_key = key + (("le", "+Inf"),)
+                    lines.append(
+                        f"{name}_bucket{format_labels(inf_key)} "
+                        f"{counts[-1]:g}"
+                    )
+                    lines.append(
+                        f"{name}_sum{format_labels(key)} {counts[-2]:g}"
+                    )
+                    lines.append(
+                        f"{name}_count{format_labels(key)} {counts[-1]:g}"
+                    )
+        for name, val in sorted((gauges or {}).items()):
+            lines.extend(self._header(name))
+            lines.append(f"{name} {val:g}")
+        return "\n".join(lines) + "\n"
+
+    def _header(self, name: str) -> Iterator[str]:
+        """HELP and TYPE lines of a registered metric
+
+        :param name: metric name
+        """
+        if name in self._help:
+            kind, text = self._help[name]
+            yield f"# HELP {name} {text}"
+            yield f"# TYPE {name} {kind}"
+
+
+def format_labels(key: Labels) -> str:
+    """render label pairs the prometheus way
+
+    :param key: sorted label pairs
+    """
+    if not key:
+        return ""
+    pairs = ",".join(
+        f'{name}="{str(val).replace(chr(34), chr(39))}"' for name, val in key
+    )
+    return "{" + pairs + "}"
+
+
+def new_metrics() -> Metrics:
+    """metrics registry with every budget API metric described"""
+    metrics = Metrics()
+    for name, kind, text in (
+        ("budget_requests_total", "counter", "HTTP requests handled"),
+        (
+            "budget_request_duration_seconds",
+            "histogram",
+            "Wall time of HTTP requests",
+        ),
+        ("budget_db_queries_total", "counter", "SQL statements executed"),
+        (
+            "budget_db_query_duration_seconds",
+            "histogram",
+            "Time spent executing SQL statements",
+        ),
+        (
+            "budget_db_slow_queries_total",
+            "counter",
+            "SQL statements slower than SLOW_QUERY_MS",
+        ),
+        (
+            "budget_auth_duration_seconds",
+            "histogram",
+            "Time spent resolving API keys",
+        ),
+        ("budget_db_pool_size", "gauge", "Maximum pooled connections"),
+        ("budget_db_pool_open", "gauge", "Open pooled connections"),
+        ("budget_db_pool_in_use", "gauge", "Checked out connections"),
+        (
+            "budget_db_pool_opened_total",
+            "counter",
+            "Database connections opened",
+        ),
+        (
+            "budget_db_pool_checkouts_total",
+            "counter",
+            "Connection checkouts",
+        ),
+        (
+            "budget_db_pool_waits_total",
+            "counter",
+            "Checkouts that waited for a free connection",
+        ),
+        (
+            "budget_db_write_batch_seconds",
+            "histogram",
+            "Time spent writing and committing a batch of queued writes",
+        ),
+        (
+            "budget_db_write_queue_depth",
+            "gauge",
+            "Writes waiting for the writer thread",
+        ),
+        (
+            "budget_rate_limited_total",
+            "counter",
+            "Requests refused with 429 by a rate or in-flight limit",
+        ),
+    ):
+        metrics.describe(name, kind, text)
+    metrics.describe(
+        "budget_db_write_batch_size",
+        "histogram",
+        "Writes committed together in one transaction",
+        buckets=SIZE_BUCKETS,
+    )
+    return metrics
+
+
+class RequestTiming:
+    """timings collected while handling one request"""
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.queries: List[Tuple[str, float, int]] = []
+        self.db_time = 0.0
+        self.auth_time = 0.0
+        self.checkouts = 0
+
+
+def init_instrumentation(app: Flask) -> Metrics:
+    """register request hooks and the metrics registry
+
+    :param app: Flask app
+    """
+    for key, val in INSTRUMENTATION_DEFAULTS.items():
+        app.config.setdefault(key, val)
+    metrics = new_metrics()
+    app.extensions["metrics"] = metrics
+    app.before_request(start_request)
+    app.after_request(finish_request)
+    return metrics
+
+
+def get_metrics() -> Metrics:
+    """get the metrics registry of the current app"""
+    return current_app.extensions["metrics"]
+
+
+def current_timing() -> Optional[RequestTiming]:
+    """timings of the request being handled, if any"""
+    return g.get("timing")
+
+
+def start_request() -> None:
+    """start timing a request"""
+    g.timing = RequestTiming()
+
+
+def finish_request(response: Response) -> Response:
+    """record request metrics and add the Server-Timing header
+
+    :param response: response about to be sent
+    """
+    timing = current_timing()
+    if timing is None:
+        return response
+    elapsed = time.perf_counter() - timing.started
+    endpoint = request.endpoint or "unknown"
+    metrics = get_metrics()
+    metrics.inc(
+        "budget_requests_total",
+        method=request.method,
+        endpoint=endpoint,
+        status=str(response.status_code),
+    )
+    metrics.observe(
+        "budget_request_duration_seconds",
+        elapsed,
+        method=request.method,
+        endpoint=endpoint,
+    )
+    response.headers["Server-Timing"] = ", ".join(
+        [
+            f"app;dur={elapsed * 1000:.3f}",
+            f"db;dur={timing.db_time * 1000:.3f};"
+            f'desc="{len(timing.queries)} queries"',
+            f"auth;dur={timing.auth_time * 1000:.3f}",
+            f'pool;desc="{timing.checkouts} checkouts"',
+        ]
+    )
+    return response
+
+
+def record_query(sql: str, duration: float, rows: int) -> None:
+    """record one executed statement
+
+    :param sql: SQL text
+    :param duration: seconds spent executing and fetching
+    :param rows: rows returned or changed
+    """
+    statement = sql.lstrip().split(" ", 1)[0].upper()
+    metrics = get_metrics()
+    metrics.inc("budget_db_queries_total", statement=statement)
+    metrics.observe(
+        "budget_db_query_duration_seconds", duration, statement=statement
+    )
+    timing = current_timing()
+    if timing is not None:
+        timing.queries.append((sql, duration, rows))
+        timing.db_time += duration
+    if duration * 1000 >= current_app.config["SLOW_QUERY_MS"]:
+        metrics.inc("budget_db_slow_queries_total", statement=statement)
+        slow_query_log.warning(
+            "slow query %.1fms rows=%d: %s", duration * 1000, rows, sql
+        )
+
+
+def record_auth(duration: float) -> None:
+    """record time spent resolving an API key
+
+    :param duration: seconds spent
+    """
+    get_metrics().observe("budget_auth_duration_seconds", duration)
+    timing = current_timing()
+    if timing is not None:
+        timing.auth_time += duration
+
+
+def record_checkout() -> None:
+    """record a pooled connection checkout for the current request"""
+    timing = current_timing()
+    if timing is not None:
+        timing.checkouts += 1
+
+
+class QueryTimer:
+    """context manager timing one statement for record_query"""
+
+    def __init__(self, sql: str) -> None:
+        self.sql = sql
+        self.rows = 0
+        self.started = 0.0
+
+    def __enter__(self) -> "QueryTimer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        record_query(self.sql, time.perf_counter() - self.started, self.rows)
+
+
+def pool_gauges(stats: Dict[str, Any]) -> Dict[str, float]:
+    """prometheus values of the connection pool counters
+
+    :param stats: ConnectionPool.stats() output
+    """
+    return {
+        "budget_db_pool_size": stats["size"],
+        "budget_db_pool_open": stats["open"],
+        "budget_db_pool_in_use": stats["in_use"],
+        "budget_db_pool_opened_total": stats["opened"],
+        "budget_db_pool_checkouts_total": stats["checkouts"],
+        "budget_db_pool_waits_total": stats["waits"],
+    }
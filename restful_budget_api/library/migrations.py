@@ -0,0 +1,99 @@
+"""versioned schema migrations"""
+
+import os
+import re
+import sqlite3
+from typing import Iterator, List, Tuple
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), "../migrations")
+MIGRATION_FILE = re.compile(r"^(\d{4})_(\w+)\.sql$")
+
+
+def available_migrations() -> List[Tuple[int, str, str]]:
+    """list (version, name, path) of every shipped migration in order"""
+    migrations = []
+    for file_name in os.listdir(MIGRATIONS_DIR):
+        match = MIGRATION_FILE.match(file_name)
+        if match:
+            migrations.append(
+                (
+                    int(match.group(1)),
+                    match.group(2),
+                    os.path.join(MIGRATIONS_DIR, file_name),
+                )
+            )
+    return sorted(migrations)
+
+
+def split_statements(script: str) -> Iterator[str]:
+    """split a SQL script into complete statements
+
+    :param script: contents of a .sql file
+    """
+    statement = ""
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            yield statement.strip()
+            statement = ""
+    if statement.strip():
+        yield statement.strip()
+
+
+def applied_versions(db_client: sqlite3.Connection) -> List[int]:
+    """list migration versions already applied to a database
+
+    :param db_client: open database connection
+    """
+    db_client.execute(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, "
+        "name TEXT NOT NULL, "
+        "applied_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+    )
+    fetch = db_client.execute(
+        "SELECT version FROM schema_migrations ORDER BY version"
+    ).fetchall()
+    return [int(row[0]) for row in fetch]
+
+
+def migrate(database: str) -> List[int]:
+    """apply every pending migration, each in its own transaction
+
+    Each migration re-checks its version after taking the write lock so
+    several processes starting at once apply it exactly once.
+
+    :param database: path to database file
+    """
+    db_client = sqlite3.connect(database, isolation_level=None, timeout=30)
+    applied = []
+    try:
+        done = set(applied_versions(db_client))
+        for version, name, path in available_migrations():
+            if version in done:
+                continue
+            with open(path, "r", encoding="utf-8") as schema:
+                script = schema.read()
+            db_client.execute("BEGIN IMMEDIATE")
+            try:
+                if db_client.execute(
+                    "SELECT 1 FROM schema_migrations WHERE version = ?",
+                    (version,),
+                ).fetchone():
+                    db_client.execute("ROLLBACK")
+                    continue
+                for statement in split_statements(script):
+                    db_client.execute(statement)
+                db_client.execute(
+                    "INSERT INTO schema_migrations (version, name) "
+                    "VALUES (?, ?)",
+                    (version, name),
+                )
+                db_client.execute("COMMIT")
+            except Exception:
+                db_client.execute("ROLLBACK")
+                raise
+            applied.append(version)
+    finally:
+        db_client.close()
+    return applied
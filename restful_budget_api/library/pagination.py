@@ -0,0 +1,81 @@
+"""keyset pagination cursors and streamed record responses"""
+
+import base64
+import binascii
+import json
+from typing import Any, Iterable, Iterator, List, Tuple
+
+from flask import Response, stream_with_context
+
+STREAM_FORMATS = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def encode_cursor(*keys: Any) -> str:
+    """build an opaque cursor from the sort keys of the last record sent
+
+    :param keys: sort key values, e.g. date and id
+    """
+    raw = json.dumps(list(keys), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str, size: int) -> Tuple[Any, ...]:
+    """get sort keys back out of a cursor
+
+    :param cursor: cursor from a previous page
+    :param size: number of sort keys expected
+    """
+    try:
+        keys = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (binascii.Error, UnicodeError, ValueError) as err:
+        raise ValueError("cursor invalid") from err
+    if not isinstance(keys, list) or len(keys) != size:
+        raise ValueError("cursor invalid")
+    return tuple(keys)
+
+
+def iter_json_array(
+    rows: Iterable[Tuple[Any, ...]], schema: List[str]
+) -> Iterator[str]:
+    """encode rows as a JSON array one record at a time
+
+    :param rows: record rows
+    :param schema: table field names
+    """
+    yield "["
+    separator = ""
+    for row in rows:
+        yield separator + json.dumps(dict(zip(schema, row)))
+        separator = ","
+    yield "]\n"
+
+
+def iter_ndjson(
+    rows: Iterable[Tuple[Any, ...]], schema: List[str]
+) -> Iterator[str]:
+    """encode rows as newline delimited JSON
+
+    :param rows: record rows
+    :param schema: table field names
+    """
+    for row in rows:
+        yield json.dumps(dict(zip(schema, row))) + "\n"
+
+
+def stream_records(
+    rows: Iterable[Tuple[Any, ...]], schema: List[str], fmt: str
+) -> Response:
+    """stream rows to the client without materializing them
+
+    :param rows: lazy record rows, e.g. from db_iterate
+    :param schema: table field names
+    :param fmt: key of STREAM_FORMATS
+    """
+    encode = iter_ndjson if fmt == "ndjson" else iter_json_array
+    return Response(
+        stream_with_context(encode(rows, schema)),
+        mimetype=STREAM_FORMATS[fmt],
+    )
@@ -0,0 +1,355 @@
+"""token bucket rate limits and in-flight caps per API key"""
+
+import functools
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+    cast,
+)
+
+from flask import Flask, Response, current_app, g
+
+from restful_budget_api.library.instrumentation import Metrics
+
+RATE_LIMIT_DEFAULTS = {
+    "RATE_LIMIT_BACKEND": "memory",
+    "RATE_LIMIT_PATH": None,
+    "RATE_LIMIT_PER_KEY": 0.0,
+    "RATE_LIMIT_KEY_BURST": 20,
+    "RATE_LIMIT_GLOBAL": 0.0,
+    "RATE_LIMIT_GLOBAL_BURST": 200,
+    "RATE_LIMIT_BUCKETS": 10000,
+    "CONCURRENCY_PER_KEY": 0,
+}
+
+# seconds between sweeps of idle rows from the shared bucket table
+PRUNE_SECONDS = 60.0
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+# bucket name, tokens added per second and bucket size
+Bucket = Tuple[str, float, float]
+
+
+def refill(
+    tokens: float, updated: float, now: float, rate: float, burst: float
+) -> Tuple[float, float]:
+    """take one token from a bucket if it holds one
+
+    Returns the tokens left and the seconds to wait, 0 if the token was
+    taken. Refused requests take nothing, so a client that backs off for
+    the wait gets through.
+
+    :param tokens: tokens in the bucket at the last update
+    :param updated: time of the last update
+    :param now: current time
+    :param rate: tokens added per second
+    :param burst: bucket size
+    """
+    tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+    if tokens >= 1:
+        return (tokens - 1, 0.0)
+    return (tokens, (1 - tokens) / rate)
+
+
+def take_all(
+    states: List[Tuple[float, float]], buckets: Sequence[Bucket], now: float
+) -> Tuple[List[float], float]:
+    """take one token from every bucket, or from none if any is empty
+
+    Returns the tokens left in each bucket and the longest wait, 0 if the
+    tokens were taken.
+
+    :param states: tokens and last update time of each bucket
+    :param buckets: buckets matching states
+    :param now: current time
+    """
+    taken = [
+        refill(tokens, updated, now, rate, burst)
+        for (tokens, updated), (_, rate, burst) in zip(states, buckets)
+    ]
+    wait = max((bucket_wait for _, bucket_wait in taken), default=0.0)
+    if not wait:
+        return ([tokens for tokens, _ in taken], 0.0)
+    # give back the tokens taken from buckets that were not empty
+    return (
+        [tokens + (0 if bucket_wait else 1) for tokens, bucket_wait in taken],
+        wait,
+    )
+
+
+class MemoryBackend:
+    """buckets of this process, the least recently used dropped past a size
+
+    Each worker limits on its own, so with N workers a key gets up to N
+    times the configured rate.
+    """
+
+    def __init__(self, size: int = 10000) -> None:
+        self.size = size
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, buckets: Sequence[Bucket]) -> float:
+        """take a token from every bucket, or from none if any is empty
+
+        Returns the seconds to wait or 0 if allowed.
+
+        :param buckets: name, rate and size of each bucket
+        """
+        now = time.monotonic()
+        with self._lock:
+            states = [
+                self._buckets.pop(key, (burst, now))
+                for key, _, burst in buckets
+            ]
+            left, wait = take_all(states, buckets, now)
+            for (key, _, _), tokens in zip(buckets, left):
+                self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.size:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+class SQLiteBackend:
+    """buckets in a local SQLite file shared by every worker process
+
+    A bucket idle long enough to refill is the same as no row, so rows
+    idle longer than the slowest refill are swept now and then.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._local = threading.local()
+        self._pruned = time.time()
+        db_client = sqlite3.connect(path, timeout=5)
+        db_client.execute("PRAGMA journal_mode=WAL")
+        db_client.execute(
+            "CREATE TABLE IF NOT EXISTS rate_buckets ("
+            "key TEXT PRIMARY KEY, tokens REAL NOT NULL, "
+            "updated REAL NOT NULL) WITHOUT ROWID"
+        )
+        db_client.commit()
+        db_client.close()
+
+    def _db(self) -> sqlite3.Connection:
+        """connection of the current thread and process"""
+        if getattr(self._local, "pid", None) != os.getpid():
+            self._local.db_client = sqlite3.connect(
+                self.path, timeout=5, isolation_level=None
+            )
+            self._local.db_client.execute("PRAGMA synchronous=OFF")
+            self._local.pid = os.getpid()
+        return self._local.db_client
+
+    def take(self, buckets: Sequence[Bucket]) -> float:
+        """take a token from every bucket, or from none if any is empty
+
+        Returns the seconds to wait or 0 if allowed.
+
+        :param buckets: name, rate and size of each bucket
+        """
+        db_client = self._db()
+        # wall clock, since monotonic clocks differ between processes
+        now = time.time()
+        db_client.execute("BEGIN IMMEDIATE")
+        try:
+            states = []
+            for key, _, burst in buckets:
+                fetch = db_client.execute(
+                    "SELECT tokens, updated FROM rate_buckets WHERE key = ?",
+                    (key,),
+                ).fetchone()
+                states.append(fetch if fetch is not None else (burst, now))
+            left, wait = take_all(states, buckets, now)
+            db_client.executemany(
+                "INSERT OR REPLACE INTO rate_buckets VALUES (?, ?, ?)",
+                [
+                    (key, tokens, now)
+                    for (key, _, _), tokens in zip(buckets, left)
+                ],
+            )
+            if now - self._pruned > PRUNE_SECONDS:
+                self._pruned = now
+                db_client.execute(
+                    "DELETE FROM rate_buckets WHERE updated < ?",
+                    (now - max(burst / rate for _, rate, burst in buckets),),
+                )
+            db_client.execute("COMMIT")
+        except Exception:
+            db_client.execute("ROLLBACK")
+            raise
+        return wait
+
+
+class RateLimiter:
+    """per key and global token buckets plus per key in-flight counters"""
+
+    def __init__(
+        self,
+        backend: Any,
+        key_rate: float,
+        key_burst: float,
+        global_rate: float,
+        global_burst: float,
+        concurrency: int,
+        metrics: Optional[Metrics] = None,
+    ) -> None:
+        self.backend = backend
+        self.key_rate = key_rate
+        self.key_burst = key_burst
+        self.global_rate = global_rate
+        self.global_burst = global_burst
+        self.concurrency = concurrency
+        self.metrics = metrics
+        self._in_flight: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._limited = 0
+
+    def check(self, user_id: int) -> float:
+        """take a token from the user and global buckets
+
+        Tokens are taken from both or neither, so a request the global
+        limit refuses does not use up the user's allowance. Returns the
+        seconds to wait, 0 if the request may go ahead.
+
+        :param user_id: id of user making the request
+        """
+        buckets: List[Bucket] = []
+        if self.key_rate > 0:
+            buckets.append((f"user:{user_id}", self.key_rate, self.key_burst))
+        if self.global_rate > 0:
+            buckets.append(("global", self.global_rate, self.global_burst))
+        if not buckets:
+            return 0.0
+        wait = self.backend.take(buckets)
+        if wait:
+            self.refused("rate")
+        return wait
+
+    def enter(self, user_id: int) -> bool:
+        """count a request in flight, False if the user is at the cap
+
+        :param user_id: id of user making the request
+        """
+        if not self.concurrency:
+            return True
+        with self._lock:
+            count = self._in_flight.get(user_id, 0)
+            if count < self.concurrency:
+                self._in_flight[user_id] = count + 1
+                return True
+        self.refused("concurrency")
+        return False
+
+    def leave(self, user_id: int) -> None:
+        """count a request of the user as finished
+
+        :param user_id: id of user making the request
+        """
+        with self._lock:
+            count = self._in_flight.pop(user_id, 1) - 1
+            if count > 0:
+                self._in_flight[user_id] = count
+
+    def refused(self, reason: str) -> None:
+        """count a refused request
+
+        :param reason: limit that refused it, rate or concurrency
+        """
+        with self._lock:
+            self._limited += 1
+        if self.metrics is not None:
+            self.metrics.inc("budget_rate_limited_total", reason=reason)
+
+    def stats(self) -> Dict[str, Any]:
+        """limit settings and counters"""
+        with self._lock:
+            return {
+                "per_key": self.key_rate,
+                "global": self.global_rate,
+                "concurrency_per_key": self.concurrency,
+                "in_flight": sum(self._in_flight.values()),
+                "limited": self._limited,
+            }
+
+
+def init_rate_limiter(app: Flask) -> RateLimiter:
+    """create the app rate limiter with the configured backend
+
+    :param app: Flask app
+    """
+    for key, val in RATE_LIMIT_DEFAULTS.items():
+        app.config.setdefault(key, val)
+    if app.config["RATE_LIMIT_BACKEND"] == "sqlite":
+        path = app.config["RATE_LIMIT_PATH"] or (
+            f"{app.config['DATABASE']}.limits"
+        )
+        backend: Any = SQLiteBackend(path)
+    else:
+        backend = MemoryBackend(app.config["RATE_LIMIT_BUCKETS"])
+    limiter = RateLimiter(
+        backend,
+        key_rate=app.config["RATE_LIMIT_PER_KEY"],
+        key_burst=app.config["RATE_LIMIT_KEY_BURST"],
+        global_rate=app.config["RATE_LIMIT_GLOBAL"],
+        global_burst=app.config["RATE_LIMIT_GLOBAL_BURST"],
+        concurrency=app.config["CONCURRENCY_PER_KEY"],
+        metrics=app.extensions.get("metrics"),
+    )
+    app.extensions["rate_limiter"] = limiter
+    return limiter
+
+
+def get_rate_limiter() -> RateLimiter:
+    """get the rate limiter of the current app"""
+    return current_app.extensions["rate_limiter"]
+
+
+def too_many(
+    error: str, wait: float
+) -> Tuple[Dict[str, str], int, Dict[str, str]]:
+    """429 response asking the client to wait
+
+    :param error: reason for the refusal
+    :param wait: seconds until a retry may succeed
+    """
+    return ({"error": error}, 429, {"Retry-After": str(math.ceil(wait))})
+
+
+def limit_concurrency(func: F) -> F:
+    """cap the requests of one user in flight, place under api_key_required
+
+    Streamed responses count until the last chunk is sent.
+    """
+
+    @functools.wraps(func)
+    def decorator(*args: Any, **kwargs: Any) -> Any:
+        limiter = get_rate_limiter()
+        user_id = g.user_id
+        if not limiter.enter(user_id):
+            return too_many("too many requests in flight", 1)
+        try:
+            resp = func(*args, **kwargs)
+        except BaseException:
+            limiter.leave(user_id)
+            raise
+        if isinstance(resp, Response) and resp.is_streamed:
+            resp.call_on_close(lambda: limiter.leave(user_id))
+        else:
+            limiter.leave(user_id)
+        return resp
+
+    return cast(F, decorator)
@@ -0,0 +1,298 @@
+"""per table data access with constant statements and tuple rows"""
+
+import functools
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from restful_budget_api.library import db_connector
+from restful_budget_api.library.db_connector import (
+    db_add_new_record,
+    db_change_returning,
+    db_execute_returning,
+    db_fetchall,
+    db_fetchone,
+    db_in_ids,
+    db_record_exists,
+)
+
+
+class UserRow(NamedTuple):
+    """users table row"""
+
+    id: int
+    username: str
+    password: str
+
+
+class ExpenseRow(NamedTuple):
+    """expenses table row"""
+
+    id: int
+    user_id: int
+    date: str
+    description: str
+    amount: float
+
+
+class PatternRow(NamedTuple):
+    """patterns table row"""
+
+    id: int
+    title: str
+    date: str
+    value: str
+    frequency: str
+    interval: int
+    end_date: Optional[str]
+    version: int
+
+
+@functools.lru_cache(maxsize=256)
+def insert_sql(table: str, fields: Tuple[str, ...], columns: str) -> str:
+    """INSERT statement for one combination of fields
+
+    :param table: table name
+    :param fields: fields given a value, checked against the row type
+    :param columns: columns to return
+    """
+    return (
+        f"INSERT INTO {table} ({', '.join(fields)}) "
+        f"VALUES ({', '.join(['?' for _ in fields])}) RETURNING {columns}"
+    )
+
+
+@functools.lru_cache(maxsize=256)
+def update_sql(table: str, fields: Tuple[str, ...], where: str) -> str:
+    """UPDATE statement for one combination of fields
+
+    :param table: table name
+    :param fields: fields to set, checked against the row type
+    :param where: WHERE clause
+    """
+    return (
+        f"UPDATE {table} SET {', '.join(f'{field} = ?' for field in fields)} "
+        f"WHERE {where}"
+    )
+
+
+class Repo:
+    """statements and row type of one table
+
+    Subclasses set the table, its row type and their statements as class
+    constants. Statements depending on which fields are set are memoized
+    per field combination. Statement text never changes between requests,
+    so sqlite3's bounded per connection statement cache
+    (DB_CACHED_STATEMENTS) prepares each of them once. Rows come back as
+    named tuples, turned into dicts only for responses.
+    """
+
+    table = ""
+    row: Any = tuple
+    columns = ""
+    select_sql = ""
+    get_sql = ""
+
+    def fields(self, values: Dict[str, Any]) -> Tuple[str, ...]:
+        """names of the given fields, refusing any the table lacks
+
+        :param values: field names and values
+        """
+        unknown = set(values) - set(self.row._fields)
+        if unknown:
+            raise KeyError(f"{self.table} has no field {sorted(unknown)[0]}")
+        return tuple(values)
+
+    def rows(self, sql: str, data: Tuple[Any, ...] = tuple("")) -> List[Any]:
+        """run a query selecting the row columns
+
+        :param sql: statement starting with select_sql
+        :param data: tuple of variables to insert into sql
+        """
+        return [self.row._make(fetch) for fetch in db_fetchall(sql, data)]
+
+    def get(self, record_id: int) -> Optional[Any]:
+        """get a record by id
+
+        :param record_id: id number of record
+        """
+        fetch = db_fetchone(self.get_sql, (record_id,))
+        return None if fetch is None else self.row._make(fetch)
+
+    def exists(self, record_id: int, user_id: Optional[int] = None) -> bool:
+        """check a record exists, and belongs to a user if one is given
+
+        :param record_id: id number of record
+        :param user_id: id of user that must own the record
+        """
+        return db_record_exists(self.table, record_id, user_id)
+
+    def insert(self, values: Dict[str, Any]) -> Any:
+        """add a record and return it
+
+        :param values: field names and values of the new record
+        """
+        fields = self.fields(values)
+        # read at call time so the fallback can be tested on newer SQLite
+        if not db_connector.HAS_RETURNING:
+            return self.row(**db_add_new_record(self.table, values))
+        fetch = db_execute_returning(
+            sql=insert_sql(self.table, fields, self.columns),
+            data=tuple(values.values()),
+        )
+        return self.row._make(fetch[0])
+
+
+class UserRepo(Repo):
+    """users table"""
+
+    table = "users"
+    row = UserRow
+    columns = ", ".join(UserRow._fields)
+    select_sql = f"SELECT {columns} FROM users"
+    get_sql = f"{select_sql} WHERE id = ?"
+    key_sql = "SELECT id FROM users WHERE password = ?"
+    delete_sql = "DELETE FROM users WHERE id = ?"
+
+    def id_for_key(self, api_key: str) -> Optional[int]:
+        """get the id of the user holding an API key
+
+        :param api_key: user's api key
+        """
+        fetch = db_fetchone(self.key_sql, (api_key,))
+        return None if fetch is None else int(fetch[0])
+
+    def delete(self, user_id: int) -> bool:
+        """delete a user, False if there was none
+
+        :param user_id: id number of user
+        """
+        return bool(
+            db_change_returning(
+                self.delete_sql,
+                (user_id,),
+                "id",
+                "SELECT id FROM users WHERE id = ?",
+                (user_id,),
+            )
+        )
+
+
+class ExpenseRepo(Repo):
+    """expenses table, every write is scoped to the owning user"""
+
+    table = "expenses"
+    row = ExpenseRow
+    columns = ", ".join(ExpenseRow._fields)
+    select_sql = f"SELECT {columns} FROM expenses"
+    get_sql = f"{select_sql} WHERE id = ?"
+    user_sql = f"{select_sql} WHERE user_id = ?"
+    owned_sql = f"{select_sql} WHERE id = ? AND user_id = ?"
+    delete_sql = "DELETE FROM expenses WHERE id = ? AND user_id = ?"
+
+    def update(
+        self, record_id: int, user_id: int, changes: Dict[str, Any]
+    ) -> Optional[ExpenseRow]:
+        """change fields of a user's record, None if nothing matched
+
+        :param record_id: id number of record
+        :param user_id: id of user owning the record
+        :param changes: field names and new values
+        """
+        sql = update_sql(
+            self.table, self.fields(changes), "id = ? AND user_id = ?"
+        )
+        fetch = db_change_returning(
+            sql,
+            (*changes.values(), record_id, user_id),
+            self.columns,
+            self.owned_sql,
+            (record_id, user_id),
+            select_after=True,
+        )
+        return ExpenseRow._make(fetch[0]) if fetch else None
+
+    def delete(self, record_id: int, user_id: int) -> bool:
+        """delete a user's record, False if nothing matched
+
+        :param record_id: id number of record
+        :param user_id: id of user owning the record
+        """
+        return bool(
+            db_change_returning(
+                self.delete_sql,
+                (record_id, user_id),
+                "id",
+                "SELECT id FROM expenses WHERE id = ? AND user_id = ?",
+                (record_id, user_id),
+            )
+        )
+
+    def update_many(
+        self, ids: List[int], user_id: int, changes: Dict[str, Any]
+    ) -> List[int]:
+        """change the same fields of a user's records among ids
+
+        :param ids: record ids
+        :param user_id: id of user owning the records
+        :param changes: field names and new values
+        """
+        in_ids, id_data = db_in_ids(ids)
+        where = f"user_id = ? AND id {in_ids}"
+        fetch = db_change_returning(
+            update_sql(self.table, self.fields(changes), where),
+            (*changes.values(), user_id, *id_data),
+            "id",
+            f"SELECT id FROM expenses WHERE {where}",
+            (user_id, *id_data),
+        )
+        return sorted(int(record[0]) for record in fetch)
+
+    def delete_many(self, ids: List[int], user_id: int) -> List[int]:
+        """delete a user's records among ids
+
+        :param ids: record ids
+        :param user_id: id of user owning the records
+        """
+        in_ids, id_data = db_in_ids(ids)
+        where = f"user_id = ? AND id {in_ids}"
+        fetch = db_change_returning(
+            f"DELETE FROM expenses WHERE {where}",
+            (user_id, *id_data),
+            "id",
+            f"SELECT id FROM expenses WHERE {where}",
+            (user_id, *id_data),
+        )
+        return sorted(int(record[0]) for record in fetch)
+
+
+class PatternRepo(Repo):
+    """patterns table"""
+
+    table = "patterns"
+    row = PatternRow
+    columns = ", ".join(PatternRow._fields)
+    select_sql = f"SELECT {columns} FROM patterns"
+    get_sql = f"{select_sql} WHERE id = ?"
+    title_sql = f"{select_sql} WHERE title = ?"
+    active_sql = (
+        f"{select_sql} WHERE date <= ? AND (end_date IS NULL OR end_date >= ?)"
+    )
+
+    def all(self) -> List[PatternRow]:
+        """every pattern"""
+        return self.rows(self.select_sql)
+
+    def by_title(self, title: str) -> Optional[PatternRow]:
+        """get a pattern by its lowercase title
+
+        :param title: pattern title
+        """
+        fetch = db_fetchone(self.title_sql, (title,))
+        return None if fetch is None else PatternRow._make(fetch)
+
+    def active(self, start: str, end: str) -> List[PatternRow]:
+        """patterns that may recur between two dates
+
+        :param start: first day, YYYY-MM-DD
+        :param end: last day, YYYY-MM-DD
+        """
+        return self.rows(self.active_sql, (end, start))
@@ -0,0 +1,127 @@
+"""JSON response encoding with an optional fast encoder"""
+
+import json
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from flask import Flask, Response, current_app
+
+from restful_budget_api.library.db_connector import (
+    HAS_JSON,
+    db_build_table,
+    db_fetch_json,
+    db_fetchall,
+)
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+def encode_stdlib(data: Any) -> bytes:
+    """encode with the standard library json module
+
+    :param data: JSON serializable data
+    """
+    return (json.dumps(data) + "\n").encode("utf-8")
+
+
+def encode_orjson(data: Any) -> bytes:
+    """encode with orjson, several times faster on large record lists
+
+    :param data: JSON serializable data
+    """
+    return orjson.dumps(data, option=orjson.OPT_APPEND_NEWLINE)
+
+
+ENCODERS: Dict[str, Callable[[Any], bytes]] = {"stdlib": encode_stdlib}
+if orjson is not None:
+    ENCODERS["orjson"] = encode_orjson
+
+REPRESENTATION_DEFAULTS = {
+    "JSON_ENCODER": "orjson" if orjson is not None else "stdlib",
+    "JSON_FROM_DB": HAS_JSON,
+}
+
+
+def init_representation(app: Flask) -> None:
+    """set the JSON encoding config of the app
+
+    :param app: Flask app
+    """
+    for key, val in REPRESENTATION_DEFAULTS.items():
+        app.config.setdefault(key, val)
+    if app.config["JSON_ENCODER"] not in ENCODERS:
+        raise ValueError(
+            f"JSON encoder {app.config['JSON_ENCODER']} not available, "
+            f"use one of {', '.join(ENCODERS)}"
+        )
+    if app.config["JSON_FROM_DB"] and not HAS_JSON:
+        raise ValueError("SQLite JSON functions not available")
+
+
+def encode_json(data: Any) -> bytes:
+    """encode data with the encoder configured for the current app
+
+    Debug apps and apps with RESTFUL_JSON settings keep flask_restful's
+    indented stdlib output.
+
+    :param data: JSON serializable data
+    """
+    settings = current_app.config.get("RESTFUL_JSON")
+    if current_app.debug or settings:
+        settings = dict(settings or {})
+        settings.setdefault("indent", 4)
+        return (json.dumps(data, **settings) + "\n").encode("utf-8")
+    return ENCODERS[current_app.config["JSON_ENCODER"]](data)
+
+
+def json_response(
+    body: bytes, code: int = 200, headers: Optional[Dict[str, str]] = None
+) -> Response:
+    """wrap an already encoded JSON body
+
+    :param body: encoded JSON
+    :param code: HTTP status code
+    :param headers: extra response headers
+    """
+    return Response(
+        body, status=code, mimetype="application/json", headers=headers
+    )
+
+
+def output_json(
+    data: Any, code: int, headers: Optional[Dict[str, str]] = None
+) -> Response:
+    """flask_restful application/json representation
+
+    :param data: JSON serializable data returned by a resource
+    :param code: HTTP status code
+    :param headers: extra response headers
+    """
+    return json_response(encode_json(data), code, headers)
+
+
+def table_response(
+    sql: str,
+    data: Tuple[Any, ...],
+    schema: List[str],
+    headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """send every row of a query as a JSON array of records
+
+    With JSON_FROM_DB the array is built by SQLite, skipping the Python
+    dict per row entirely.
+
+    :param sql: formatted SQL statement selecting schema columns
+    :param data: tuple of variables to insert into sql
+    :param schema: field names of the selected columns
+    :param headers: extra response headers
+    """
+    if current_app.config["JSON_FROM_DB"]:
+        body = db_fetch_json(sql=sql, schema=schema, data=data)
+        return json_response(f"{body}\n".encode("utf-8"), 200, headers)
+    table = db_build_table(
+        fetch=db_fetchall(sql=sql, data=data), schema=schema
+    )
+    return output_json(table, 200, headers)
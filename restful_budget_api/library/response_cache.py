@@ -0,0 +1,288 @@
+"""serialized JSON response cache with pluggable backends"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from flask import Flask, Response, current_app
+
+from restful_budget_api.library.conditional import conditional_get
+from restful_budget_api.library.representation import encode_json
+
+RESPONSE_CACHE_DEFAULTS = {
+    "RESPONSE_CACHE_BACKEND": "memory",
+    "RESPONSE_CACHE_BYTES": 8 * 1024 * 1024,
+    "RESPONSE_CACHE_PATH": None,
+}
+
+
+class MemoryBackend:
+    """LRU store bounded by the total size of the cached values
+
+    Each process has its own copy, so invalidations only reach the worker
+    that made the write.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        """get a cached value
+
+        :param key: cache key
+        """
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes) -> None:
+        """cache a value, evicting least recently used ones past the limit
+
+        :param key: cache key
+        :param value: serialized response
+        """
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = value
+            self._bytes += len(value)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def delete_prefix(self, prefix: str) -> None:
+        """drop every key starting with prefix
+
+        :param prefix: key prefix
+        """
+        with self._lock:
+            for key in [
+                key for key in self._entries if key.startswith(prefix)
+            ]:
+                self._bytes -= len(self._entries.pop(key))
+
+    def stats(self) -> Dict[str, Any]:
+        """entry count and size"""
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes}
+
+
+class SQLiteBackend:
+    """store in a local SQLite file shared by every worker process
+
+    Stands in for an external cache server. Eviction drops the oldest
+    writes first once the size limit is passed.
+    """
+
+    def __init__(self, path: str, max_bytes: int) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        db_client = sqlite3.connect(path, timeout=5)
+        db_client.execute("PRAGMA journal_mode=WAL")
+        db_client.execute(
+            "CREATE TABLE IF NOT EXISTS response_cache ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+            "size INTEGER NOT NULL, written_at REAL NOT NULL)"
+        )
+        db_client.commit()
+        db_client.close()
+
+    def _db(self) -> sqlite3.Connection:
+        """connection of the current thread and process"""
+        if getattr(self._local, "pid", None) != os.getpid():
+            self._local.db_client = sqlite3.connect(
+                self.path, timeout=5, isolation_level=None
+            )
+            self._local.db_client.execute("PRAGMA synchronous=NORMAL")
+            self._local.pid = os.getpid()
+        return self._local.db_client
+
+    def get(self, key: str) -> Optional[bytes]:
+        """get a cached value
+
+        :param key: cache key
+        """
+        fetch = (
+            self._db()
+            .execute("SELECT value FROM response_cache WHERE key = ?", (key,))
+            .fetchone()
+        )
+        return None if fetch is None else bytes(fetch[0])
+
+    def set(self, key: str, value: bytes) -> None:
+        """cache a value, evicting the oldest ones past the limit
+
+        :param key: cache key
+        :param value: serialized response
+        """
+        if len(value) > self.max_bytes:
+            return
+        db_client = self._db()
+        db_client.execute("BEGIN IMMEDIATE")
+        try:
+            db_client.execute(
+                "INSERT OR REPLACE INTO response_cache VALUES (?, ?, ?, ?)",
+                (key, value, len(value), time.time()),
+            )
+            total = db_client.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM response_cache"
+            ).fetchone()[0]
+            while total > self.max_bytes:
+                oldest = db_client.execute(
+                    "SELECT key, size FROM response_cache "
+                    "ORDER BY written_at LIMIT 1"
+                ).fetchone()
+                db_client.execute(
+                    "DELETE FROM response_cache WHERE key = ?", (oldest[0],)
+                )
+                total -= oldest[1]
+            db_client.execute("COMMIT")
+        except Exception:
+            db_client.execute("ROLLBACK")
+            raise
+
+    def delete_prefix(self, prefix: str) -> None:
+        """drop every key starting with prefix
+
+        :param prefix: key prefix
+        """
+        self._db().execute(
+            "DELETE FROM response_cache WHERE substr(key, 1, ?) = ?",
+            (len(prefix), prefix),
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """entry count and size"""
+        fetch = (
+            self._db()
+            .execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM response_cache"
+            )
+            .fetchone()
+        )
+        return {"entries": fetch[0], "bytes": fetch[1]}
+
+
+class ResponseCache:
+    """JSON bodies and their validators cached per namespace"""
+
+    def __init__(self, backend: Any) -> None:
+        self.backend = backend
+
+    def get(self, namespace: str, key: str) -> Optional[Dict[str, Any]]:
+        """get a cached body and headers
+
+        :param namespace: group of entries invalidated together
+        :param key: entry key within the namespace
+        """
+        value = self.backend.get(f"{namespace}:{key}")
+        if value is None:
+            return None
+        return json.loads(value)
+
+    def set(
+        self,
+        namespace: str,
+        key: str,
+        body: str,
+        headers: Dict[str, str],
+    ) -> None:
+        """cache a serialized body and its headers
+
+        :param namespace: group of entries invalidated together
+        :param key: entry key within the namespace
+        :param body: serialized JSON response body
+        :param headers: response headers such as ETag
+        """
+        value = json.dumps({"body": body, "headers": headers})
+        self.backend.set(f"{namespace}:{key}", value.encode("utf-8"))
+
+    def invalidate(self, namespace: str) -> None:
+        """drop every entry of a namespace
+
+        :param namespace: group of entries, e.g. a table name
+        """
+        self.backend.delete_prefix(f"{namespace}:")
+
+
+def init_response_cache(app: Flask) -> ResponseCache:
+    """create the app response cache with the configured backend
+
+    :param app: Flask app
+    """
+    for key, val in RESPONSE_CACHE_DEFAULTS.items():
+        app.config.setdefault(key, val)
+    max_bytes = app.config["RESPONSE_CACHE_BYTES"]
+    if app.config["RESPONSE_CACHE_BACKEND"] == "sqlite":
+        path = app.config["RESPONSE_CACHE_PATH"] or (
+            f"{app.config['DATABASE']}.cache"
+        )
+        backend: Any = SQLiteBackend(path, max_bytes)
+    else:
+        backend = MemoryBackend(max_bytes)
+    cache = ResponseCache(backend)
+    app.extensions["response_cache"] = cache
+    return cache
+
+
+def get_response_cache() -> ResponseCache:
+    """get the response cache of the current app"""
+    return current_app.extensions["response_cache"]
+
+
+def cached_response(
+    namespace: str,
+) -> Tuple[Optional[Response], Dict[str, str]]:
+    """answer the current request with a 304 or from the cache, if possible
+
+    Entries are keyed by the ETag, which covers the change_versions counter
+    of the table and the query string. A write bumps the counter in the
+    database, so every worker stops using older entries right away and a
+    body read before a write commits is never served after it. Returns the
+    response, or None and the headers to send with a fresh body.
+
+    :param namespace: table name, also the group of entries invalidated
+        together
+    """
+    not_modified, headers = conditional_get(namespace)
+    if not_modified is not None:
+        return (not_modified, headers)
+    entry = get_response_cache().get(namespace, headers["ETag"])
+    if entry is None:
+        return (None, headers)
+    return (
+        Response(
+            entry["body"],
+            mimetype="application/json",
+            headers=entry["headers"],
+        ),
+        headers,
+    )
+
+
+def cache_response(
+    namespace: str, data: Any, headers: Dict[str, str]
+) -> Response:
+    """serialize data, cache it under its ETag and send it
+
+    :param namespace: table name, also the group of entries invalidated
+        together
+    :param data: JSON serializable response data
+    :param headers: headers from cached_response, ETag included
+    """
+    body = encode_json(data).decode("utf-8")
+    get_response_cache().set(namespace, headers["ETag"], body, headers)
+    return Response(body, mimetype="application/json", headers=headers)
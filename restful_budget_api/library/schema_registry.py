@@ -0,0 +1,43 @@
+"""table schemas read once per app instead of per request"""
+
+import sqlite3
+from typing import Dict, List
+
+from flask import Flask, current_app
+
+
+def load_schemas(database: str) -> Dict[str, List[str]]:
+    """read field names of every table with PRAGMA table_info
+
+    :param database: path to database file
+    """
+    db_client = sqlite3.connect(database)
+    try:
+        tables = db_client.execute(
+            "SELECT name FROM sqlite_master "
+            "WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+        ).fetchall()
+        return {
+            table: [
+                field[1]
+                for field in db_client.execute(f"PRAGMA table_info({table})")
+            ]
+            for (table,) in tables
+        }
+    finally:
+        db_client.close()
+
+
+def init_schemas(app: Flask) -> Dict[str, List[str]]:
+    """build or rebuild the schema registry of an app, e.g. after migrating
+
+    :param app: Flask app
+    """
+    schemas = load_schemas(app.config["DATABASE"])
+    app.extensions["db_schemas"] = schemas
+    return schemas
+
+
+def get_schemas() -> Dict[str, List[str]]:
+    """get the schema registry of the current app"""
+    return current_app.extensions["db_schemas"]
@@ -1,12 +1,17 @@
 """security wrappers and auth checks"""
 
 import functools
+import time
 from typing import Any, Callable, Dict, Tuple, TypeVar, Union, cast
 
-from flask import request
+from flask import g, request
 from flask_restful import current_app
 
-from restful_budget_api.library.db_connector import db_fetchall, db_fetchone
+from restful_budget_api.library.auth_cache import MISSING, get_auth_cache
+from restful_budget_api.library.conditional import GLOBAL_USER, change_version
+from restful_budget_api.library.instrumentation import record_auth
+from restful_budget_api.library.rate_limit import get_rate_limiter, too_many
+from restful_budget_api.library.repositories import UserRepo
 
 F = TypeVar("F", bound=Callable[..., Any])
 
@@ -26,7 +31,11 @@ def admin_required(func: F) -> F:
 
 
 def api_key_required(func: F) -> F:
-    """require api_key passed with request json"""
+    """require api_key passed with request json
+
+    Each request also takes a token from the user and global rate limit
+    buckets, refused with 429 and Retry-After once they run dry.
+    """
 
     @functools.wraps(func)
     def decorator(
@@ -42,13 +51,13 @@ def api_key_required(func: F) -> F:
                 },
                 400,
             )
-        user_key = request.headers.get("Authorization")
-        api_keys = [
-            api_key[0]
-            for api_key in db_fetchall(sql="SELECT password FROM users")
-        ]
-        if user_key not in api_keys:
+        user_id = lookup_user(request.headers["Authorization"])
+        if user_id is None:
             return ({"error": "API key not valid"}, 401)
+        g.user_id = user_id
+        wait = get_rate_limiter().check(user_id)
+        if wait:
+            return too_many("rate limit exceeded", wait)
         return cast(F, func(*args, **kwargs))
 
     return cast(F, decorator)
@@ -76,13 +85,25 @@ def strict_verbiage(func: F) -> F:
     return cast(F, decorator)
 
 
-def get_user() -> int:
-    """get a user ID from an API key
+def lookup_user(api_key: str) -> Union[int, None]:
+    """resolve an API key to a user ID through the auth cache
 
     :param api_key: user's api key
     """
-    user_id = db_fetchone(
-        "SELECT id FROM users WHERE password = ?",
-        (request.headers["Authorization"],),
-    )
-    return int(user_id[0])
+    started = time.perf_counter()
+    cache = get_auth_cache()
+    if cache.needs_check():
+        cache.sync(change_version("users", GLOBAL_USER)[0])
+    user_id = cache.get(api_key)
+    if user_id is MISSING:
+        user_id = UserRepo().id_for_key(api_key)
+        cache.put(api_key, user_id)
+    record_auth(time.perf_counter() - started)
+    return cast(Union[int, None], user_id)
+
+
+def get_user() -> int:
+    """get the user ID resolved by api_key_required for this request"""
+    if "user_id" not in g:
+        g.user_id = lookup_user(request.headers["Authorization"])
+    return int(g.user_id)
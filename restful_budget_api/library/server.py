@@ -0,0 +1,125 @@
+"""multi-process WSGI serving with gunicorn and ASGI serving with uvicorn"""
+
+from typing import Any, Dict
+
+from flask import Flask
+
+from restful_budget_api.library.asgi import WSGIBridge
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:  # pragma: no cover - optional dependency
+    BaseApplication = None
+
+try:
+    import uvicorn
+except ImportError:  # pragma: no cover - optional dependency
+    uvicorn = None
+
+
+def server_options(
+    host: str,
+    port: int,
+    workers: int,
+    threads: int = 1,
+    keep_alive: int = 5,
+    graceful_timeout: int = 30,
+) -> Dict[str, Any]:
+    """build gunicorn settings for the budget API
+
+    Threaded workers are used whenever more than one thread is asked for
+    since gunicorn's sync workers do not support keep-alive.
+
+    :param host: interface to bind
+    :param port: port to bind
+    :param workers: number of pre-forked worker processes
+    :param threads: request threads per worker
+    :param keep_alive: seconds to hold idle keep-alive connections open
+    :param graceful_timeout: seconds workers get to finish on reload/stop
+    """
+    return {
+        "bind": f"{host}:{port}",
+        "workers": workers,
+        "threads": threads,
+        "worker_class": "gthread" if threads > 1 else "sync",
+        "keepalive": keep_alive,
+        "graceful_timeout": graceful_timeout,
+        # migrations and schema loading run once in the master before fork
+        "preload_app": True,
+        "post_fork": release_inherited_pool,
+    }
+
+
+def release_inherited_pool(_: Any, worker: Any) -> None:
+    """give each worker a pool of its own after fork
+
+    :param _: gunicorn arbiter
+    :param worker: gunicorn worker holding the app
+    """
+    pool = worker.app.wsgi().extensions.get("db_pool")
+    if pool is not None:
+        pool.reset()
+
+
+def serve(app: Flask, options: Dict[str, Any]) -> None:
+    """run the app under gunicorn until stopped
+
+    Send SIGHUP to the master process for a graceful worker reload.
+
+    :param app: Flask app with resources registered
+    :param options: gunicorn settings from server_options
+    """
+    if BaseApplication is None:
+        raise SystemExit(
+            "gunicorn is required for --workers, install it with "
+            "`poetry install -E workers`"
+        )
+
+    class BudgetApplication(BaseApplication):  # type: ignore [misc]
+        """gunicorn application wrapping an already built Flask app"""
+
+        def load_config(self) -> None:
+            for key, val in options.items():
+                self.cfg.set(key, val)
+
+        def load(self) -> Flask:
+            return app
+
+    BudgetApplication().run()
+
+
+def serve_asgi(
+    app: Flask,
+    host: str,
+    port: int,
+    threads: int = 32,
+    keep_alive: int = 5,
+    backlog: int = 2048,
+) -> None:
+    """run the app in one uvicorn process until stopped
+
+    Connections are held by the event loop, so thousands of idle keep-alive
+    clients cost no threads. Requests are handled by at most ``threads``
+    threads.
+
+    :param app: Flask app with resources registered
+    :param host: interface to bind
+    :param port: port to bind
+    :param threads: threads handling requests
+    :param keep_alive: seconds to hold idle keep-alive connections open
+    :param backlog: connections waiting to be accepted
+    """
+    if uvicorn is None:
+        raise SystemExit(
+            "uvicorn is required for --asgi, install it with "
+            "`poetry install -E asgi`"
+        )
+    uvicorn.run(
+        WSGIBridge(app, threads),
+        host=host,
+        port=port,
+        timeout_keep_alive=keep_alive,
+        backlog=backlog,
+        lifespan="on",
+        access_log=False,
+    )
@@ -0,0 +1,218 @@
+"""single writer thread committing queued writes in groups"""
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+
+from flask import Flask, current_app
+
+from restful_budget_api.library.db_pool import open_connection
+from restful_budget_api.library.instrumentation import Metrics
+
+WRITE_QUEUE_DEFAULTS = {
+    "WRITE_QUEUE": False,
+    "WRITE_BATCH_SIZE": 256,
+    "WRITE_BATCH_MS": 2.0,
+    "WRITE_TIMEOUT": 30.0,
+}
+
+Write = Tuple[str, Tuple[Any, ...], "Future[List[Tuple[Any, ...]]]"]
+
+
+class WriteQueue:
+    """funnels writes of one process through one connection and thread
+
+    The writer takes the first queued write, gathers more for up to
+    ``max_latency`` seconds or ``max_batch`` writes, and runs them all in
+    one transaction. Every write gets its own savepoint, so a failing write
+    only fails its own caller.
+    """
+
+    def __init__(
+        self,
+        database: str,
+        max_batch: int = 256,
+        max_latency: float = 0.002,
+        busy_timeout: float = 5.0,
+        metrics: Optional[Metrics] = None,
+    ) -> None:
+        self.database = database
+        self.max_batch = max_batch
+        self.max_latency = max_latency
+        self.busy_timeout = busy_timeout
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        self._pid = 0
+        self._queue: "queue.Queue[Optional[Write]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._batches = 0
+        self._writes = 0
+        self._largest = 0
+
+    def start(self) -> None:
+        """start the writer thread of this process if not running"""
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            # writes queued before a fork belong to the parent
+            self._queue = queue.Queue()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run, name="budget-writer", daemon=True
+            )
+            self._thread.start()
+
+    def submit(
+        self, sql: str, data: Tuple[Any, ...] = tuple("")
+    ) -> "Future[List[Tuple[Any, ...]]]":
+        """queue a write, the future resolves to the rows it returned
+
+        :param sql: formatted SQL statement
+        :param data: tuple of variables to insert into sql
+        """
+        self.start()
+        future: "Future[List[Tuple[Any, ...]]]" = Future()
+        self._queue.put((sql, data, future))
+        return future
+
+    def close(self) -> None:
+        """finish queued writes and stop the writer thread"""
+        with self._lock:
+            thread = self._thread
+            if thread is None or self._pid != os.getpid():
+                return
+            self._queue.put(None)
+            self._thread = None
+        thread.join()
+
+    def _connect(self) -> sqlite3.Connection:
+        """writer connection, transactions are managed by hand"""
+        return open_connection(
+            self.database,
+            busy_timeout=self.busy_timeout,
+            isolation_level=None,
+        )
+
+    def _next_batch(self, first: Write) -> Tuple[List[Write], bool]:
+        """collect writes queued shortly after the first one
+
+        :param first: write that opened the batch
+        """
+        batch = [first]
+        deadline = time.monotonic() + self.max_latency
+        while len(batch) < self.max_batch:
+            try:
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    item = self._queue.get(timeout=remaining)
+                else:
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return (batch, True)
+            batch.append(item)
+        return (batch, False)
+
+    def _run(self) -> None:
+        """writer thread loop"""
+        db_client = self._connect()
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch, stopping = self._next_batch(first)
+            self._write(db_client, batch)
+        db_client.close()
+
+    def _write(
+        self, db_client: sqlite3.Connection, batch: List[Write]
+    ) -> None:
+        """run a batch of writes in one transaction and resolve callers
+
+        :param db_client: writer connection
+        :param batch: queued writes
+        """
+        started = time.perf_counter()
+        outcomes: List[Tuple[Write, Any, Optional[BaseException]]] = []
+        try:
+            db_client.execute("BEGIN IMMEDIATE")
+            for write in batch:
+                sql, data, _ = write
+                db_client.execute("SAVEPOINT write")
+                try:
+                    rows = db_client.execute(sql, data).fetchall()
+                except sqlite3.Error as err:
+                    db_client.execute("ROLLBACK TO write")
+                    outcomes.append((write, None, err))
+                else:
+                    outcomes.append((write, rows, None))
+                db_client.execute("RELEASE write")
+            db_client.execute("COMMIT")
+        except Exception as err:  # every caller must hear back
+            if db_client.in_transaction:
+                try:
+                    db_client.execute("ROLLBACK")
+                except sqlite3.Error:
+                    pass
+            outcomes = [(write, None, err) for write in batch]
+        for (_, _, future), rows, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(rows)
+        with self._lock:
+            self._batches += 1
+            self._writes += len(batch)
+            self._largest = max(self._largest, len(batch))
+        if self.metrics is not None:
+            self.metrics.observe("budget_db_write_batch_size", len(batch))
+            self.metrics.observe(
+                "budget_db_write_batch_seconds",
+                time.perf_counter() - started,
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        """write and batch counters"""
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "batches": self._batches,
+                "writes": self._writes,
+                "largest_batch": self._largest,
+                "average_batch": (
+                    round(self._writes / self._batches, 2)
+                    if self._batches
+                    else 0.0
+                ),
+            }
+
+
+def init_write_queue(app: Flask) -> Optional[WriteQueue]:
+    """create the app write queue when WRITE_QUEUE is set
+
+    :param app: Flask app
+    """
+    for key, val in WRITE_QUEUE_DEFAULTS.items():
+        app.config.setdefault(key, val)
+    if not app.config["WRITE_QUEUE"]:
+        return None
+    write_queue = WriteQueue(
+        database=app.config["DATABASE"],
+        max_batch=app.config["WRITE_BATCH_SIZE"],
+        max_latency=app.config["WRITE_BATCH_MS"] / 1000,
+        busy_timeout=app.config["DB_BUSY_TIMEOUT"],
+        metrics=app.extensions.get("metrics"),
+    )
+    app.extensions["write_queue"] = write_queue
+    return write_queue
+
+
+def get_write_queue() -> Optional[WriteQueue]:
+    """get the write queue of the current app, None if writes go direct"""
+    return current_app.extensions.get("write_queue")
@@ -12,4 +12,4 @@ CREATE TABLE IF NOT EXISTS expenses (
   description TEXT NOT NULL,
   amount REAL NOT NULL,
   FOREIGN KEY(user_id) REFERENCES user(id)
-);
\ No newline at end of file
+);
@@ -0,0 +1,3 @@
+CREATE INDEX IF NOT EXISTS expenses_user_date ON expenses (user_id, date);
+
+CREATE INDEX IF NOT EXISTS users_password ON users (password);
@@ -0,0 +1,43 @@
+CREATE TABLE IF NOT EXISTS assets (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  user_id INTEGER NOT NULL,
+  report_id INTEGER,
+  date TEXT NOT NULL,
+  description TEXT NOT NULL,
+  value REAL NOT NULL,
+  FOREIGN KEY(user_id) REFERENCES users(id),
+  FOREIGN KEY(report_id) REFERENCES reports(id)
+);
+
+CREATE TABLE IF NOT EXISTS liabilities (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  user_id INTEGER NOT NULL,
+  report_id INTEGER,
+  date TEXT NOT NULL,
+  description TEXT NOT NULL,
+  value REAL NOT NULL,
+  FOREIGN KEY(user_id) REFERENCES users(id),
+  FOREIGN KEY(report_id) REFERENCES reports(id)
+);
+
+CREATE TABLE IF NOT EXISTS reports (
+  id INTEGER PRIMARY KEY,
+  user_id INTEGER NOT NULL,
+  date TEXT NOT NULL,
+  net_worth REAL NOT NULL,
+  FOREIGN KEY(user_id) REFERENCES users(id)
+);
+
+CREATE TABLE IF NOT EXISTS patterns (
+  id INTEGER PRIMARY KEY,
+  title TEXT,
+  date TEXT,
+  value TEXT,
+  UNIQUE (title)
+);
+
+CREATE INDEX IF NOT EXISTS assets_user_date ON assets (user_id, date);
+
+CREATE INDEX IF NOT EXISTS liabilities_user_date ON liabilities (user_id, date);
+
+CREATE INDEX IF NOT EXISTS reports_user_date ON reports (user_id, date);
@@ -0,0 +1,63 @@
+CREATE TABLE IF NOT EXISTS change_versions (
+  table_name TEXT NOT NULL,
+  user_id INTEGER NOT NULL,
+  version INTEGER NOT NULL,
+  updated_at TEXT NOT NULL,
+  PRIMARY KEY (table_name, user_id)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS expenses_version_insert
+AFTER INSERT ON expenses
+BEGIN
+  INSERT INTO change_versions (table_name, user_id, version, updated_at)
+  VALUES ('expenses', NEW.user_id, 1, strftime('%Y-%m-%d %H:%M:%f', 'now'))
+  ON CONFLICT (table_name, user_id) DO UPDATE
+  SET version = version + 1, updated_at = excluded.updated_at;
+END;
+
+CREATE TRIGGER IF NOT EXISTS expenses_version_update
+AFTER UPDATE ON expenses
+BEGIN
+  INSERT INTO change_versions (table_name, user_id, version, updated_at)
+  VALUES
+    ('expenses', OLD.user_id, 1, strftime('%Y-%m-%d %H:%M:%f', 'now')),
+    ('expenses', NEW.user_id, 1, strftime('%Y-%m-%d %H:%M:%f', 'now'))
+  ON CONFLICT (table_name, user_id) DO UPDATE
+  SET version = version + 1, updated_at = excluded.updated_at;
+END;
+
+CREATE TRIGGER IF NOT EXISTS expenses_version_delete
+AFTER DELETE ON expenses
+BEGIN
+  INSERT INTO change_versions (table_name, user_id, version, updated_at)
+  VALUES ('expenses', OLD.user_id, 1, strftime('%Y-%m-%d %H:%M:%f', 'now'))
+  ON CONFLICT (table_name, user_id) DO UPDATE
+  SET version = version + 1, updated_at = excluded.updated_at;
+END;
+
+CREATE TRIGGER IF NOT EXISTS patterns_version_insert
+AFTER INSERT ON patterns
+BEGIN
+  INSERT INTO change_versions (table_name, user_id, version, updated_at)
+  VALUES ('patterns', 0, 1, strftime('%Y-%m-%d %H:%M:%f', 'now'))
+  ON CONFLICT (table_name, user_id) DO UPDATE
+  SET version = version + 1, updated_at = excluded.updated_at;
+END;
+
+CREATE TRIGGER IF NOT EXISTS patterns_version_update
+AFTER UPDATE ON patterns
+BEGIN
+  INSERT INTO change_versions (table_name, user_id, version, updated_at)
+  VALUES ('patterns', 0, 1, strftime('%Y-%m-%d %H:%M:%f', 'now'))
+  ON CONFLICT (table_name, user_id) DO UPDATE
+  SET version = version + 1, updated_at = excluded.updated_at;
+END;
+
+CREATE TRIGGER IF NOT EXISTS patterns_version_delete
+AFTER DELETE ON patterns
+BEGIN
+  INSERT INTO change_versions (table_name, user_id, version, updated_at)
+  VALUES ('patterns', 0, 1, strftime('%Y-%m-%d %H:%M:%f', 'now'))
+  ON CONFLICT (table_name, user_id) DO UPDATE
+  SET version = version + 1, updated_at = excluded.updated_at;
+END;
@@ -0,0 +1,135 @@
+CREATE TABLE IF NOT EXISTS net_worth (
+  user_id INTEGER PRIMARY KEY,
+  assets REAL NOT NULL,
+  liabilities REAL NOT NULL,
+  updated_at TEXT NOT NULL
+);
+
+INSERT INTO net_worth (user_id, assets, liabilities, updated_at)
+SELECT
+  user_id,
+  SUM(asset),
+  SUM(liability),
+  strftime('%Y-%m-%d %H:%M:%f', 'now')
+FROM (
+  SELECT user_id, value AS asset, 0 AS liability FROM assets
+  UNION ALL
+  SELECT user_id, 0 AS asset, value AS liability FROM liabilities
+)
+GROUP BY user_id;
+
+CREATE TRIGGER IF NOT EXISTS assets_total_insert
+AFTER INSERT ON assets
+BEGIN
+  INSERT INTO net_worth (user_id, assets, liabilities, updated_at)
+  VALUES (NEW.user_id, NEW.value, 0, strftime('%Y-%m-%d %H:%M:%f', 'now'))
+  ON CONFLICT (user_id) DO UPDATE
+  SET assets = assets + excluded.assets, updated_at = excluded.updated_at;
+  INSERT INTO change_versions (table_name, user_id, version, updated_at)
+  VALUES ('assets', NEW.user_id, 1, strftime('%Y-%m-%d %H:%M:%f', 'now'))
+  ON CONFLICT (table_name, user_id) DO UPDATE
+  SET version = version + 1, updated_at = excluded.updated_at;
+END;
+
+CREATE TRIGGER IF NOT EXISTS assets_total_update
+AFTER UPDATE ON assets
+BEGIN
+  UPDATE net_worth
+  SET
+    assets = assets - OLD.value,
+    updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now')
+  WHERE user_id = OLD.user_id;
+  INSERT INTO net_worth (user_id, assets, liabilities, updated_at)
+  VALUES (NEW.user_id, NEW.value, 0, strftime('%Y-%m-%d %H:%M:%f', 'now'))
+  ON CONFLICT (user_id) DO UPDATE
+  SET assets = assets + excluded.assets, updated_at = excluded.updated_at;
+  INSERT INTO change_versions (table_name, user_id, version, updated_at)
+  VALUES
+    ('assets', OLD.user_id, 1, strftime('%Y-%m-%d %H:%M:%f', 'now')),
+    ('assets', NEW.user_id, 1, strftime('%Y-%m-%d %H:%M:%f', 'now'))
+  ON CONFLICT (table_name, user_id) DO UPDATE
+  SET version = version + 1, updated_at = excluded.updated_at;
+END;
+
+CREATE TRIGGER IF NOT EXISTS assets_total_delete
+AFTER DELETE ON assets
+BEGIN
+  UPDATE net_worth
+  SET
+    assets = assets - OLD.value,
+    updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now')
+  WHERE user_id = OLD.user_id;
+  INSERT INTO change_versions (table_name, user_id, version, updated_at)
+  VALUES ('assets', OLD.user_id, 1, strftime('%Y-%m-%d %H:%M:%f', 'now'))
+  ON CONFLICT (table_name, user_id) DO UPDATE
+  SET version = version + 1, updated_at = excluded.updated_at;
+END;
+
+CREATE TRIGGER IF NOT EXISTS liabilities_total_insert
+AFTER INSERT ON liabilities
+BEGIN
+  INSERT INTO net_worth (user_id, assets, liabilities, updated_at)
+  VALUES (NEW.user_id, 0, NEW.value, strftime('%Y-%m-%d %H:%M:%f', 'now'))
+  ON CONFLICT (user_id) DO UPDATE
+  SET
+    liabilities = liabilities + excluded.liabilities,
+    updated_at = excluded.updated_at;
+  INSERT INTO change_versions (table_name, user_id, version, updated_at)
+  VALUES ('liabilities', NEW.user_id, 1, strftime('%Y-%m-%d %H:%M:%f', 'now'))
+  ON CONFLICT (table_name, user_id) DO UPDATE
+  SET version = version + 1, updated_at = excluded.updated_at;
+END;
+
+CREATE TRIGGER IF NOT EXISTS liabilities_total_update
+AFTER UPDATE ON liabilities
+BEGIN
+  UPDATE net_worth
+  SET
+    liabilities = liabilities - OLD.value,
+    updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now')
+  WHERE user_id = OLD.user_id;
+  INSERT INTO net_worth (user_id, assets, liabilities, updated_at)
+  VALUES (NEW.user_id, 0, NEW.value, strftime('%Y-%m-%d %H:%M:%f', 'now'))
+  ON CONFLICT (user_id) DO UPDATE
+  SET
+    liabilities = liabilities + excluded.liabilities,
+    updated_at = excluded.updated_at;
+  INSERT INTO change_versions (table_name, user_id, version, updated_at)
+  VALUES
+    ('liabilities', OLD.user_id, 1, strftime('%Y-%m-%d %H:%M:%f', 'now')),
+    ('liabilities', NEW.user_id, 1, strftime('%Y-%m-%d %H:%M:%f', 'now'))
+  ON CONFLICT (table_name, user_id) DO UPDATE
+  SET version = version + 1, updated_at = excluded.updated_at;
+END;
+
+CREATE TRIGGER IF NOT EXISTS liabilities_total_delete
+AFTER DELETE ON liabilities
+BEGIN
+  UPDATE net_worth
+  SET
+    liabilities = liabilities - OLD.value,
+    updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now')
+  WHERE user_id = OLD.user_id;
+  INSERT INTO change_versions (table_name, user_id, version, updated_at)
+  VALUES ('liabilities', OLD.user_id, 1, strftime('%Y-%m-%d %H:%M:%f', 'now'))
+  ON CONFLICT (table_name, user_id) DO UPDATE
+  SET version = version + 1, updated_at = excluded.updated_at;
+END;
+
+CREATE TRIGGER IF NOT EXISTS reports_version_insert
+AFTER INSERT ON reports
+BEGIN
+  INSERT INTO change_versions (table_name, user_id, version, updated_at)
+  VALUES ('reports', NEW.user_id, 1, strftime('%Y-%m-%d %H:%M:%f', 'now'))
+  ON CONFLICT (table_name, user_id) DO UPDATE
+  SET version = version + 1, updated_at = excluded.updated_at;
+END;
+
+CREATE TRIGGER IF NOT EXISTS reports_version_delete
+AFTER DELETE ON reports
+BEGIN
+  INSERT INTO change_versions (table_name, user_id, version, updated_at)
+  VALUES ('reports', OLD.user_id, 1, strftime('%Y-%m-%d %H:%M:%f', 'now'))
+  ON CONFLICT (table_name, user_id) DO UPDATE
+  SET version = version + 1, updated_at = excluded.updated_at;
+END;
@@ -0,0 +1,13 @@
+ALTER TABLE patterns ADD COLUMN frequency TEXT NOT NULL DEFAULT 'monthly';
+
+ALTER TABLE patterns ADD COLUMN interval INTEGER NOT NULL DEFAULT 1;
+
+ALTER TABLE patterns ADD COLUMN end_date TEXT;
+
+ALTER TABLE patterns ADD COLUMN version INTEGER NOT NULL DEFAULT 1;
+
+CREATE TRIGGER IF NOT EXISTS patterns_schedule_version
+AFTER UPDATE OF date, value, frequency, interval, end_date ON patterns
+BEGIN
+  UPDATE patterns SET version = OLD.version + 1 WHERE id = NEW.id;
+END;
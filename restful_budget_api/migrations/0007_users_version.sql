@@ -0,0 +1,26 @@
+CREATE TRIGGER IF NOT EXISTS users_version_insert
+AFTER INSERT ON users
+BEGIN
+  INSERT INTO change_versions (table_name, user_id, version, updated_at)
+  VALUES ('users', 0, 1, strftime('%Y-%m-%d %H:%M:%f', 'now'))
+  ON CONFLICT (table_name, user_id) DO UPDATE
+  SET version = version + 1, updated_at = excluded.updated_at;
+END;
+
+CREATE TRIGGER IF NOT EXISTS users_version_update
+AFTER UPDATE ON users
+BEGIN
+  INSERT INTO change_versions (table_name, user_id, version, updated_at)
+  VALUES ('users', 0, 1, strftime('%Y-%m-%d %H:%M:%f', 'now'))
+  ON CONFLICT (table_name, user_id) DO UPDATE
+  SET version = version + 1, updated_at = excluded.updated_at;
+END;
+
+CREATE TRIGGER IF NOT EXISTS users_version_delete
+AFTER DELETE ON users
+BEGIN
+  INSERT INTO change_versions (table_name, user_id, version, updated_at)
+  VALUES ('users', 0, 1, strftime('%Y-%m-%d %H:%M:%f', 'now'))
+  ON CONFLICT (table_name, user_id) DO UPDATE
+  SET version = version + 1, updated_at = excluded.updated_at;
+END;
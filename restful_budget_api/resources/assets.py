@@ -0,0 +1,110 @@
+"""assets and liabilities endpoints"""
+
+from typing import Any, Dict, Tuple, Union
+
+from flask import Response
+from flask_restful import Resource, reqparse
+
+from restful_budget_api.library.conditional import conditional_get
+from restful_budget_api.library.db_connector import (
+    db_add_new_record,
+    db_change_returning,
+    db_get_schema,
+    db_record_exists,
+)
+from restful_budget_api.library.representation import table_response
+from restful_budget_api.library.security import (
+    api_key_required,
+    get_user,
+    strict_verbiage,
+)
+
+
+class BalanceItems(Resource):  # type: ignore [misc]
+    """records adding to or subtracting from a user's net worth
+
+    Triggers from migration 0005 keep the net_worth totals in step with
+    every insert, update and delete in the same transaction.
+
+    HTTP verbs:
+        - get
+        - post
+        - delete
+    """
+
+    table = ""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.parser = reqparse.RequestParser()
+        self.parser.add_argument("date", type=str)
+        self.parser.add_argument("description", type=str)
+        self.parser.add_argument("value", type=float)
+        self.schema = db_get_schema(self.table)
+
+    @strict_verbiage
+    @api_key_required
+    def get(self) -> Response:
+        """return user records ordered by date"""
+        user_id = get_user()
+        not_modified, headers = conditional_get(self.table, user_id)
+        if not_modified is not None:
+            return not_modified
+        return table_response(
+            f"SELECT * FROM {self.table} WHERE user_id = ? ORDER BY date, id",
+            (user_id,),
+            self.schema,
+            headers,
+        )
+
+    @strict_verbiage
+    @api_key_required
+    def post(self) -> Tuple[Dict[str, Any], int]:
+        """add new record to table"""
+        args = self.parser.parse_args()
+        for field in ["date", "description"]:
+            if not args.get(field):
+                return ({"error": f"field {field} not provided"}, 400)
+        if args["value"] is None:
+            return ({"error": "field value not provided"}, 400)
+        args["user_id"] = get_user()
+        record = db_add_new_record(table=self.table, insert=args)
+        return (record, 201)
+
+    @strict_verbiage
+    @api_key_required
+    def delete(
+        self, record_id: int = 0
+    ) -> Union[Tuple[Dict[str, Any], int], Response]:
+        """delete record by ID if api key allows for it
+
+        :param record_id: id number of record to delete
+        """
+        user_id = get_user()
+        deleted = db_change_returning(
+            f"DELETE FROM {self.table} WHERE id = ? AND user_id = ?",
+            (record_id, user_id),
+            "id",
+            f"SELECT id FROM {self.table} WHERE id = ? AND user_id = ?",
+            (record_id, user_id),
+        )
+        if not deleted:
+            if not db_record_exists(self.table, record_id):
+                return ({"error": f"{self.table} id invalid"}, 400)
+            return (
+                {"error": f"no access to {self.table} id {record_id}"},
+                403,
+            )
+        return ({"table": self.table, "deleted_id": record_id}, 200)
+
+
+class Assets(BalanceItems):
+    """assets resource"""
+
+    table = "assets"
+
+
+class Liabilities(BalanceItems):
+    """liabilities resource"""
+
+    table = "liabilities"
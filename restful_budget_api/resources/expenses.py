@@ -1,25 +1,108 @@
 """expenses endpoint"""
 
-from typing import Any, Dict, List, Tuple
+import csv
+import io
+import math
+from typing import Any, Dict, Iterable, Iterator, List, Tuple, Union
 
+from flask import Response, request
 from flask_restful import Resource, reqparse
 
+from restful_budget_api.library.conditional import conditional_get
 from restful_budget_api.library.db_connector import (
-    db_add_new_record,
     db_build_record,
     db_build_table,
-    db_commit_change,
     db_fetchall,
     db_fetchone,
-    db_get_schema,
-    db_ids,
+    db_insert_many,
+    db_iterate,
 )
+from restful_budget_api.library.export import EXPORT_FORMATS, export_records
+from restful_budget_api.library.pagination import (
+    STREAM_FORMATS,
+    decode_cursor,
+    encode_cursor,
+    stream_records,
+)
+from restful_budget_api.library.rate_limit import limit_concurrency
+from restful_budget_api.library.repositories import ExpenseRepo
+from restful_budget_api.library.representation import table_response
 from restful_budget_api.library.security import (
     api_key_required,
     get_user,
     strict_verbiage,
 )
 
+MAX_PAGE_LIMIT = 1000
+SUMMARY_GROUPS = {
+    "day": "substr(date, 1, 10)",
+    "month": "substr(date, 1, 7)",
+    "year": "substr(date, 1, 4)",
+    "description": "description",
+}
+
+IMPORT_FIELDS = ["date", "description", "amount"]
+IMPORT_BATCH_SIZE = 1000
+MAX_IMPORT_ERRORS = 1000
+
+EXPORT_TYPES = {
+    "id": "integer",
+    "user_id": "integer",
+    "date": "text",
+    "description": "text",
+    "amount": "real",
+}
+EXPORT_CHUNK_SIZE = 5000
+
+UPDATE_FIELDS = ["date", "description", "amount"]
+MAX_BATCH_IDS = 10000
+
+
+def add_filter_arguments(parser: reqparse.RequestParser) -> None:
+    """register the expense filter query args on a parser
+
+    :param parser: request parser of the resource
+    """
+    parser.add_argument("start_date", type=str, location="args")
+    parser.add_argument("end_date", type=str, location="args")
+    parser.add_argument("min_amount", type=float, location="args")
+    parser.add_argument("max_amount", type=float, location="args")
+    parser.add_argument("description", type=str, location="args")
+
+
+def build_filters(query: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    """turn filter query args into extra WHERE clauses and their values
+
+    Dates compare as text so a partial end_date such as 2024-01 includes
+    every day of that month.
+
+    :param query: parsed query args
+    """
+    clauses = []
+    data: List[Any] = []
+    if query["start_date"]:
+        clauses.append("date >= ?")
+        data.append(query["start_date"])
+    if query["end_date"]:
+        clauses.append("date <= ?")
+        data.append(query["end_date"] + "\uffff")
+    if query["min_amount"] is not None:
+        clauses.append("amount >= ?")
+        data.append(query["min_amount"])
+    if query["max_amount"] is not None:
+        clauses.append("amount <= ?")
+        data.append(query["max_amount"])
+    if query["description"]:
+        escaped = (
+            query["description"]
+            .replace("\\", "\\\\")
+            .replace("%", "\\%")
+            .replace("_", "\\_")
+        )
+        clauses.append("description LIKE ? ESCAPE '\\'")
+        data.append(f"%{escaped}%")
+    return ("".join(f" AND {clause}" for clause in clauses), data)
+
 
 class Expenses(Resource):  # type: ignore [misc]
     """expenses resource
@@ -37,46 +120,79 @@ class Expenses(Resource):  # type: ignore [misc]
         self.parser.add_argument("date", type=str)
         self.parser.add_argument("description", type=str)
         self.parser.add_argument("amount", type=float)
-        self.table = "expenses"
-        self.schema = db_get_schema(self.table)
-
-    def verify_record_id(self, record_id: int) -> bool:
-        """verify entered record id is valid
-
-        :param record_id: id number of record
-        """
-        valid_ids = db_ids(self.table)
-        if record_id not in valid_ids:
-            return False
-        return True
-
-    def verify_user_ownership(self, record_id: int) -> bool:
-        """verify user created or otherwise owns record being edited
-
-        :param record_id: id number of record
-        """
-        record = db_build_record(
-            fetch=db_fetchone(
-                sql=f"SELECT * FROM {self.table} WHERE id = ?",
-                data=(record_id,),
-            ),
-            schema=self.schema,
-        )
-        if get_user() != record["user_id"]:
-            return False
-        return True
+        self.query_parser = reqparse.RequestParser()
+        self.query_parser.add_argument("limit", type=int, location="args")
+        self.query_parser.add_argument("cursor", type=str, location="args")
+        self.query_parser.add_argument("stream", type=str, location="args")
+        add_filter_arguments(self.query_parser)
+        self.repo = ExpenseRepo()
+        self.table = self.repo.table
+        self.schema = list(self.repo.row._fields)
 
     @strict_verbiage
     @api_key_required
-    def get(self) -> Tuple[List[Dict[str, Any]], int]:
-        """return all table records"""
+    @limit_concurrency
+    def get(
+        self,
+    ) -> Union[
+        Response,
+        Tuple[Dict[str, Any], int],
+        Tuple[List[Dict[str, Any]], int, Dict[str, str]],
+    ]:
+        """return user records ordered by date
+
+        Query args:
+            - limit: page size, the next page cursor is sent in the
+              X-Next-Cursor header
+            - cursor: X-Next-Cursor value of the previous page
+            - stream: json or ndjson to stream every row after the cursor
+              instead of paging, can't be used with limit
+            - start_date, end_date: inclusive date range
+            - min_amount, max_amount: inclusive amount range
+            - description: case insensitive description substring
+        """
+        query = self.query_parser.parse_args()
+        limit = query["limit"]
+        if limit is not None and not 0 < limit <= MAX_PAGE_LIMIT:
+            return ({"error": f"limit must be 1 to {MAX_PAGE_LIMIT}"}, 400)
+        if query["stream"]:
+            if query["stream"] not in STREAM_FORMATS:
+                return ({"error": f"stream {query['stream']} invalid"}, 400)
+            if limit is not None:
+                # the next page cursor is only known once the body is sent
+                return ({"error": "stream can't be used with limit"}, 400)
         user_id = get_user()
-        response = db_fetchall(
-            sql=f"SELECT * FROM {self.table} WHERE user_id = ?",
-            data=(user_id,),
-        )
-        table = db_build_table(fetch=response, schema=self.schema)
-        return (table, 200)
+        not_modified, headers = conditional_get(self.table, user_id)
+        if not_modified is not None:
+            return not_modified
+        filters, data = build_filters(query)
+        sql = f"{self.repo.user_sql}{filters}"
+        data.insert(0, user_id)
+        if query["cursor"]:
+            try:
+                data.extend(decode_cursor(query["cursor"], 2))
+            except ValueError:
+                return ({"error": "cursor invalid"}, 400)
+            sql += " AND (date, id) > (?, ?)"
+        sql += " ORDER BY date, id"
+        if query["stream"]:
+            response = stream_records(
+                db_iterate(sql=sql, data=tuple(data)),
+                self.schema,
+                query["stream"],
+            )
+            response.headers.update(headers)
+            return response
+        if limit is None:
+            return table_response(sql, tuple(data), self.schema, headers)
+        # one extra row tells us whether another page exists
+        rows = self.repo.rows(f"{sql} LIMIT ?", (*data, limit + 1))
+        if len(rows) > limit:
+            rows = rows[:limit]
+            headers["X-Next-Cursor"] = encode_cursor(
+                rows[-1].date, rows[-1].id
+            )
+        return ([row._asdict() for row in rows], 200, headers)
 
     @strict_verbiage
     @api_key_required
@@ -87,10 +203,8 @@ class Expenses(Resource):  # type: ignore [misc]
         for field in required_args:
             if not args.get(field):
                 return ({"error": f"field {field} not provided"}, 400)
-        user_id = get_user()
-        args["user_id"] = user_id
-        record = db_add_new_record(table=self.table, insert=args)
-        return (record, 201)
+        args["user_id"] = get_user()
+        return (self.repo.insert(args)._asdict(), 201)
 
     @strict_verbiage
     @api_key_required
@@ -99,14 +213,387 @@ class Expenses(Resource):  # type: ignore [misc]
 
         :param record_id: id number of record to delete
         """
-        if not self.verify_record_id(record_id):
+        if self.repo.delete(record_id, get_user()):
+            return ({"table": self.table, "deleted_id": record_id}, 200)
+        return self.not_changed(record_id)
+
+    @strict_verbiage
+    @api_key_required
+    def patch(self, record_id: int = 0) -> Tuple[Dict[str, Any], int]:
+        """update the fields sent, leaving the others as they are
+
+        :param record_id: id number of record to update
+        """
+        args = self.parser.parse_args()
+        changes = {
+            field: args[field]
+            for field in UPDATE_FIELDS
+            if args.get(field) is not None
+        }
+        if not changes:
+            return ({"error": f"send any of {UPDATE_FIELDS}"}, 400)
+        record = self.repo.update(record_id, get_user(), changes)
+        if record is not None:
+            return (record._asdict(), 200)
+        return self.not_changed(record_id)
+
+    def not_changed(self, record_id: int) -> Tuple[Dict[str, str], int]:
+        """error for a write scoped to the user that matched no record
+
+        Looked up only after the write missed, so successful writes stay a
+        single statement.
+
+        :param record_id: id number of record
+        """
+        if not self.repo.exists(record_id):
             return ({"error": f"{self.table} id invalid"}, 400)
-        if not self.verify_user_ownership(record_id):
+        return ({"error": f"no access to {self.table} id {record_id}"}, 403)
+
+
+class ExpensesBatch(Resource):  # type: ignore [misc]
+    """set based changes to many expenses of the user at once
+
+    Each request is one statement over the listed ids, scoped by user_id,
+    so ids of other users are reported as not found rather than touched.
+
+    HTTP verbs:
+        - delete
+        - patch
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.repo = ExpenseRepo()
+        self.table = self.repo.table
+
+    @staticmethod
+    def read_ids(body: Dict[str, Any]) -> List[int]:
+        """get the ids list out of a request body
+
+        :param body: request JSON
+        """
+        ids = body.get("ids")
+        if (
+            not isinstance(ids, list)
+            or not ids
+            or not all(
+                isinstance(num, int) and not isinstance(num, bool)
+                for num in ids
+            )
+        ):
+            raise ValueError("field ids must be a list of record ids")
+        if len(ids) > MAX_BATCH_IDS:
+            raise ValueError(f"at most {MAX_BATCH_IDS} ids per request")
+        return ids
+
+    @strict_verbiage
+    @api_key_required
+    def delete(self) -> Tuple[Dict[str, Any], int]:
+        """delete listed records, returns the ids deleted and not found"""
+        body = request.get_json(silent=True) or {}
+        try:
+            ids = self.read_ids(body)
+        except ValueError as err:
+            return ({"error": str(err)}, 400)
+        deleted = self.repo.delete_many(ids, get_user())
+        return (
+            {
+                "table": self.table,
+                "deleted_ids": deleted,
+                "not_found_ids": sorted(set(ids) - set(deleted)),
+            },
+            200,
+        )
+
+    @strict_verbiage
+    @api_key_required
+    def patch(self) -> Tuple[Dict[str, Any], int]:
+        """apply the same changes to listed records
+
+        Body: ``{"ids": [...], "changes": {"description": ...}}``
+        """
+        body = request.get_json(silent=True) or {}
+        try:
+            ids = self.read_ids(body)
+        except ValueError as err:
+            return ({"error": str(err)}, 400)
+        changes = body.get("changes")
+        if (
+            not isinstance(changes, dict)
+            or not changes
+            or not set(changes) <= set(UPDATE_FIELDS)
+        ):
             return (
-                {"error": f"no access to {self.table} id {record_id}"},
-                403,
+                {"error": f"field changes must only hold {UPDATE_FIELDS}"},
+                400,
             )
-        db_commit_change(
-            sql=f"DELETE FROM {self.table} WHERE id = ?", data=(record_id,)
+        if "amount" in changes:
+            try:
+                changes["amount"] = float(changes["amount"])
+            except (TypeError, ValueError):
+                return ({"error": "field amount invalid"}, 400)
+        for field in ("date", "description"):
+            if field in changes and not isinstance(changes[field], str):
+                return ({"error": f"field {field} invalid"}, 400)
+        updated = self.repo.update_many(ids, get_user(), changes)
+        return (
+            {
+                "table": self.table,
+                "updated_ids": updated,
+                "not_found_ids": sorted(set(ids) - set(updated)),
+            },
+            200,
+        )
+
+
+class ExpensesSummary(Resource):  # type: ignore [misc]
+    """expense totals computed in the database
+
+    HTTP verbs:
+        - get
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.query_parser = reqparse.RequestParser()
+        self.query_parser.add_argument("group_by", type=str, location="args")
+        add_filter_arguments(self.query_parser)
+        self.table = "expenses"
+
+    @strict_verbiage
+    @api_key_required
+    @limit_concurrency
+    def get(
+        self,
+    ) -> Union[
+        Response,
+        Tuple[Union[Dict[str, Any], List[Dict[str, Any]]], int],
+        Tuple[
+            Union[Dict[str, Any], List[Dict[str, Any]]], int, Dict[str, str]
+        ],
+    ]:
+        """return count, total and average amount of user expenses
+
+        Query args:
+            - group_by: day, month, year or description for one summary per
+              group instead of a single overall summary
+            - expense filter args, same as GET /expenses
+        """
+        query = self.query_parser.parse_args()
+        group_by = query["group_by"]
+        if group_by and group_by not in SUMMARY_GROUPS:
+            return ({"error": f"group_by {group_by} invalid"}, 400)
+        user_id = get_user()
+        not_modified, headers = conditional_get(self.table, user_id)
+        if not_modified is not None:
+            return not_modified
+        filters, data = build_filters(query)
+        data.insert(0, user_id)
+        aggregates = "COUNT(*), COALESCE(SUM(amount), 0), AVG(amount)"
+        where = f"WHERE user_id = ?{filters}"
+        if not group_by:
+            fetch = db_fetchone(
+                sql=f"SELECT {aggregates} FROM {self.table} {where}",
+                data=tuple(data),
+            )
+            return (
+                db_build_record(
+                    fetch=fetch, schema=["count", "total", "average"]
+                ),
+                200,
+                headers,
+            )
+        group = SUMMARY_GROUPS[group_by]
+        fetch = db_fetchall(
+            sql=f"SELECT {group} AS grp, {aggregates} FROM {self.table} "
+            f"{where} GROUP BY grp ORDER BY grp",
+            data=tuple(data),
+        )
+        return (
+            db_build_table(
+                fetch=fetch, schema=[group_by, "count", "total", "average"]
+            ),
+            200,
+            headers,
+        )
+
+
+class ExpensesImport(Resource):  # type: ignore [misc]
+    """bulk expense ingestion
+
+    HTTP verbs:
+        - post
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.table = "expenses"
+        self.errors: List[Dict[str, Any]] = []
+        self.error_count = 0
+
+    def read_rows(self) -> Iterable[Dict[str, Any]]:
+        """get expense rows from a JSON array, CSV body or CSV file upload"""
+        if request.is_json:
+            rows = request.get_json(silent=True)
+            if not isinstance(rows, list):
+                raise ValueError("JSON body must be an array of expenses")
+            return rows
+        if "file" in request.files:
+            stream = request.files["file"].stream
+        elif request.mimetype == "text/csv":
+            stream = request.stream
+        else:
+            raise ValueError("send a JSON array, text/csv body or CSV file")
+        reader = csv.DictReader(io.TextIOWrapper(stream, encoding="utf-8"))
+        if not reader.fieldnames or not set(IMPORT_FIELDS) <= set(
+            reader.fieldnames
+        ):
+            raise ValueError(f"CSV header must include {IMPORT_FIELDS}")
+        return reader
+
+    def add_error(self, row_num: int, error: str) -> None:
+        """record a rejected row, keeping at most MAX_IMPORT_ERRORS
+
+        :param row_num: 1 based position of the row in the upload
+        :param error: reason the row was rejected
+        """
+        self.error_count += 1
+        if len(self.errors) < MAX_IMPORT_ERRORS:
+            self.errors.append({"row": row_num, "error": error})
+
+    def valid_rows(
+        self, rows: Iterable[Dict[str, Any]], user_id: int
+    ) -> Iterator[Tuple[Any, ...]]:
+        """yield insertable rows, recording an error for each bad one
+
+        :param rows: uploaded expense rows
+        :param user_id: id of user the expenses belong to
+        """
+        for row_num, row in enumerate(rows, start=1):
+            if not isinstance(row, dict):
+                self.add_error(row_num, "row must be an object")
+                continue
+            missing = [field for field in IMPORT_FIELDS if not row.get(field)]
+            if missing:
+                self.add_error(row_num, f"field {missing[0]} not provided")
+                continue
+            try:
+                amount = float(row["amount"])
+            except (TypeError, ValueError):
+                amount = math.nan
+            if not math.isfinite(amount):
+                self.add_error(row_num, "field amount invalid")
+                continue
+            yield (
+                user_id,
+                str(row["date"]),
+                str(row["description"]),
+                amount,
+            )
+
+    @strict_verbiage
+    @api_key_required
+    def post(self) -> Tuple[Dict[str, Any], int]:
+        """insert every valid row in one transaction
+
+        Returns the ids of inserted records and the row number and reason of
+        each rejected row.
+        """
+        try:
+            rows = self.read_rows()
+        except ValueError as err:
+            return ({"error": str(err)}, 400)
+        record_ids = db_insert_many(
+            table=self.table,
+            fields=["user_id"] + IMPORT_FIELDS,
+            rows=self.valid_rows(rows, get_user()),
+            batch_size=IMPORT_BATCH_SIZE,
+        )
+        response = {
+            "table": self.table,
+            "inserted_ids": record_ids,
+            "errors": self.errors,
+            "error_count": self.error_count,
+        }
+        if not record_ids and self.error_count:
+            return (response, 400)
+        return (response, 201)
+
+
+class ExpensesExport(Resource):  # type: ignore [misc]
+    """bulk expense export in CSV or columnar formats
+
+    HTTP verbs:
+        - get
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.query_parser = reqparse.RequestParser()
+        self.query_parser.add_argument("format", type=str, location="args")
+        add_filter_arguments(self.query_parser)
+        self.repo = ExpenseRepo()
+        self.table = self.repo.table
+        self.schema = list(self.repo.row._fields)
+
+    @staticmethod
+    def negotiate(fmt: Union[str, None]) -> Union[str, None]:
+        """pick the export mimetype from the format arg or Accept header
+
+        :param fmt: format query arg, overrides the Accept header
+        """
+        if fmt:
+            for mimetype, (extension, _) in EXPORT_FORMATS.items():
+                if extension == fmt:
+                    return mimetype
+            return None
+        if not request.accept_mimetypes:
+            return "text/csv"
+        return request.accept_mimetypes.best_match(list(EXPORT_FORMATS))
+
+    @strict_verbiage
+    @api_key_required
+    @limit_concurrency
+    def get(self) -> Union[Response, Tuple[Dict[str, Any], int]]:
+        """stream user expenses ordered by date
+
+        Formats, picked with the Accept header or the format query arg:
+            - text/csv (csv, the default)
+            - application/vnd.budget.columns+ndjson (ndjson), one JSON
+              object of column arrays per chunk of rows
+            - application/vnd.apache.arrow.stream (arrow) and
+              application/vnd.apache.parquet (parquet) when pyarrow is
+              installed
+
+        Query args:
+            - expense filter args, same as GET /expenses
+        """
+        query = self.query_parser.parse_args()
+        mimetype = self.negotiate(query["format"])
+        if mimetype is None:
+            formats = [extension for extension, _ in EXPORT_FORMATS.values()]
+            return (
+                {"error": f"export formats are {', '.join(formats)}"},
+                406,
+            )
+        user_id = get_user()
+        not_modified, headers = conditional_get(self.table, user_id, mimetype)
+        if not_modified is not None:
+            return not_modified
+        filters, data = build_filters(query)
+        data.insert(0, user_id)
+        response = export_records(
+            db_iterate(
+                sql=f"{self.repo.user_sql}{filters} ORDER BY date, id",
+                data=tuple(data),
+                size=EXPORT_CHUNK_SIZE,
+            ),
+            schema=self.schema,
+            types=[EXPORT_TYPES.get(field, "text") for field in self.schema],
+            mimetype=mimetype,
+            filename=self.table,
+            size=EXPORT_CHUNK_SIZE,
         )
-        return ({"table": self.table, "deleted_id": record_id}, 200)
+        response.headers.update(headers)
+        response.vary.add("Accept")
+        return response
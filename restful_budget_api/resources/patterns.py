@@ -1,17 +1,27 @@
 """patterns table resources"""
 
-from typing import Any, Dict, List, Tuple, Union
-
-from flask_restful import Resource, reqparse, request
-
-from restful_budget_api.library.db_connector import (
-    db_add_new_record,
-    db_build_record,
-    db_build_table,
-    db_fetchall,
-    db_fetchone,
-    db_get_schema,
+from datetime import datetime, timedelta, timezone
+from sqlite3 import IntegrityError
+from typing import Any, Dict, Optional, Tuple, Union
+
+from flask import Response
+from flask_restful import Resource, reqparse
+
+from restful_budget_api.library.forecast import (
+    FORECAST_MAX_DAYS,
+    FREQUENCIES,
+    add_months,
+    forecast,
+    parse_date,
+    pattern_spec,
+)
+from restful_budget_api.library.repositories import PatternRepo
+from restful_budget_api.library.response_cache import (
+    cache_response,
+    cached_response,
+    get_response_cache,
 )
+from restful_budget_api.library.security import api_key_required
 
 
 class Patterns(Resource):  # type: ignore [misc]
@@ -19,31 +29,71 @@ class Patterns(Resource):  # type: ignore [misc]
 
     def __init__(self) -> None:
         super().__init__()
-        self.table = "patterns"
-        self.schema = db_get_schema(self.table)
+        self.repo = PatternRepo()
+        self.table = self.repo.table
         self.parser = reqparse.RequestParser()
         self.parser.add_argument("title", type=str)
         self.parser.add_argument("date", type=str)
         self.parser.add_argument("value", type=str)
+        self.parser.add_argument("frequency", type=str)
+        self.parser.add_argument("interval", type=int)
+        self.parser.add_argument("end_date", type=str)
+
+    def get(self) -> Response:
+        """get whole table"""
+        cached, headers = cached_response(self.table)
+        if cached is not None:
+            return cached
+        return cache_response(
+            self.table,
+            [pattern._asdict() for pattern in self.repo.all()],
+            headers,
+        )
 
-    def get(self) -> Tuple[Union[Dict[str, Any], List[Dict[str, Any]]], int]:
-        """get whole table or record by id or title
-
-        :param title_or_id: title field value
-        """
-        patterns = db_fetchall(f"SELECT * FROM {self.table}")
-        return (db_build_table(fetch=patterns, schema=self.schema), 200)
-
+    @api_key_required
     def post(self) -> Tuple[Dict[str, Any], int]:
         """add new pattern to table"""
-        print(request.json)
         args = self.parser.parse_args()
-        args["title"] = args["title"].lower()
-        for field, val in args.items():
-            if not val:
+        for field in ["title", "date", "value"]:
+            if not args.get(field):
                 return ({"error": f"field {field} not provided"}, 400)
-        record = db_add_new_record(table=self.table, insert=args)
-        return (record, 201)
+        error = self.schedule_error(args)
+        if error is not None:
+            return ({"error": error}, 400)
+        args = {field: val for field, val in args.items() if val is not None}
+        args["title"] = args["title"].lower()
+        try:
+            record = self.repo.insert(args)
+        except IntegrityError:
+            return ({"error": "title already taken"}, 409)
+        get_response_cache().invalidate(self.table)
+        return (record._asdict(), 201)
+
+    @staticmethod
+    def schedule_error(args: Dict[str, Any]) -> Optional[str]:
+        """check the fields a forecast expands a pattern with
+
+        :param args: parsed request arguments
+        """
+        try:
+            parse_date(args["date"])
+            if args["end_date"] is not None:
+                parse_date(args["end_date"])
+        except ValueError:
+            return "dates must be YYYY-MM-DD"
+        try:
+            float(args["value"])
+        except ValueError:
+            return "field value must be a number"
+        if args["frequency"] is not None:
+            args["frequency"] = args["frequency"].lower()
+            if args["frequency"] not in FREQUENCIES:
+                return (
+                    f"field frequency must be one of {', '.join(FREQUENCIES)}"
+                )
+        if args["interval"] is not None and args["interval"] < 1:
+            return "field interval must be at least 1"
+        return None
 
 
 class PatternsById(Resource):  # type: ignore [misc]
@@ -51,18 +101,21 @@ class PatternsById(Resource):  # type: ignore [misc]
 
     def __init__(self) -> None:
         super().__init__()
-        self.table = "patterns"
-        self.schema = db_get_schema(self.table)
+        self.repo = PatternRepo()
+        self.table = self.repo.table
 
-    def get(self, id_num: int) -> Tuple[Dict[str, Any], int]:
+    def get(self, id_num: int) -> Union[Response, Tuple[Dict[str, str], int]]:
         """get pattern record
 
         :param id_num: pattern id
         """
-        pattern = db_fetchone(
-            f"SELECT * FROM {self.table} WHERE id = ?", (id_num,)
-        )
-        return (db_build_record(fetch=pattern, schema=self.schema), 200)
+        cached, headers = cached_response(self.table)
+        if cached is not None:
+            return cached
+        pattern = self.repo.get(id_num)
+        if pattern is None:
+            return ({"error": f"{self.table} id {id_num} not found"}, 404)
+        return cache_response(self.table, pattern._asdict(), headers)
 
 
 class PatternsByTitle(Resource):  # type: ignore [misc]
@@ -70,15 +123,66 @@ class PatternsByTitle(Resource):  # type: ignore [misc]
 
     def __init__(self) -> None:
         super().__init__()
-        self.table = "patterns"
-        self.schema = db_get_schema(self.table)
+        self.repo = PatternRepo()
+        self.table = self.repo.table
 
-    def get(self, title: str) -> Tuple[Dict[str, Any], int]:
+    def get(self, title: str) -> Union[Response, Tuple[Dict[str, str], int]]:
         """get pattern record
 
         :param title: pattern title (not case sensitive)
         """
-        pattern = db_fetchone(
-            f"SELECT * FROM {self.table} WHERE title = ?", (title.lower(),)
+        cached, headers = cached_response(self.table)
+        if cached is not None:
+            return cached
+        pattern = self.repo.by_title(title.lower())
+        if pattern is None:
+            return ({"error": f"{self.table} title {title} not found"}, 404)
+        return cache_response(self.table, pattern._asdict(), headers)
+
+
+class PatternsForecast(Resource):  # type: ignore [misc]
+    """projected occurrences of every pattern"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.repo = PatternRepo()
+        self.parser = reqparse.RequestParser()
+        self.parser.add_argument("start", type=str, location="args")
+        self.parser.add_argument("end", type=str, location="args")
+
+    def get(self) -> Tuple[Dict[str, Any], int]:
+        """expand patterns over a window, the next year by default"""
+        args = self.parser.parse_args()
+        try:
+            start = (
+                parse_date(args["start"])
+                if args["start"]
+                else datetime.now(timezone.utc).date()
+            )
+            end = (
+                parse_date(args["end"])
+                if args["end"]
+                else add_months(start, 12) - timedelta(days=1)
+            )
+        except ValueError:
+            return ({"error": "dates must be YYYY-MM-DD"}, 400)
+        if end < start:
+            return ({"error": "end before start"}, 400)
+        if (end - start).days >= FORECAST_MAX_DAYS:
+            return (
+                {"error": f"window longer than {FORECAST_MAX_DAYS} days"},
+                400,
+            )
+        rows = self.repo.active(start.isoformat(), end.isoformat())
+        specs = [spec for spec in map(pattern_spec, rows) if spec is not None]
+        projected = list(forecast(specs, start, end))
+        return (
+            {
+                "start": start.isoformat(),
+                "end": end.isoformat(),
+                "count": len(projected),
+                "total": round(sum(item["value"] for item in projected), 2),
+                "occurrences": projected,
+            },
+            200,
         )
-        return (db_build_record(fetch=pattern, schema=self.schema), 200)
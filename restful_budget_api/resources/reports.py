@@ -0,0 +1,107 @@
+"""net worth reports endpoints"""
+
+from datetime import datetime, timezone
+from typing import Any, Dict, Tuple
+
+from flask import Response
+from flask_restful import Resource, reqparse
+
+from restful_budget_api.library.conditional import conditional_get
+from restful_budget_api.library.db_connector import (
+    db_build_record,
+    db_change_returning,
+    db_fetchone,
+    db_get_schema,
+)
+from restful_budget_api.library.representation import table_response
+from restful_budget_api.library.security import (
+    api_key_required,
+    get_user,
+    strict_verbiage,
+)
+
+# running sums of REAL values pick up float noise, hide it from clients
+TOTALS_SQL = (
+    "SELECT round(assets, 6), round(liabilities, 6), "
+    "round(assets - liabilities, 6), updated_at "
+    "FROM net_worth WHERE user_id = ?"
+)
+
+
+class Reports(Resource):  # type: ignore [misc]
+    """current net worth and report snapshots
+
+    The totals are maintained by triggers on assets and liabilities, so
+    reading them is one primary key lookup however long the history is.
+
+    HTTP verbs:
+        - get
+        - post
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.parser = reqparse.RequestParser()
+        self.parser.add_argument("date", type=str)
+        self.table = "reports"
+        self.schema = db_get_schema(self.table)
+
+    @strict_verbiage
+    @api_key_required
+    def get(self) -> Tuple[Dict[str, Any], int]:
+        """return current total assets, liabilities and net worth"""
+        fetch = db_fetchone(TOTALS_SQL, (get_user(),))
+        return (
+            db_build_record(
+                fetch=fetch or (0.0, 0.0, 0.0, None),
+                schema=["assets", "liabilities", "net_worth", "updated_at"],
+            ),
+            200,
+        )
+
+    @strict_verbiage
+    @api_key_required
+    def post(self) -> Tuple[Dict[str, Any], int]:
+        """save the current net worth as a report, dated today by default"""
+        args = self.parser.parse_args()
+        date = args["date"] or datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        user_id = get_user()
+        fetch = db_change_returning(
+            f"INSERT INTO {self.table} (user_id, date, net_worth) "
+            "SELECT ?, ?, COALESCE(("
+            "SELECT round(assets - liabilities, 6) FROM net_worth "
+            "WHERE user_id = ?), 0)",
+            (user_id, date, user_id),
+            "*",
+            f"SELECT * FROM {self.table} WHERE id = last_insert_rowid()",
+            select_after=True,
+        )
+        return (db_build_record(fetch=fetch[0], schema=self.schema), 201)
+
+
+class ReportsHistory(Resource):  # type: ignore [misc]
+    """saved net worth reports
+
+    HTTP verbs:
+        - get
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.table = "reports"
+        self.schema = db_get_schema(self.table)
+
+    @strict_verbiage
+    @api_key_required
+    def get(self) -> Response:
+        """return user reports ordered by date"""
+        user_id = get_user()
+        not_modified, headers = conditional_get(self.table, user_id)
+        if not_modified is not None:
+            return not_modified
+        return table_response(
+            f"SELECT * FROM {self.table} WHERE user_id = ? ORDER BY date, id",
+            (user_id,),
+            self.schema,
+            headers,
+        )
@@ -2,19 +2,14 @@
 
 import uuid
 from sqlite3 import IntegrityError
-from typing import Any, Dict, List, Tuple, Union
+from typing import Any, Dict, Tuple, Union
 
+from flask import Response
 from flask_restful import Resource, reqparse
 
-from restful_budget_api.library.db_connector import (
-    db_build_record,
-    db_build_table,
-    db_commit_change,
-    db_fetchall,
-    db_fetchone,
-    db_get_schema,
-    db_ids,
-)
+from restful_budget_api.library.auth_cache import get_auth_cache
+from restful_budget_api.library.repositories import UserRepo
+from restful_budget_api.library.representation import table_response
 from restful_budget_api.library.security import admin_required, strict_verbiage
 
 
@@ -23,8 +18,9 @@ class Users(Resource):  # type: ignore [misc]
 
     def __init__(self) -> None:
         super().__init__()
-        self.table = "users"
-        self.schema = db_get_schema(self.table)
+        self.repo = UserRepo()
+        self.table = self.repo.table
+        self.schema = list(self.repo.row._fields)
         self.parser = reqparse.RequestParser()
         self.parser.add_argument("username")
 
@@ -32,18 +28,17 @@ class Users(Resource):  # type: ignore [misc]
     @admin_required
     def get(
         self, user_id: int = 0
-    ) -> Union[Dict[str, Any], List[Dict[str, Any]]]:
+    ) -> Union[Dict[str, Any], Response, Tuple[Dict[str, str], int]]:
         """get user table
 
         :param user_id: id number of user to get if only one desired
         """
         if user_id != 0:
-            user = db_fetchone(
-                f"SELECT * FROM {self.table} WHERE id = ?", (user_id,)
-            )
-            return db_build_record(fetch=user, schema=self.schema)
-        response = db_fetchall(f"SELECT * FROM {self.table}")
-        return db_build_table(fetch=response, schema=self.schema)
+            user = self.repo.get(user_id)
+            if user is None:
+                return ({"error": f"{self.table} id {user_id} not found"}, 404)
+            return user._asdict()
+        return table_response(self.repo.select_sql, (), self.schema)
 
     @strict_verbiage
     @admin_required
@@ -54,15 +49,11 @@ class Users(Resource):  # type: ignore [misc]
             return ({"error": "no username provided"}, 400)
         try:
             api_key = uuid.uuid4().hex
-            db_commit_change(
-                f"INSERT INTO {self.table} (username, password) VALUES (?, ?)",
-                (args["username"], api_key),
-            )
-            user = db_fetchone(
-                f"SELECT * FROM {self.table} WHERE username = ?",
-                (args["username"],),
+            user = self.repo.insert(
+                {"username": args["username"], "password": api_key}
             )
-            return (db_build_record(fetch=user, schema=self.schema), 201)
+            get_auth_cache().invalidate_key(api_key)
+            return (user._asdict(), 201)
         except IntegrityError:
             return ({"error": "username already taken"}, 409)
 
@@ -73,10 +64,7 @@ class Users(Resource):  # type: ignore [misc]
 
         :param user_id: id number of user to delete
         """
-        valid_ids = db_ids(self.table)
-        if user_id not in valid_ids:
+        if not self.repo.delete(user_id):
             return ({"error": f"{self.table} id invalid"}, 400)
-        db_commit_change(
-            sql=f"DELETE FROM {self.table} WHERE id = ?", data=(user_id,)
-        )
+        get_auth_cache().invalidate_user(user_id)
         return ({"table": self.table, "deleted_id": user_id}, 200)
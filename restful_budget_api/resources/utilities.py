@@ -2,8 +2,15 @@
 
 from typing import Any, Dict, Tuple
 
+from flask import Response
 from flask_restful import Resource
 
+from restful_budget_api.library.db_pool import get_pool
+from restful_budget_api.library.instrumentation import get_metrics, pool_gauges
+from restful_budget_api.library.rate_limit import get_rate_limiter
+from restful_budget_api.library.security import admin_required
+from restful_budget_api.library.write_queue import get_write_queue
+
 
 class Home(Resource):  # type: ignore [misc]
     """home resource for testing"""
@@ -16,3 +23,36 @@ class Home(Resource):  # type: ignore [misc]
     def get(self) -> Tuple[Dict[str, Any], int]:
         """Return hello world"""
         return ({"hello": "world"}, 200)
+
+
+class Stats(Resource):  # type: ignore [misc]
+    """server statistics for admins"""
+
+    @admin_required
+    def get(self) -> Tuple[Dict[str, Any], int]:
+        """Return database pool, write queue and rate limit counters"""
+        stats = {
+            "pool": get_pool().stats(),
+            "rate_limit": get_rate_limiter().stats(),
+        }
+        write_queue = get_write_queue()
+        if write_queue is not None:
+            stats["write_queue"] = write_queue.stats()
+        return (stats, 200)
+
+
+class Metrics(Resource):  # type: ignore [misc]
+    """prometheus metrics of this server process"""
+
+    def get(self) -> Response:
+        """Return metrics in prometheus text format"""
+        gauges = pool_gauges(get_pool().stats())
+        write_queue = get_write_queue()
+        if write_queue is not None:
+            gauges["budget_db_write_queue_depth"] = write_queue.stats()[
+                "queued"
+            ]
+        return Response(
+            get_metrics().render(gauges),
+            mimetype="text/plain; version=0.0.4",
+        )
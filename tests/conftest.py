@@ -1,46 +1,47 @@
 """config functions for unit tests"""
 
-import os
-import time
-from multiprocessing import Process
-from typing import Dict, Iterator, List, Union
+from pathlib import Path
+from typing import Any, Dict, List, Union
 
 import pytest
 
 from restful_budget_api.__app__ import create_api, create_app
-from tests.library.db_setup import make_db
+from tests.library.db_setup import copy_db, make_db
 
 
-@pytest.fixture
-def admin_access_app() -> Iterator[Union[Process, str]]:
-    """launch admin server with user creation perms"""
-    test_db = make_db(f"{os.path.dirname(__file__)}/admin_tester.db")
-    args = {"admin": True, "database": test_db}
-    app = create_app(args)
+def make_app(admin: bool, test_db: str) -> Dict[str, Any]:
+    """build an app over a test db and a client to call it in process
+
+    :param admin: start in admin mode
+    :param test_db: absolute path to an already migrated db file
+    """
+    app = create_app({"admin": admin, "database": test_db, "migrate": False})
     _ = create_api(app)
-    app_process = Process(target=app.run, kwargs={"debug": False})
-    app_process.start()
-    time.sleep(0.5)
-    yield {"app": app_process, "db": test_db}
-    app_process.terminate()
-    os.remove(test_db)
-    time.sleep(0.5)
+    return {"app": app, "client": app.test_client(), "db": test_db}
+
+
+@pytest.fixture(scope="session")
+def template_db(tmp_path_factory: pytest.TempPathFactory) -> str:
+    """migrate one empty db per session (per worker under xdist)"""
+    return make_db(str(tmp_path_factory.mktemp("template") / "template.db"))
 
 
 @pytest.fixture
-def base_access_app() -> Iterator[Union[Process, str]]:
-    """launch admin server with user creation perms"""
-    test_db = make_db("base_tester")
-    args = {"admin": False, "database": test_db}
-    app = create_app(args)
-    _ = create_api(app)
-    app_process = Process(target=app.run, kwargs={"debug": False})
-    app_process.start()
-    time.sleep(0.5)
-    yield {"app": app_process, "db": test_db}
-    app_process.terminate()
-    os.remove(test_db)
-    time.sleep(0.5)
+def test_db(template_db: str, tmp_path: Path) -> str:
+    """private copy of the template db for one test"""
+    return copy_db(template_db, str(tmp_path / "tester.db"))
+
+
+@pytest.fixture
+def admin_access_app(test_db: str) -> Dict[str, Any]:
+    """admin app with user creation perms"""
+    return make_app(True, test_db)
+
+
+@pytest.fixture
+def base_access_app(test_db: str) -> Dict[str, Any]:
+    """app without access to the users table"""
+    return make_app(False, test_db)
 
 
 @pytest.fixture
@@ -1,21 +1,33 @@
 """database setup for tests"""
 
-import os
 import sqlite3
 
+from restful_budget_api.library.migrations import migrate
+
 
 def make_db(db_file: str) -> str:
     """create test db file and return path name
 
     :param db_file: absolute path to db file
     """
+    migrate(db_file)
+    return db_file
+
+
+def copy_db(source: str, db_file: str) -> str:
+    """copy a db file with the backup API and return the copy's path name
+
+    Copying a migrated template is much faster than running the
+    migrations again for every test.
+
+    :param source: absolute path to db file to copy
+    :param db_file: absolute path to the new db file
+    """
+    src_client = sqlite3.connect(source)
     db_client = sqlite3.connect(db_file)
-    schema_file = os.path.join(
-        os.path.dirname(__file__), "../../restful_budget_api/schema.sql"
-    )
-    with open(schema_file, "r", encoding="utf-8") as schema:
-        db_client.executescript(schema.read())
+    src_client.backup(db_client)
     db_client.close()
+    src_client.close()
     return db_file
 
 
@@ -1,4 +1,3 @@
 """Global variables for testing"""
 
-DEFAULT_URL = "http://127.0.0.1:5000"
 HEADERS = {"Content-Type": "application/json"}
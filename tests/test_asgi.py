@@ -0,0 +1,87 @@
+"""ASGI serving testing"""
+
+import asyncio
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from flask import Flask
+
+from restful_budget_api.__app__ import create_api, create_app
+from restful_budget_api.library.asgi import WSGIBridge
+from restful_budget_api.library.datagen import generate_dataset
+
+
+def make_app(tmp_path: Path) -> Tuple[Flask, List[str]]:
+    """app over generated data with every resource registered
+
+    :param tmp_path: pytest temporary directory
+    """
+    database = str(tmp_path / "asgi.db")
+    keys = generate_dataset(database, users=3, expenses_per_user=40)
+    app = create_app({"admin": False, "database": database})
+    create_api(app)
+    return (app, keys)
+
+
+async def asgi_get(
+    bridge: WSGIBridge, path: str, headers: Dict[str, str]
+) -> Tuple[int, Dict[bytes, bytes], bytes]:
+    """send one GET request straight to an ASGI app
+
+    :param bridge: ASGI app
+    :param path: request path without query string
+    :param headers: request headers
+    """
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "query_string": b"",
+        "headers": [
+            (name.lower().encode(), value.encode())
+            for name, value in headers.items()
+        ],
+        "http_version": "1.1",
+        "scheme": "http",
+        "server": ("testserver", 80),
+        "client": ("127.0.0.1", 4000),
+    }
+    sent: List[Dict[str, Any]] = []
+
+    async def receive() -> Dict[str, Any]:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: Dict[str, Any]) -> None:
+        sent.append(message)
+
+    await bridge(scope, receive, send)
+    body = b"".join(message.get("body", b"") for message in sent[1:])
+    return (sent[0]["status"], dict(sent[0]["headers"]), body)
+
+
+def test_asgi_bridge(tmp_path: Path) -> None:
+    """Concurrent ASGI requests share a few threads"""
+    app, keys = make_app(tmp_path)
+    bridge = WSGIBridge(app, threads=2)
+
+    async def run() -> List[Tuple[int, Dict[bytes, bytes], bytes]]:
+        return await asyncio.gather(
+            *[
+                asgi_get(
+                    bridge,
+                    path,
+                    {"Authorization": keys[num % len(keys)]},
+                )
+                for num in range(30)
+                for path in ("/expenses", "/expenses/export", "/missing")
+            ]
+        )
+
+    responses = asyncio.run(run())
+    statuses = [status for status, _, _ in responses]
+    assert statuses == [200, 200, 404] * 30
+    assert len(json.loads(responses[0][2])) == 40
+    _, headers, body = responses[1]
+    assert headers[b"content-type"].startswith(b"text/csv")
+    assert len(body.splitlines()) == 41
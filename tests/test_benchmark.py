@@ -0,0 +1,67 @@
+"""benchmark harness testing"""
+
+from pathlib import Path
+
+from restful_budget_api.__app__ import create_api, create_app
+from restful_budget_api.library.benchmark import (
+    available_json_paths,
+    available_scenarios,
+    find_regressions,
+    run_client,
+    run_json_paths,
+)
+from restful_budget_api.library.datagen import generate_dataset
+
+
+def test_benchmark_scenarios(tmp_path: Path) -> None:
+    """Every registered scenario runs cleanly against generated data"""
+    database = str(tmp_path / "bench.db")
+    keys = generate_dataset(database, users=3, expenses_per_user=20)
+    app = create_app({"admin": True, "database": database})
+    _ = create_api(app)
+    for scenario in available_scenarios(app):
+        result = run_client(app, scenario, keys, count=5)
+        assert result["requests"] == 5
+        assert result["errors"] == 0, scenario.name
+        assert result["p50_ms"] <= result["p99_ms"]
+
+
+def test_json_paths(tmp_path: Path) -> None:
+    """Every JSON encoding path sends the same records"""
+    database = str(tmp_path / "bench.db")
+    keys = generate_dataset(database, users=2, expenses_per_user=30)
+    app = create_app({"admin": True, "database": database})
+    _ = create_api(app)
+    client = app.test_client()
+    bodies = []
+    for config in available_json_paths().values():
+        app.config.update(config)
+        bodies.append(
+            (
+                client.get("/users").json,
+                client.get(
+                    "/expenses", headers={"Authorization": keys[0]}
+                ).json,
+            )
+        )
+    assert len(bodies[0][1]) == 30
+    assert all(body == bodies[0] for body in bodies)
+    dates = [record["date"] for record in bodies[0][1]]
+    assert dates == sorted(dates)
+
+    results = run_json_paths(app, available_scenarios(app), keys, count=3)
+    assert "json-stdlib" in results
+    for scenarios in results.values():
+        assert set(scenarios) == {"users_list", "expenses_list"}
+        assert all(result["errors"] == 0 for result in scenarios.values())
+
+
+def test_benchmark_regressions() -> None:
+    """Only p95 growth past the threshold is reported"""
+    baseline = {"results": {"client": {"a": {"p95_ms": 10.0}}}}
+    current = {
+        "results": {"client": {"a": {"p95_ms": 11.0}, "b": {"p95_ms": 1}}}
+    }
+    assert find_regressions(baseline, current, threshold=0.2) == []
+    current["results"]["client"]["a"]["p95_ms"] = 13.0
+    assert len(find_regressions(baseline, current, threshold=0.2)) == 1
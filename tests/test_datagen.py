@@ -0,0 +1,80 @@
+"""synthetic dataset testing"""
+
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from restful_budget_api.__app__ import create_api, create_app
+from restful_budget_api.library.datagen import Profile, generate_profile
+
+PROFILE = Profile(
+    users=4,
+    expenses_per_user=30,
+    assets_per_user=3,
+    liabilities_per_user=2,
+    patterns=10,
+)
+
+
+def schema(database: str) -> list:
+    """names and SQL of every trigger and index
+
+    :param database: path to database file
+    """
+    db_client = sqlite3.connect(database)
+    fetch = db_client.execute(
+        "SELECT name, sql FROM sqlite_master "
+        "WHERE type IN ('trigger', 'index') ORDER BY name"
+    ).fetchall()
+    db_client.close()
+    return fetch
+
+
+def test_generate_profile(tmp_path: Path) -> None:
+    """Profiles load the same rows for a seed and leave triggers working"""
+    first = str(tmp_path / "first.db")
+    second = str(tmp_path / "second.db")
+    empty = str(tmp_path / "empty.db")
+    keys = generate_profile(first, PROFILE, seed=3)
+    generate_profile(second, PROFILE, seed=3)
+    generate_profile(empty, PROFILE._replace(users=0, patterns=0))
+    assert schema(first) == schema(empty)
+    with pytest.raises(ValueError):
+        generate_profile(first, PROFILE)
+
+    db_clients = [sqlite3.connect(first), sqlite3.connect(second)]
+    for table in ("expenses", "assets", "liabilities", "patterns"):
+        rows = [
+            db_client.execute(f"SELECT * FROM {table}").fetchall()
+            for db_client in db_clients
+        ]
+        assert rows[0] == rows[1]
+    assert len(rows[0]) == PROFILE.patterns
+    for db_client in db_clients:
+        db_client.close()
+
+    app = create_app({"admin": False, "database": first})
+    create_api(app)
+    client = app.test_client()
+    headers = {"Authorization": keys[0]}
+    resp = client.get("/expenses", headers=headers)
+    assert len(resp.json) == PROFILE.expenses_per_user
+    assert "ETag" in resp.headers
+    report = client.get("/reports", headers=headers).json
+    assets = client.get("/assets", headers=headers).json
+    assert report["assets"] == round(sum(a["value"] for a in assets), 6)
+
+    # triggers are back, so writes still update totals and versions
+    client.post(
+        "/assets",
+        json={"date": "2024-01-01", "description": "cash", "value": 10},
+        headers=headers,
+    )
+    assert client.get("/reports", headers=headers).json["assets"] == (
+        round(report["assets"] + 10, 6)
+    )
+    resp = client.get(
+        "/expenses", headers={**headers, "If-None-Match": resp.headers["ETag"]}
+    )
+    assert resp.status_code == 304
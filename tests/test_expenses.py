@@ -1,79 +1,70 @@
 """expenses and liabilities endpoints testing"""
 
+import csv
+import io
 import json
-from multiprocessing import Process
-from typing import Dict, List, Union
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Union
 
-import requests
+import pytest
 
+from restful_budget_api.__app__ import create_api, create_app
+from restful_budget_api.library import db_connector
+from restful_budget_api.library.datagen import generate_dataset
 from tests.library import test_globals
 from tests.library.db_setup import insert_test_users
 
 
 def test_expense_resource_success(
-    base_access_app: Process,
+    base_access_app: Dict[str, Any],
     dummy_expenses: List[Dict[str, Union[str, float]]],
 ) -> None:
     """Assets endpoint should be able to add expenses when passing a valid api
     key
     """
+    client = base_access_app["client"]
     # verify posting expenses
     insert_test_users(base_access_app["db"])
     for expense in dummy_expenses:
-        resp = requests.post(
-            f"{test_globals.DEFAULT_URL}/expenses",
+        resp = client.post(
+            "/expenses",
             data=json.dumps(expense),
             headers={
                 "Authorization": "pwd1",
                 "Content-Type": "application/json",
             },
-            timeout=5,
         )
         assert resp.status_code == 201
-        resp_json = resp.json()
+        resp_json = resp.json
         assert resp_json["date"] == expense["date"]
         assert resp_json["description"] == expense["description"]
         assert resp_json["amount"] == expense["amount"]
-    resp = requests.get(
-        f"{test_globals.DEFAULT_URL}/expenses",
-        headers={"Authorization": "pwd1"},
-        timeout=5,
-    )
+    resp = client.get("/expenses", headers={"Authorization": "pwd1"})
 
     # verify getting expenses we just posted
     assert resp.status_code == 200
-    assert isinstance(resp.json(), list)
-    assert len(resp.json()) == len(dummy_expenses)
+    assert isinstance(resp.json, list)
+    assert len(resp.json) == len(dummy_expenses)
 
     # verify exact contents of first record
-    record_0 = resp.json()[0]
+    record_0 = resp.json[0]
     assert record_0["date"] == dummy_expenses[0]["date"]
     assert record_0["description"] == dummy_expenses[0]["description"]
     assert record_0["amount"] == dummy_expenses[0]["amount"]
     assert record_0["id"] == 1
 
     # verify limiting responses to user requesting expenses
-    resp = requests.get(
-        f"{test_globals.DEFAULT_URL}/expenses",
-        headers={"Authorization": "pwd2"},
-        timeout=5,
-    )
-    assert resp.json() == []
+    resp = client.get("/expenses", headers={"Authorization": "pwd2"})
+    assert resp.json == []
 
     # verify delete verb
-    resp = requests.delete(
-        f"{test_globals.DEFAULT_URL}/expenses/1",
-        headers={"Authorization": "pwd1"},
-        timeout=5,
-    )
+    resp = client.delete("/expenses/1", headers={"Authorization": "pwd1"})
     assert resp.status_code == 200
-    expenses = requests.get(
-        f"{test_globals.DEFAULT_URL}/expenses",
-        headers={"Authorization": "pwd1"},
-        timeout=5,
-    )
-    assert len(expenses.json()) == len(dummy_expenses) - 1
-    record_0 = expenses.json()[0]
+    expenses = client.get("/expenses", headers={"Authorization": "pwd1"})
+    assert len(expenses.json) == len(dummy_expenses) - 1
+    record_0 = expenses.json[0]
     assert record_0["id"] == 2
     assert record_0["date"] == dummy_expenses[1]["date"]
     assert record_0["description"] == dummy_expenses[1]["description"]
@@ -81,57 +72,564 @@ def test_expense_resource_success(
 
 
 def test_expense_resource_errors(
-    base_access_app: Process,
+    base_access_app: Dict[str, Any],
     dummy_expenses: List[Dict[str, Union[str, float]]],
 ) -> None:
     """Assets endpoint should be able to add expenses when passing a valid api
     key"""
+    client = base_access_app["client"]
     insert_test_users(base_access_app["db"])
     # post expenses for testing
     for expense in dummy_expenses:
-        resp = requests.post(
-            f"{test_globals.DEFAULT_URL}/expenses",
+        resp = client.post(
+            "/expenses",
             data=json.dumps(expense),
             headers={
                 "Authorization": "pwd1",
                 "Content-Type": "application/json",
             },
-            timeout=5,
         )
 
     # verify get behavior with bad api_key
-    resp = requests.get(
-        f"{test_globals.DEFAULT_URL}/expenses",
-        headers={"Authorization": "wrong_password"},
-        timeout=5,
-    )
+    resp = client.get("/expenses", headers={"Authorization": "wrong_password"})
     assert resp.status_code == 401
-    assert resp.json() == {"error": "API key not valid"}
+    assert resp.json == {"error": "API key not valid"}
 
     # verify post behavior with missing field
     expense = {"date": "2021-01", "description": "bank"}
-    resp = requests.post(
-        f"{test_globals.DEFAULT_URL}/expenses",
+    resp = client.post(
+        "/expenses",
         data=json.dumps(expense),
         headers={"Authorization": "pwd1", "Content-Type": "application/json"},
-        timeout=5,
     )
     assert resp.status_code == 400
-    assert resp.json()["error"] == "field amount not provided"
+    assert resp.json["error"] == "field amount not provided"
 
     # verify delete error codes
-    resp = requests.delete(
-        f"{test_globals.DEFAULT_URL}/expenses/1000",
+    resp = client.delete("/expenses/1000", headers={"Authorization": "pwd1"})
+    assert resp.status_code == 400
+    assert resp.json["error"] == "expenses id invalid"
+
+    resp = client.delete("/expenses/1", headers={"Authorization": "pwd2"})
+    assert resp.status_code == 403
+    assert resp.json["error"] == "no access to expenses id 1"
+
+
+def test_expense_pagination(
+    base_access_app: Dict[str, Any],
+    dummy_expenses: List[Dict[str, Union[str, float]]],
+) -> None:
+    """Expenses can be paged with a keyset cursor or streamed"""
+    client = base_access_app["client"]
+    insert_test_users(base_access_app["db"])
+    for expense in reversed(dummy_expenses):
+        client.post(
+            "/expenses",
+            data=json.dumps(expense),
+            headers={"Authorization": "pwd1", **test_globals.HEADERS},
+        )
+
+    # verify pages come back in date order
+    resp = client.get(
+        "/expenses",
+        query_string={"limit": 2},
+        headers={"Authorization": "pwd1"},
+    )
+    assert resp.status_code == 200
+    assert [record["date"] for record in resp.json] == [
+        expense["date"] for expense in dummy_expenses[:2]
+    ]
+    cursor = resp.headers["X-Next-Cursor"]
+    resp = client.get(
+        "/expenses",
+        query_string={"limit": 2, "cursor": cursor},
+        headers={"Authorization": "pwd1"},
+    )
+    assert [record["date"] for record in resp.json] == [
+        dummy_expenses[2]["date"]
+    ]
+    assert "X-Next-Cursor" not in resp.headers
+
+    # verify streamed formats
+    resp = client.get(
+        "/expenses",
+        query_string={"stream": "ndjson"},
+        headers={"Authorization": "pwd1"},
+    )
+    assert resp.headers["Content-Type"] == "application/x-ndjson"
+    lines = resp.get_data(as_text=True).splitlines()
+    assert [json.loads(line)["date"] for line in lines] == [
+        expense["date"] for expense in dummy_expenses
+    ]
+    resp = client.get(
+        "/expenses",
+        query_string={"stream": "json", "cursor": cursor},
+        headers={"Authorization": "pwd1"},
+    )
+    assert [record["date"] for record in resp.json] == [
+        dummy_expenses[2]["date"]
+    ]
+    resp = client.get(
+        "/expenses",
+        query_string={"stream": "json", "limit": 1},
         headers={"Authorization": "pwd1"},
-        timeout=5,
     )
     assert resp.status_code == 400
-    assert resp.json()["error"] == "expenses id invalid"
 
-    resp = requests.delete(
-        f"{test_globals.DEFAULT_URL}/expenses/1",
-        headers={"Authorization": "pwd2"},
-        timeout=5,
+    # verify bad paging args
+    resp = client.get(
+        "/expenses",
+        query_string={"cursor": "not-a-cursor"},
+        headers={"Authorization": "pwd1"},
+    )
+    assert resp.status_code == 400
+    assert resp.json["error"] == "cursor invalid"
+    resp = client.get(
+        "/expenses",
+        query_string={"limit": 0},
+        headers={"Authorization": "pwd1"},
+    )
+    assert resp.status_code == 400
+
+
+def test_expense_filters_and_summary(
+    base_access_app: Dict[str, Any],
+    dummy_expenses: List[Dict[str, Union[str, float]]],
+) -> None:
+    """Expenses can be filtered and summarized server side"""
+    client = base_access_app["client"]
+    insert_test_users(base_access_app["db"])
+    for expense in dummy_expenses:
+        client.post(
+            "/expenses",
+            data=json.dumps(expense),
+            headers={"Authorization": "pwd1", **test_globals.HEADERS},
+        )
+
+    # verify filters
+    resp = client.get(
+        "/expenses",
+        query_string={"start_date": "2021-02", "end_date": "2021-03"},
+        headers={"Authorization": "pwd1"},
+    )
+    assert [record["description"] for record in resp.json] == ["groceries"]
+    resp = client.get(
+        "/expenses",
+        query_string={"min_amount": 100, "description": "N"},
+        headers={"Authorization": "pwd1"},
+    )
+    assert [record["description"] for record in resp.json] == [
+        "dinner",
+        "rent",
+    ]
+
+    # verify summaries
+    resp = client.get("/expenses/summary", headers={"Authorization": "pwd1"})
+    assert resp.status_code == 200
+    summary = resp.json
+    assert summary["count"] == len(dummy_expenses)
+    assert summary["total"] == sum(e["amount"] for e in dummy_expenses)
+    resp = client.get(
+        "/expenses/summary",
+        query_string={"group_by": "year"},
+        headers={"Authorization": "pwd1"},
+    )
+    assert [(group["year"], group["count"]) for group in resp.json] == [
+        ("2021", 2),
+        ("2022", 1),
+    ]
+    resp = client.get(
+        "/expenses/summary",
+        query_string={"group_by": "week"},
+        headers={"Authorization": "pwd1"},
+    )
+    assert resp.status_code == 400
+
+    # verify summaries are limited to the requesting user
+    resp = client.get("/expenses/summary", headers={"Authorization": "pwd2"})
+    assert resp.json == {"count": 0, "total": 0, "average": None}
+
+
+def test_expense_import(
+    base_access_app: Dict[str, Any],
+    dummy_expenses: List[Dict[str, Union[str, float]]],
+) -> None:
+    """Expenses can be imported in bulk from JSON and CSV"""
+    client = base_access_app["client"]
+    insert_test_users(base_access_app["db"])
+
+    # verify JSON import with a bad row
+    rows = dummy_expenses + [{"date": "2023-01-01", "description": "x"}]
+    resp = client.post(
+        "/expenses/import",
+        data=json.dumps(rows),
+        headers={"Authorization": "pwd1", **test_globals.HEADERS},
+    )
+    assert resp.status_code == 201
+    assert resp.json["inserted_ids"] == [1, 2, 3]
+    assert resp.json["errors"] == [
+        {"row": 4, "error": "field amount not provided"}
+    ]
+
+    # verify CSV body and CSV file uploads
+    csv_body = "date,description,amount\n2023-02-01,coffee,3.5\n"
+    resp = client.post(
+        "/expenses/import",
+        data=csv_body,
+        headers={"Authorization": "pwd1", "Content-Type": "text/csv"},
+    )
+    assert resp.status_code == 201
+    assert resp.json["inserted_ids"] == [4]
+    resp = client.post(
+        "/expenses/import",
+        data={
+            "file": (
+                io.BytesIO(
+                    f"{csv_body}2023-02-02,tea,abc\n"
+                    "2023-02-03,juice,nan\n2023-02-04,cake,-inf\n".encode()
+                ),
+                "bank.csv",
+            )
+        },
+        headers={"Authorization": "pwd1"},
+    )
+    assert resp.status_code == 201
+    assert resp.json["inserted_ids"] == [5]
+    assert resp.json["errors"] == [
+        {"row": row, "error": "field amount invalid"} for row in (2, 3, 4)
+    ]
+
+    expenses = client.get("/expenses", headers={"Authorization": "pwd1"})
+    assert len(expenses.json) == 5
+
+    # verify rejected uploads
+    resp = client.post(
+        "/expenses/import",
+        data="when,what\n1,2\n",
+        headers={"Authorization": "pwd1", "Content-Type": "text/csv"},
+    )
+    assert resp.status_code == 400
+
+
+def test_expense_concurrent_posts(base_access_app: Dict[str, Any]) -> None:
+    """Concurrent posts each get back their own new record"""
+    app = base_access_app["app"]
+    insert_test_users(base_access_app["db"])
+
+    def post_expense(num: int) -> Dict[str, Union[str, float]]:
+        resp = app.test_client().post(
+            "/expenses",
+            data=json.dumps(
+                {"date": "2024-01-01", "description": f"e{num}", "amount": 1}
+            ),
+            headers={"Authorization": "pwd1", **test_globals.HEADERS},
+        )
+        assert resp.status_code == 201
+        return resp.json
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        records = list(pool.map(post_expense, range(24)))
+    assert len({record["id"] for record in records}) == len(records)
+    for num, record in enumerate(records):
+        assert record["description"] == f"e{num}"
+
+
+def test_expense_conditional_get(
+    base_access_app: Dict[str, Any],
+    dummy_expenses: List[Dict[str, Union[str, float]]],
+) -> None:
+    """Unchanged expense listings are answered with 304"""
+    client = base_access_app["client"]
+    insert_test_users(base_access_app["db"])
+    client.post(
+        "/expenses",
+        data=json.dumps(dummy_expenses[0]),
+        headers={"Authorization": "pwd1", **test_globals.HEADERS},
+    )
+    db_client = sqlite3.connect(base_access_app["db"])
+    db_client.execute(
+        "UPDATE change_versions SET updated_at = '2024-01-01 00:00:00.500'"
+    )
+    db_client.commit()
+    resp = client.get("/expenses", headers={"Authorization": "pwd1"})
+    etag = resp.headers["ETag"]
+    last_modified = resp.headers["Last-Modified"]
+    assert last_modified == "Mon, 01 Jan 2024 00:00:01 GMT"
+
+    # verify revalidation with ETag and date
+    resp = client.get(
+        "/expenses", headers={"Authorization": "pwd1", "If-None-Match": etag}
+    )
+    assert resp.status_code == 304
+    assert resp.data == b""
+    resp = client.get(
+        "/expenses",
+        headers={
+            "Authorization": "pwd1",
+            "If-Modified-Since": last_modified,
+        },
+    )
+    assert resp.status_code == 304
+
+    # verify dates are held back until their second is over, since a
+    # later write in the same second would get the same date
+    db_client.execute(
+        "UPDATE change_versions SET updated_at = '2999-01-01 00:00:00.500'"
+    )
+    db_client.commit()
+    db_client.close()
+    resp = client.get(
+        "/expenses",
+        headers={"Authorization": "pwd1", "If-Modified-Since": last_modified},
+    )
+    assert resp.status_code == 200
+    assert "Last-Modified" not in resp.headers
+    assert resp.headers["ETag"] != etag
+
+    # verify other users and other query strings get their own tags
+    resp = client.get(
+        "/expenses", headers={"Authorization": "pwd2", "If-None-Match": etag}
+    )
+    assert resp.status_code == 200
+    resp = client.get(
+        "/expenses/summary",
+        headers={"Authorization": "pwd1", "If-None-Match": etag},
+    )
+    assert resp.status_code == 200
+
+    # verify writes change the tag
+    client.post(
+        "/expenses",
+        data=json.dumps(dummy_expenses[1]),
+        headers={"Authorization": "pwd1", **test_globals.HEADERS},
+    )
+    resp = client.get(
+        "/expenses", headers={"Authorization": "pwd1", "If-None-Match": etag}
+    )
+    assert resp.status_code == 200
+    assert resp.headers["ETag"] != etag
+    assert len(resp.json) == 2
+
+
+def test_expense_export(tmp_path: Path) -> None:
+    """Exports stream the same rows as the JSON listing in each format"""
+    database = str(tmp_path / "export.db")
+    keys = generate_dataset(database, users=2, expenses_per_user=50)
+    app = create_app({"admin": False, "database": database})
+    _ = create_api(app)
+    client = app.test_client()
+    headers = {"Authorization": keys[0]}
+    listing = client.get("/expenses", headers=headers).json
+
+    resp = client.get("/expenses/export", headers=headers)
+    assert resp.mimetype == "text/csv"
+    assert "expenses.csv" in resp.headers["Content-Disposition"]
+    rows = list(csv.DictReader(io.StringIO(resp.get_data(as_text=True))))
+    assert [int(row["id"]) for row in rows] == [
+        record["id"] for record in listing
+    ]
+    assert len(resp.data) < len(json.dumps(listing))
+
+    resp = client.get(
+        "/expenses/export",
+        headers={
+            **headers,
+            "Accept": "application/vnd.budget.columns+ndjson",
+        },
+    )
+    columns = json.loads(resp.data.splitlines()[0])
+    assert columns["amount"] == [record["amount"] for record in listing]
+
+    resp = client.get(
+        "/expenses/export?start_date=2022&end_date=2022&format=csv",
+        headers={**headers, "Accept": "application/json"},
+    )
+    rows = list(csv.DictReader(io.StringIO(resp.get_data(as_text=True))))
+    assert rows and all(row["date"].startswith("2022") for row in rows)
+
+    etag = resp.headers["ETag"]
+    resp = client.get(
+        "/expenses/export?start_date=2022&end_date=2022&format=ndjson",
+        headers={**headers, "If-None-Match": etag},
+    )
+    assert resp.status_code == 200
+    resp = client.get(
+        "/expenses/export",
+        headers={**headers, "Accept": "application/json"},
+    )
+    assert resp.status_code == 406
+
+    pyarrow = pytest.importorskip("pyarrow")
+    import pyarrow.ipc
+    import pyarrow.parquet
+
+    resp = client.get("/expenses/export?format=arrow", headers=headers)
+    table = pyarrow.ipc.open_stream(resp.data).read_all()
+    assert table.column("id").to_pylist() == [
+        record["id"] for record in listing
+    ]
+    resp = client.get(
+        "/expenses/export",
+        headers={**headers, "Accept": "application/vnd.apache.parquet"},
+    )
+    table = pyarrow.parquet.read_table(pyarrow.BufferReader(resp.data))
+    assert table.column("amount").to_pylist() == [
+        record["amount"] for record in listing
+    ]
+
+
+def test_expense_write_queue(tmp_path: Path) -> None:
+    """Queued writes are committed in groups and each caller gets its row"""
+    database = str(tmp_path / "queue.db")
+    keys = generate_dataset(database, users=4, expenses_per_user=0)
+    app = create_app(
+        {"admin": True, "database": database, "write_queue": True}
+    )
+    app.config["WRITE_BATCH_MS"] = 5.0
+    _ = create_api(app)
+
+    def post(num: int) -> Dict[str, Union[str, float]]:
+        resp = app.test_client().post(
+            "/expenses",
+            json={
+                "date": "2024-05-01",
+                "description": f"queued {num}",
+                "amount": num + 1,
+            },
+            headers={"Authorization": keys[num % len(keys)]},
+        )
+        assert resp.status_code == 201
+        return resp.json
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        records = list(pool.map(post, range(200)))
+    assert all(
+        record["description"] == f"queued {num}"
+        and record["amount"] == num + 1
+        for num, record in enumerate(records)
+    )
+    assert len({record["id"] for record in records}) == 200
+
+    client = app.test_client()
+    names = ["dup", "dup", "unique"]
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        statuses = sorted(
+            pool.map(
+                lambda name: client.post(
+                    "/users", json={"username": name}
+                ).status_code,
+                names,
+            )
+        )
+    assert statuses == [201, 201, 409]
+
+    stats = client.get("/stats").json["write_queue"]
+    assert stats["writes"] == 203
+    assert stats["batches"] < stats["writes"]
+    metrics = client.get("/metrics").get_data(as_text=True)
+    assert "budget_db_write_batch_size_count" in metrics
+    assert "budget_db_write_queue_depth 0" in metrics
+    app.extensions["write_queue"].close()
+
+
+@pytest.mark.parametrize("has_returning", [True, False])
+def test_expense_patch_and_batch(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, has_returning: bool
+) -> None:
+    """PATCH changes single records, batch requests only touch own records,
+    with or without RETURNING support
+    """
+    monkeypatch.setattr(db_connector, "HAS_RETURNING", has_returning)
+    database = str(tmp_path / "batch.db")
+    keys = generate_dataset(database, users=2, expenses_per_user=20)
+    app = create_app({"admin": False, "database": database})
+    _ = create_api(app)
+    client = app.test_client()
+    owner = {"Authorization": keys[0]}
+    other = {"Authorization": keys[1]}
+    own_ids = [
+        record["id"] for record in client.get("/expenses", headers=owner).json
+    ]
+    other_ids = [
+        record["id"] for record in client.get("/expenses", headers=other).json
+    ]
+    resp = client.post(
+        "/expenses",
+        json={"date": "2024-01-01", "description": "new", "amount": 1.5},
+        headers=owner,
+    )
+    assert resp.status_code == 201
+    assert resp.json["id"] > max(own_ids + other_ids)
+    assert resp.json["description"] == "new"
+    # without RETURNING the changed rows are read by a second statement
+    queries = 1 if has_returning else 2
+    assert f'desc="{queries} queries"' in resp.headers["Server-Timing"]
+    own_ids.append(resp.json["id"])
+
+    resp = client.patch(
+        f"/expenses/{own_ids[0]}", json={"amount": 12.5}, headers=owner
+    )
+    assert resp.status_code == 200
+    assert resp.json["amount"] == 12.5
+    assert resp.json["id"] == own_ids[0]
+    assert resp.json["description"]
+    assert (
+        client.patch(
+            f"/expenses/{own_ids[0]}", json={"amount": 1}, headers=other
+        ).status_code
+        == 403
+    )
+    assert (
+        client.patch(
+            "/expenses/99999", json={"amount": 1}, headers=owner
+        ).status_code
+        == 400
+    )
+    assert (
+        client.patch(
+            f"/expenses/{own_ids[0]}", json={}, headers=owner
+        ).status_code
+        == 400
+    )
+
+    resp = client.patch(
+        "/expenses/batch",
+        json={
+            "ids": own_ids[:5] + other_ids[:2],
+            "changes": {"description": "batched"},
+        },
+        headers=owner,
+    )
+    assert resp.status_code == 200
+    assert resp.json["updated_ids"] == sorted(own_ids[:5])
+    assert resp.json["not_found_ids"] == sorted(other_ids[:2])
+    assert f'desc="{queries} queries"' in resp.headers["Server-Timing"]
+    listing = client.get("/expenses?description=batched", headers=owner).json
+    assert len(listing) == 5
+    for body in (
+        {"ids": own_ids[:2], "changes": {"user_id": 2}},
+        {"ids": own_ids[:2], "changes": {"amount": "lots"}},
+        {"ids": [], "changes": {"amount": 1}},
+        {"ids": ["1"], "changes": {"amount": 1}},
+    ):
+        resp = client.patch("/expenses/batch", json=body, headers=owner)
+        assert resp.status_code == 400
+
+    resp = client.delete(
+        "/expenses/batch",
+        json={"ids": own_ids[10:] + other_ids[:2] + [99999]},
+        headers=owner,
+    )
+    assert resp.status_code == 200
+    assert resp.json["deleted_ids"] == sorted(own_ids[10:])
+    assert resp.json["not_found_ids"] == sorted(other_ids[:2] + [99999])
+    assert len(client.get("/expenses", headers=owner).json) == 10
+    assert len(client.get("/expenses", headers=other).json) == 20
+    assert (
+        client.delete(f"/expenses/{own_ids[0]}", headers=owner).status_code
+        == 200
+    )
+    assert (
+        client.delete(f"/expenses/{other_ids[0]}", headers=owner).status_code
+        == 403
     )
-    assert resp.status_code == 403
-    assert resp.json()["error"] == "no access to expenses id 1"
@@ -1,14 +1,55 @@
 """test the home endpoint"""
 
-from multiprocessing import Process
+from typing import Any, Dict
 
-import requests
+from tests.library.db_setup import insert_test_users
 
-from tests.library import test_globals
 
-
-def test_home(base_access_app: Process) -> None:
+def test_home(base_access_app: Dict[str, Any]) -> None:
     """test home endpoint"""
-    resp = requests.get(f"{test_globals.DEFAULT_URL}/home", timeout=5)
+    client = base_access_app["client"]
+    resp = client.get("/home")
+    assert resp.status_code == 200
+    assert resp.json == {"hello": "world"}
+
+
+def test_stats(admin_access_app: Dict[str, Any]) -> None:
+    """stats endpoint reports connection pool counters to admins"""
+    client = admin_access_app["client"]
+    client.get("/users")
+    resp = client.get("/stats")
+    assert resp.status_code == 200
+    pool = resp.json["pool"]
+    assert pool["checkouts"] >= 1
+    assert pool["open"] <= pool["size"]
+    assert pool["in_use"] == 0
+
+
+def test_stats_restriction(base_access_app: Dict[str, Any]) -> None:
+    """stats endpoint is hidden when server is not in admin mode"""
+    client = base_access_app["client"]
+    resp = client.get("/stats")
+    assert resp.status_code == 403
+
+
+def test_metrics(base_access_app: Dict[str, Any]) -> None:
+    """requests are timed and reported in prometheus format"""
+    client = base_access_app["client"]
+    insert_test_users(base_access_app["db"])
+    resp = client.get("/expenses", headers={"Authorization": "pwd1"})
+    timings = resp.headers["Server-Timing"]
+    assert "app;dur=" in timings
+    assert "db;dur=" in timings
+    assert "auth;dur=" in timings
+
+    resp = client.get("/metrics")
     assert resp.status_code == 200
-    assert resp.json() == {"hello": "world"}
+    assert resp.headers["Content-Type"].startswith("text/plain")
+    assert (
+        'budget_requests_total{endpoint="expenses",method="GET",'
+        'status="200"} 1' in resp.get_data(as_text=True)
+    )
+    assert 'budget_db_queries_total{statement="SELECT"}' in resp.get_data(
+        as_text=True
+    )
+    assert "budget_db_pool_opened_total 1" in resp.get_data(as_text=True)
@@ -0,0 +1,66 @@
+"""schema migration testing"""
+
+import sqlite3
+from pathlib import Path
+
+from restful_budget_api.__app__ import create_app
+from restful_budget_api.library.migrations import available_migrations, migrate
+
+
+def test_migrate_fresh_db(tmp_path: Path) -> None:
+    """Fresh databases get every migration exactly once"""
+    db_file = str(tmp_path / "fresh.db")
+    versions = [version for version, _, _ in available_migrations()]
+    assert migrate(db_file) == versions
+    assert migrate(db_file) == []
+
+    db_client = sqlite3.connect(db_file)
+    plan = db_client.execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM expenses WHERE user_id = ?", (1,)
+    ).fetchall()
+    db_client.close()
+    assert "expenses_user_date" in plan[0][-1]
+
+
+def test_migrate_legacy_db(tmp_path: Path) -> None:
+    """Databases created from the old schema.sql keep their rows"""
+    db_file = str(tmp_path / "legacy.db")
+    _, _, initial = available_migrations()[0]
+    db_client = sqlite3.connect(db_file)
+    with open(initial, "r", encoding="utf-8") as schema:
+        db_client.executescript(schema.read())
+    db_client.execute(
+        "INSERT INTO expenses (user_id, date, description, amount) "
+        "VALUES (1, '2024-01', 'bank', 1.5)"
+    )
+    db_client.commit()
+    db_client.close()
+
+    migrate(db_file)
+    db_client = sqlite3.connect(db_file)
+    assert db_client.execute("SELECT COUNT(*) FROM expenses").fetchone() == (
+        1,
+    )
+    tables = {
+        row[0]
+        for row in db_client.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table'"
+        )
+    }
+    db_client.close()
+    assert {"assets", "liabilities", "reports", "patterns"} <= tables
+
+
+def test_schema_registry(tmp_path: Path) -> None:
+    """Apps read table schemas once, after migrating"""
+    app = create_app({"admin": False, "database": str(tmp_path / "app.db")})
+    schemas = app.extensions["db_schemas"]
+    assert schemas["expenses"] == [
+        "id",
+        "user_id",
+        "date",
+        "description",
+        "amount",
+    ]
+    assert "patterns" in schemas
+    assert "schema_migrations" in schemas
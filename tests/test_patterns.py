@@ -0,0 +1,197 @@
+"""pattern resources and response cache testing"""
+
+from datetime import date
+from pathlib import Path
+
+from flask_restful import Api
+
+from restful_budget_api.__app__ import create_api, create_app
+from restful_budget_api.library.datagen import generate_dataset
+from restful_budget_api.library.forecast import (
+    ExpansionCache,
+    PatternSpec,
+    expand,
+    parse_date,
+)
+from restful_budget_api.library.response_cache import (
+    MemoryBackend,
+    SQLiteBackend,
+)
+from restful_budget_api.resources.patterns import (
+    Patterns,
+    PatternsById,
+    PatternsByTitle,
+)
+
+
+def test_pattern_cache(tmp_path: Path) -> None:
+    """Pattern reads are served from the cache until any worker writes"""
+    database = str(tmp_path / "app.db")
+    auth = {"Authorization": generate_dataset(database, 1, 0)[0]}
+    app = create_app({"admin": False, "database": database})
+    api = Api(app)
+    api.add_resource(Patterns, "/patterns")
+    api.add_resource(PatternsById, "/patterns/<int:id_num>")
+    api.add_resource(PatternsByTitle, "/patterns/<string:title>")
+    client = app.test_client()
+    pattern = {"title": "Rent", "date": "2024-01-01", "value": "1000"}
+
+    assert client.get("/patterns").json == []
+    assert client.post("/patterns", json=pattern).status_code == 400
+    assert client.get("/patterns").json == []
+    created = client.post("/patterns", json=pattern, headers=auth)
+    assert created.status_code == 201
+    resp = client.post("/patterns", json=pattern, headers=auth)
+    assert resp.status_code == 409
+    assert client.get("/patterns/99").status_code == 404
+
+    for path in ("/patterns", "/patterns/1", "/patterns/RENT"):
+        first = client.get(path)
+        second = client.get(path)
+        assert first.status_code == 200
+        assert second.json == first.json
+        # only the change_versions lookup runs
+        assert 'desc="1 queries"' in second.headers["Server-Timing"]
+    assert client.get("/patterns/rent").json["title"] == "rent"
+
+    listing = client.get("/patterns")
+    etag = listing.headers["ETag"]
+    assert len(listing.json) == 1
+    assert (
+        client.get("/patterns", headers={"If-None-Match": etag}).status_code
+        == 304
+    )
+
+    pattern["title"] = "groceries"
+    client.post("/patterns", json=pattern, headers=auth)
+    fresh = client.get("/patterns", headers={"If-None-Match": etag})
+    assert fresh.status_code == 200
+    assert len(fresh.json) == 2
+
+    # a write through another worker's app skips this worker's invalidate
+    worker = create_app({"admin": False, "database": database})
+    Api(worker).add_resource(Patterns, "/patterns")
+    pattern["title"] = "gym"
+    worker.test_client().post("/patterns", json=pattern, headers=auth)
+    assert len(client.get("/patterns").json) == 3
+
+
+def test_cache_backends(tmp_path: Path) -> None:
+    """Backends evict past their byte limit and drop whole namespaces"""
+    memory = MemoryBackend(max_bytes=10)
+    memory.set("a:1", b"12345")
+    memory.set("a:2", b"12345")
+    memory.get("a:1")
+    memory.set("b:1", b"12345")
+    assert memory.get("a:2") is None
+    assert memory.stats() == {"entries": 2, "bytes": 10}
+    memory.delete_prefix("a:")
+    assert memory.get("a:1") is None
+    assert memory.get("b:1") == b"12345"
+
+    path = str(tmp_path / "shared.cache")
+    writer = SQLiteBackend(path, max_bytes=10)
+    reader = SQLiteBackend(path, max_bytes=10)
+    writer.set("a:1", b"12345")
+    writer.set("a:2", b"12345")
+    writer.set("b:1", b"12345")
+    assert reader.get("a:1") is None
+    assert reader.get("b:1") == b"12345"
+    reader.delete_prefix("a:")
+    assert writer.stats() == {"entries": 1, "bytes": 5}
+
+
+def test_pattern_forecast(tmp_path: Path) -> None:
+    """Patterns expand over the requested window in date order"""
+    database = str(tmp_path / "app.db")
+    auth = {"Authorization": generate_dataset(database, 1, 0)[0]}
+    app = create_app({"admin": False, "database": database})
+    create_api(app)
+    client = app.test_client()
+    for pattern in [
+        {"title": "rent", "date": "2024-01-31", "value": "1000"},
+        {
+            "title": "gym",
+            "date": "2024-01-01",
+            "value": "25.5",
+            "frequency": "weekly",
+            "interval": 2,
+            "end_date": "2024-02-29",
+        },
+        {
+            "title": "insurance",
+            "date": "2023-06-15",
+            "value": "300",
+            "frequency": "yearly",
+        },
+    ]:
+        resp = client.post("/patterns", json=pattern, headers=auth)
+        assert resp.status_code == 201
+    bad = {"title": "bad", "date": "2024-01-01", "value": "1"}
+    for field, val in [("frequency", "hourly"), ("interval", 0)]:
+        resp = client.post("/patterns", json={**bad, field: val}, headers=auth)
+        assert resp.status_code == 400
+
+    resp = client.get("/patterns/forecast?start=2024-02-01&end=2024-06-30")
+    assert resp.status_code == 200
+    projected = [
+        (item["title"], item["date"]) for item in resp.json["occurrences"]
+    ]
+    assert projected == [
+        ("gym", "2024-02-12"),
+        ("gym", "2024-02-26"),
+        ("rent", "2024-02-29"),
+        ("rent", "2024-03-31"),
+        ("rent", "2024-04-30"),
+        ("rent", "2024-05-31"),
+        ("insurance", "2024-06-15"),
+        ("rent", "2024-06-30"),
+    ]
+    assert resp.json["total"] == 5351.0
+    assert len(client.get("/patterns/forecast").json["occurrences"]) >= 13
+
+    assert client.get("/patterns/forecast?start=x").status_code == 400
+    resp = client.get("/patterns/forecast?start=2024-02-01&end=2024-01-01")
+    assert resp.status_code == 400
+    resp = client.get("/patterns/forecast?start=2000-01-01&end=2024-01-01")
+    assert resp.status_code == 400
+
+    # occurrences stop at the last date a date can hold
+    resp = client.get("/patterns/forecast?start=9990-01-01&end=9999-12-31")
+    assert resp.status_code == 200
+    assert resp.json["occurrences"][-1] == {
+        "pattern_id": 1,
+        "title": "rent",
+        "date": "9999-12-31",
+        "value": 1000.0,
+    }
+    daily = PatternSpec(
+        1, 1, "gym", parse_date("9999-12-30"), 5.0, "daily", 1, None
+    )
+    assert expand(daily, daily.start, date.max) == (
+        "9999-12-30",
+        "9999-12-31",
+    )
+
+
+def test_expansion_cache() -> None:
+    """Expansions are evicted by the number of dates they hold"""
+    spec = PatternSpec(
+        1, 1, "gym", parse_date("2024-01-01"), 5.0, "daily", 1, None
+    )
+    start = parse_date("2024-01-01")
+    windows = [
+        (start, parse_date(end)) for end in ("2024-01-10", "2024-01-06")
+    ]
+    cache = ExpansionCache(max_dates=16)
+    for window in windows:
+        cache.set((spec, *window), expand(spec, *window))
+    assert cache.stats() == {"entries": 2, "dates": 16}
+    cache.get((spec, *windows[0]))
+    cache.set((spec, start, start), expand(spec, start, start))
+    assert cache.get((spec, *windows[1])) is None
+    assert cache.stats() == {"entries": 2, "dates": 11}
+    cache.set((spec, start, parse_date("2024-02-01")), ("x",) * 17)
+    assert cache.stats() == {"entries": 2, "dates": 11}
+    cache.set((spec, start, parse_date("2024-01-16")), ("x",) * 16)
+    assert cache.stats() == {"entries": 1, "dates": 16}
@@ -0,0 +1,80 @@
+"""query count regression testing"""
+
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from flask import Flask, Response, g
+
+from restful_budget_api.__app__ import create_api, create_app
+from restful_budget_api.library.datagen import generate_dataset
+
+QUERY_COUNT = re.compile(r'db;dur=[\d.]+;desc="(\d+) queries"')
+
+# method, path, most queries and most rows read or written (None for
+# listings) with a warm auth cache
+QUERY_BUDGETS: List[Tuple[str, str, int, Optional[int]]] = [
+    ("GET", "/expenses", 2, None),
+    ("GET", "/expenses?limit=10", 2, 12),
+    ("GET", "/expenses/summary?group_by=month", 2, None),
+    ("POST", "/expenses", 1, 1),
+    ("PATCH", "/expenses/{own}", 1, 1),
+    ("PATCH", "/expenses/{foreign}", 2, 1),
+    ("DELETE", "/expenses/{foreign}", 2, 1),
+    ("DELETE", "/expenses/999999999", 2, 0),
+    ("DELETE", "/expenses/{own}", 1, 1),
+    ("GET", "/reports", 1, 1),
+    ("DELETE", "/users/999999999", 1, 0),
+]
+
+
+def query_costs(app: Flask, keys: List[str]) -> Dict[str, Tuple[int, int]]:
+    """run every budgeted request and read its query and row counts
+
+    :param app: admin app with the API registered
+    :param keys: API keys, the first one makes the requests
+    """
+    rows: List[int] = []
+
+    def count_rows(response: Response) -> Response:
+        rows.append(sum(query[2] for query in g.timing.queries))
+        return response
+
+    app.after_request(count_rows)
+    client = app.test_client()
+    headers = {"Authorization": keys[0]}
+    own = client.get("/expenses?limit=1", headers=headers).json[0]["id"]
+    other = {"Authorization": keys[1]}
+    foreign = client.get("/expenses?limit=1", headers=other).json[0]["id"]
+    costs = {}
+    for method, path, _, _ in QUERY_BUDGETS:
+        url = path.format(own=own, foreign=foreign)
+        resp = client.open(
+            url,
+            method=method,
+            json={"date": "2024-01-01", "description": "x", "amount": 5.0},
+            headers=headers,
+        )
+        assert resp.status_code < 500, url
+        match = QUERY_COUNT.search(resp.headers["Server-Timing"])
+        assert match is not None, url
+        costs[f"{method} {path}"] = (int(match.group(1)), rows[-1])
+    return costs
+
+
+def test_query_budget(tmp_path: Path) -> None:
+    """Endpoints run a fixed number of queries however big the tables get"""
+    results = []
+    for users, expenses in ((3, 10), (30, 500)):
+        database = str(tmp_path / f"budget_{users}.db")
+        keys = generate_dataset(database, users, expenses)
+        app = create_app({"admin": True, "database": database})
+        create_api(app)
+        results.append(query_costs(app, keys))
+    small, large = results
+    for method, path, query_budget, row_budget in QUERY_BUDGETS:
+        name = f"{method} {path}"
+        assert small[name][0] == large[name][0], name
+        assert large[name][0] <= query_budget, name
+        if row_budget is not None:
+            assert large[name][1] <= row_budget, name
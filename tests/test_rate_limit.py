@@ -0,0 +1,105 @@
+"""rate limit and in-flight cap testing"""
+
+import sqlite3
+import time
+from pathlib import Path
+
+from restful_budget_api.__app__ import create_api, create_app
+from restful_budget_api.library.datagen import generate_dataset
+from restful_budget_api.library.rate_limit import (
+    MemoryBackend,
+    SQLiteBackend,
+    init_rate_limiter,
+)
+
+
+def test_rate_limit(tmp_path: Path) -> None:
+    """Keys past their bucket get 429 with Retry-After, others go on"""
+    database = str(tmp_path / "limits.db")
+    keys = generate_dataset(database, users=3, expenses_per_user=5)
+    app = create_app({"admin": True, "database": database, "rate_limit": 0.5})
+    app.config["RATE_LIMIT_KEY_BURST"] = 3
+    app.config["RATE_LIMIT_GLOBAL"] = 0.5
+    app.config["RATE_LIMIT_GLOBAL_BURST"] = 5
+    init_rate_limiter(app)
+    create_api(app)
+    client = app.test_client()
+
+    def status(key: str) -> int:
+        return client.get(
+            "/reports", headers={"Authorization": key}
+        ).status_code
+
+    assert [status(keys[0]) for _ in range(4)] == [200, 200, 200, 429]
+    resp = client.get("/reports", headers={"Authorization": keys[0]})
+    assert resp.status_code == 429
+    assert resp.headers["Retry-After"] == "2"
+    assert resp.json == {"error": "rate limit exceeded"}
+    # the global bucket holds 5, two are left for everyone else
+    assert [status(keys[1]) for _ in range(2)] == [200, 200]
+    assert status(keys[2]) == 429
+    assert client.get("/stats").json["rate_limit"]["limited"] == 3
+    assert 'budget_rate_limited_total{reason="rate"} 3' in client.get(
+        "/metrics"
+    ).get_data(as_text=True)
+
+
+def test_rate_limit_shared_backend(tmp_path: Path) -> None:
+    """Workers using the SQLite backend draw from the same buckets"""
+    path = str(tmp_path / "shared.limits")
+    first = SQLiteBackend(path)
+    second = SQLiteBackend(path)
+    assert first.take([("user:1", 1.0, 2)]) == 0
+    assert second.take([("user:1", 1.0, 2)]) == 0
+    assert 0 < first.take([("user:1", 1.0, 2)]) <= 1
+    assert second.take([("user:2", 1.0, 2)]) == 0
+
+    # rows idle long enough to have refilled are swept
+    first.take([("user:3", 1000.0, 1)])
+    time.sleep(0.01)
+    first._pruned = 0.0
+    first.take([("user:4", 1000.0, 1)])
+    db_client = sqlite3.connect(path)
+    keys = [
+        row[0] for row in db_client.execute("SELECT key FROM rate_buckets")
+    ]
+    db_client.close()
+    assert keys == ["user:4"]
+
+
+def test_rate_limit_all_or_nothing() -> None:
+    """A request refused by one bucket takes no token from the others"""
+    backend = MemoryBackend()
+    shared = ("global", 0.001, 1)
+    assert backend.take([("user:1", 0.001, 2), shared]) == 0
+    assert backend.take([("user:2", 0.001, 2), shared]) > 0
+    assert backend.take([("user:2", 0.001, 2)]) == 0
+    assert backend.take([("user:2", 0.001, 2)]) == 0
+
+
+def test_in_flight_cap(tmp_path: Path) -> None:
+    """A key streaming an export can't start another listing until done"""
+    database = str(tmp_path / "inflight.db")
+    keys = generate_dataset(database, users=2, expenses_per_user=50)
+    app = create_app(
+        {"admin": False, "database": database, "max_in_flight": 1}
+    )
+    create_api(app)
+    client = app.test_client()
+    owner = {"Authorization": keys[0]}
+
+    export = client.get("/expenses/export", headers=owner, buffered=False)
+    assert export.status_code == 200
+    busy = client.get("/expenses", headers=owner)
+    assert busy.status_code == 429
+    assert busy.headers["Retry-After"] == "1"
+    assert (
+        client.get("/expenses", headers={"Authorization": keys[1]}).status_code
+        == 200
+    )
+    assert client.get("/reports", headers=owner).status_code == 200
+
+    assert len(export.get_data().splitlines()) == 51
+    export.close()
+    assert client.get("/expenses", headers=owner).status_code == 200
+    assert client.get("/expenses/summary", headers=owner).status_code == 200
@@ -0,0 +1,82 @@
+"""assets, liabilities and net worth reports testing"""
+
+from pathlib import Path
+
+import pytest
+
+from restful_budget_api.__app__ import create_api, create_app
+from restful_budget_api.library import db_connector
+from restful_budget_api.library.datagen import generate_dataset
+
+
+@pytest.mark.parametrize("has_returning", [True, False])
+def test_net_worth_totals(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, has_returning: bool
+) -> None:
+    """Totals follow every insert and delete and stay per user, with or
+    without RETURNING support
+    """
+    monkeypatch.setattr(db_connector, "HAS_RETURNING", has_returning)
+    database = str(tmp_path / "reports.db")
+    keys = generate_dataset(database, users=2, expenses_per_user=5)
+    app = create_app({"admin": False, "database": database})
+    create_api(app)
+    client = app.test_client()
+    owner = {"Authorization": keys[0]}
+    other = {"Authorization": keys[1]}
+
+    resp = client.get("/reports", headers=owner)
+    assert resp.status_code == 200
+    assert resp.json["net_worth"] == 0
+
+    ids = []
+    for table, value in [
+        ("assets", 1000.10),
+        ("assets", 250.20),
+        ("liabilities", 400.05),
+    ]:
+        resp = client.post(
+            f"/{table}",
+            json={"date": "2024-01-01", "description": table, "value": value},
+            headers=owner,
+        )
+        assert resp.status_code == 201
+        ids.append(resp.json["id"])
+    resp = client.post("/assets", json={"date": "2024-01-01"}, headers=owner)
+    assert resp.status_code == 400
+
+    resp = client.get("/reports", headers=owner)
+    assert resp.json["assets"] == 1250.3
+    assert resp.json["liabilities"] == 400.05
+    assert resp.json["net_worth"] == 850.25
+    assert client.get("/reports", headers=other).json["net_worth"] == 0
+    assert len(client.get("/assets", headers=owner).json) == 2
+    assert client.get("/assets", headers=other).json == []
+
+    # only the owner may remove a record
+    assert client.delete(f"/assets/{ids[1]}", headers=other).status_code == 403
+    assert client.delete("/assets/9999", headers=owner).status_code == 400
+    assert client.delete(f"/assets/{ids[1]}", headers=owner).status_code == 200
+    assert client.get("/reports", headers=owner).json["net_worth"] == 600.05
+
+    # reading the totals is one lookup, however many records there are
+    resp = client.get("/reports", headers=owner)
+    assert 'desc="1 queries"' in resp.headers["Server-Timing"]
+
+    resp = client.post("/reports", json={"date": "2024-02-01"}, headers=owner)
+    assert resp.status_code == 201
+    assert resp.json["net_worth"] == 600.05
+    resp = client.get("/reports/history", headers=owner)
+    assert [report["date"] for report in resp.json] == ["2024-02-01"]
+    etag = resp.headers["ETag"]
+    resp = client.get(
+        "/reports/history", headers={**owner, "If-None-Match": etag}
+    )
+    assert resp.status_code == 304
+    client.post("/reports", json={}, headers=owner)
+    resp = client.get(
+        "/reports/history", headers={**owner, "If-None-Match": etag}
+    )
+    assert resp.status_code == 200
+    assert len(resp.json) == 2
+    assert client.get("/reports/history", headers=other).json == []
@@ -0,0 +1,54 @@
+"""repository layer testing"""
+
+from pathlib import Path
+
+import pytest
+
+from restful_budget_api.__app__ import create_app
+from restful_budget_api.library.datagen import generate_dataset
+from restful_budget_api.library.repositories import (
+    ExpenseRepo,
+    ExpenseRow,
+    UserRepo,
+    update_sql,
+)
+
+
+def test_expense_repo(tmp_path: Path) -> None:
+    """Repos return named tuple rows and scope writes to the owner"""
+    database = str(tmp_path / "repo.db")
+    keys = generate_dataset(database, users=2, expenses_per_user=3)
+    app = create_app({"admin": False, "database": database})
+    with app.app_context():
+        users = UserRepo()
+        owner = users.id_for_key(keys[0])
+        other = users.id_for_key(keys[1])
+        assert owner is not None and other is not None
+        assert users.id_for_key("missing") is None
+
+        repo = ExpenseRepo()
+        record = repo.insert(
+            {
+                "user_id": owner,
+                "date": "2024-01-01",
+                "description": "coffee",
+                "amount": 3.5,
+            }
+        )
+        assert isinstance(record, ExpenseRow)
+        assert repo.get(record.id) == record
+        assert repo.update(record.id, other, {"amount": 1.0}) is None
+        before = update_sql.cache_info().hits
+        changed = repo.update(record.id, owner, {"amount": 4.0})
+        assert changed == record._replace(amount=4.0)
+        repo.update(record.id, owner, {"amount": 5.0})
+        assert update_sql.cache_info().hits == before + 2
+        with pytest.raises(KeyError):
+            repo.update(record.id, owner, {"amount = 0; --": 1})
+
+        assert repo.exists(record.id, owner)
+        assert not repo.exists(record.id, other)
+        owned = [row.id for row in repo.rows(repo.user_sql, (owner,))]
+        assert repo.delete_many(owned + [999], other) == []
+        assert repo.delete_many(owned + [999], owner) == sorted(owned)
+        assert not repo.delete(record.id, owner)
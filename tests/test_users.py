@@ -1,24 +1,22 @@
 """users endpoint testing"""
 
 import json
-from multiprocessing import Process
-from typing import List
+from typing import Any, Dict, List
 
-import requests
-
-from tests.library import test_globals
+from restful_budget_api.__app__ import create_api, create_app
 from tests.library.db_setup import insert_test_users
 
 
 def test_user_success(
-    admin_access_app: Process, dummy_users: List[str]
+    admin_access_app: Dict[str, Any], dummy_users: List[str]
 ) -> None:
     """App allows read/write access to user info when in admin mode"""
+    client = admin_access_app["client"]
     # verify get of defaut users in test db
     insert_test_users(admin_access_app["db"])
-    default_resp = requests.get(f"{test_globals.DEFAULT_URL}/users", timeout=5)
+    default_resp = client.get("/users")
     assert default_resp.status_code == 200
-    assert default_resp.json()[0] == {
+    assert default_resp.json[0] == {
         "id": 1,
         "username": "tester_1",
         "password": "pwd1",
@@ -26,67 +24,100 @@ def test_user_success(
 
     # verify post of new users
     for user in dummy_users:
-        resp = requests.post(
-            f"{test_globals.DEFAULT_URL}/users",
+        resp = client.post(
+            "/users",
             data=json.dumps({"username": user}),
             headers={"Content-Type": "application/json"},
-            timeout=5,
         )
         assert resp.status_code == 201
-        resp_json = resp.json()
+        resp_json = resp.json
         assert resp_json["username"] == user
         assert len(resp_json["password"]) == 32
 
     # verify delete of user
-    all_users = requests.get(f"{test_globals.DEFAULT_URL}/users", timeout=5)
-    del_one = requests.delete(f"{test_globals.DEFAULT_URL}/users/1", timeout=5)
+    all_users = client.get("/users")
+    del_one = client.delete("/users/1")
     assert del_one.status_code == 200
-    current_users = requests.get(
-        f"{test_globals.DEFAULT_URL}/users", timeout=5
-    )
-    assert len(current_users.json()) == len(all_users.json()) - 1
+    current_users = client.get("/users")
+    assert len(current_users.json) == len(all_users.json) - 1
 
 
 def test_user_errors(
-    admin_access_app: Process, dummy_users: List[str]
+    admin_access_app: Dict[str, Any], dummy_users: List[str]
 ) -> None:
     """Test failure states of users resource"""
+    client = admin_access_app["client"]
     insert_test_users(admin_access_app["db"])
     # verify post failures
     user_info = {"not_a_username": "Qwerty"}
-    resp = requests.post(
-        f"{test_globals.DEFAULT_URL}/users",
-        timeout=5,
+    resp = client.post(
+        "/users",
         data=json.dumps(user_info),
         headers={"Content-Type": "application/json"},
     )
     assert resp.status_code == 400
-    assert resp.json()["error"] == "no username provided"
+    assert resp.json["error"] == "no username provided"
 
     user_info = {"username": "tester_1"}
-    resp = requests.post(
-        f"{test_globals.DEFAULT_URL}/users",
-        timeout=5,
+    resp = client.post(
+        "/users",
         data=json.dumps(user_info),
         headers={"Content-Type": "application/json"},
     )
     assert resp.status_code == 409
-    assert resp.json()["error"] == "username already taken"
+    assert resp.json["error"] == "username already taken"
 
     # verify delete failures
-    resp = requests.delete(f"{test_globals.DEFAULT_URL}/users/1000", timeout=5)
+    resp = client.delete("/users/1000")
     assert resp.status_code == 400
-    assert resp.json()["error"] == "users id invalid"
+    assert resp.json["error"] == "users id invalid"
 
 
-def test_user_restriction(base_access_app: Process) -> None:
+def test_user_restriction(base_access_app: Dict[str, Any]) -> None:
     """App does not return user information when server is not in admin mode"""
+    client = base_access_app["client"]
     insert_test_users(base_access_app["db"])
-    resp = requests.get(f"{test_globals.DEFAULT_URL}/users", timeout=5)
+    resp = client.get("/users")
     assert resp.status_code == 403
-    expenses = requests.get(
-        f"{test_globals.DEFAULT_URL}/expenses",
-        headers={"Authorization": "pwd1"},
-        timeout=5,
-    )
+    expenses = client.get("/expenses", headers={"Authorization": "pwd1"})
     assert expenses.status_code == 200
+
+
+def test_user_key_invalidation(admin_access_app: Dict[str, Any]) -> None:
+    """Deleting a user revokes their cached API key immediately"""
+    client = admin_access_app["client"]
+    insert_test_users(admin_access_app["db"])
+    resp = client.get("/expenses", headers={"Authorization": "pwd1"})
+    assert resp.status_code == 200
+    resp = client.delete("/users/1")
+    assert resp.status_code == 200
+    resp = client.get("/expenses", headers={"Authorization": "pwd1"})
+    assert resp.status_code == 401
+
+    # newly created keys are accepted right away
+    resp = client.post(
+        "/users",
+        data=json.dumps({"username": "late"}),
+        headers={"Content-Type": "application/json"},
+    )
+    api_key = resp.json["password"]
+    resp = client.get("/expenses", headers={"Authorization": api_key})
+    assert resp.status_code == 200
+
+
+def test_user_key_invalidation_across_workers(test_db: str) -> None:
+    """Workers drop cached keys once another worker changed the users"""
+    insert_test_users(test_db)
+    workers = []
+    for _ in range(2):
+        app = create_app(
+            {"admin": True, "database": test_db, "migrate": False}
+        )
+        app.extensions["auth_cache"].recheck = 0.0
+        create_api(app)
+        workers.append(app.test_client())
+    reader, writer = workers
+    headers = {"Authorization": "pwd1"}
+    assert reader.get("/expenses", headers=headers).status_code == 200
+    assert writer.delete("/users/1").status_code == 200
+    assert reader.get("/expenses", headers=headers).status_code == 401